@@ -0,0 +1,217 @@
+"""
+Asyncio execution mode for the /login and /vote endpoints
+
+Serves the same JSON API as the Flask views in routes.py, but every Mongo
+call goes through Motor, Fabric calls use asyncio subprocesses (or the
+pooled gateway), and the per-peer PBFT checks fan out concurrently, so one
+process can hold many in-flight votes. CPU-bound face encoding runs in the
+shared FaceEncodingEngine process pool.
+
+Run with:   hypercorn app.async_routes:async_app
+The Flask app keeps serving everything else (and the sync /login and /vote);
+route POST /login and POST /vote here at the reverse proxy. Sessions are
+shared because both apps sign cookies with the same secret key.
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+from pymongo.write_concern import WriteConcern
+from quart import Quart, Response, jsonify, request, session
+
+from app import app
+from app.database import MONGO_DB, MONGO_URI, client_options
+from app.elgamal import ELECTION_CANDIDATES, election_public_key
+from app.event_log import get_logger
+from app.face_codec import decode_face_encoding
+from app.face_pipeline import EngineBusy
+from app.face_rec import FaceRecognition
+from app.ledger_reconcile import VoteDigestTree
+from app.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus, timer
+from app.routes import face_engine, hybrid_consensus, vote_pipeline, vote_tally
+from app.security import SecurityHelper
+from app.tally import VoteTally
+from app.vote_pipeline import VoteSubmissionPipeline
+
+async_app = Quart(__name__)
+async_app.secret_key = app.secret_key
+async_app.config['SESSION_COOKIE_NAME'] = app.config.get('SESSION_COOKIE_NAME', 'session')
+
+log = get_logger('async_routes')
+
+
+users = None
+votes = None
+vote_outbox = None
+vote_tally_collection = None
+vote_digests_collection = None
+
+
+@async_app.before_serving
+async def connect_mongo():
+    global users, votes, vote_outbox, vote_tally_collection, vote_digests_collection
+    # Same URI, pool and timeout settings as the shared pymongo client
+    client = AsyncIOMotorClient(MONGO_URI, **client_options())
+    db = client[MONGO_DB]
+    users = db.users
+    votes = db.votes
+    # Same durability as VoteSubmissionPipeline.enqueue
+    vote_outbox = db.get_collection('vote_outbox', write_concern=WriteConcern(w='majority', j=True))
+    vote_tally_collection = db.vote_tally
+    vote_digests_collection = db.vote_digests
+    vote_pipeline.start()
+    vote_tally.start()
+    # Load the election key (provisioned offline by keygen) and its tables before the first vote;
+    # a missing key raises ElectionKeyMissing and the app does not start serving
+    await asyncio.get_running_loop().run_in_executor(None, lambda: election_public_key().tables)
+
+
+@async_app.route('/login', methods=['POST'])
+async def login():
+    try:
+        data = await request.get_json()
+        voter_id = data.get('voter_id')
+        face_image = data.get('face_image')
+
+        if not voter_id or not face_image:
+            return jsonify({'error': 'Missing voter ID or face image'}), 400
+
+        # Start the DB lookup while the face is being encoded
+        user_lookup = asyncio.ensure_future(users.find_one({'voter_id': voter_id}))
+        try:
+            live_encoding, error = await face_engine.aencode(face_image)
+        except EngineBusy as e:
+            user_lookup.cancel()
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+        except Exception as e:
+            user_lookup.cancel()
+            log.error('face_verification_error', error=str(e))
+            return jsonify({'error': f'Face verification error: {str(e)}'}), 500
+
+        user = await user_lookup
+        if not user:
+            return jsonify({'error': 'Voter not found'}), 404
+        if error:
+            return jsonify({'error': error}), 400
+
+        stored_encoding = decode_face_encoding(user.get('face_encoding'))
+        matches, _ = FaceRecognition.verify_faces_batch([stored_encoding], [live_encoding])
+        if not matches[0]:
+            return jsonify({'error': 'Face verification failed. Please try again.'}), 401
+
+        decrypted_name = SecurityHelper.decrypt_data(user.get('name'), 'name')
+
+        session['user'] = voter_id
+        session['voter_id'] = voter_id
+        session['name'] = decrypted_name
+        session['token'] = voter_id
+
+        log.info('login', voter_id=voter_id, has_voted=user.get('has_voted', False))
+
+        return jsonify({
+            'success': True,
+            'token': voter_id,
+            'name': decrypted_name,
+            'has_voted': user.get('has_voted', False)
+        }), 200
+
+    except Exception as e:
+        log.error('login_error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+
+@async_app.route('/vote', methods=['POST'])
+async def vote():
+    try:
+        data = await request.get_json()
+
+        if session.get('token') != data.get('token'):
+            return jsonify({'error': 'Invalid token'}), 401
+
+        voter_id = session.get('voter_id')
+        if not voter_id:
+            return jsonify({'error': 'No voter session'}), 401
+
+        candidate = data.get('candidate')
+        if not candidate:
+            return jsonify({'error': 'No candidate selected'}), 400
+        if candidate not in ELECTION_CANDIDATES:
+            return jsonify({'error': 'Unknown candidate'}), 400
+
+        with timer('db_check'):
+            already_voted = await votes.find_one({'voter_id': voter_id}, {'_id': 1})
+        if already_voted:
+            return jsonify({'error': 'You have already voted'}), 403
+
+        consensus_result = await hybrid_consensus.ahybrid_consensus_validate({
+            'voter_id': voter_id,
+            'candidate': candidate
+        })
+
+        if consensus_result['final_status'] != 'APPROVED':
+            log.warning('vote_rejected', voter_id=voter_id, status=consensus_result['final_status'])
+            return jsonify({
+                'error': 'Vote rejected by consensus mechanism',
+                'details': consensus_result
+            }), 403
+
+        # ~30 ms of modular arithmetic; keep it off the event loop
+        with timer('encryption'):
+            encrypted_vote, zkp = await asyncio.get_running_loop().run_in_executor(
+                None, SecurityHelper.encrypt_vote_with_proof, voter_id, candidate
+            )
+
+        vote_data = {
+            'vote_id': str(uuid.uuid4()),
+            'voter_id': voter_id,
+            'candidate': candidate,
+            'encrypted_vote': json.dumps(encrypted_vote),
+            'zkp': json.dumps(zkp),
+            'consensus_proof': json.dumps(consensus_result),
+            'timestamp': datetime.now()
+        }
+
+        with timer('db_write'):
+            try:
+                await votes.insert_one(vote_data)
+            except DuplicateKeyError:
+                return jsonify({'error': 'You have already voted'}), 403
+            await vote_tally_collection.update_one(*VoteTally.increment(candidate), upsert=True)
+            try:
+                await vote_digests_collection.bulk_write(VoteDigestTree.updates(voter_id, candidate), ordered=False)
+            except Exception as e:
+                log.warning('vote_digest_error', error=str(e))
+        with timer('ledger_enqueue'):
+            await vote_outbox.insert_one(
+                VoteSubmissionPipeline.outbox_document(vote_data['vote_id'], voter_id, candidate)
+            )
+        vote_pipeline.notify_enqueued()
+
+        with timer('user_update'):
+            await users.update_one({'voter_id': voter_id}, {'$set': {'has_voted': True}})
+
+        session.pop('token', None)
+
+        log.info('vote_cast', voter_id=voter_id, vote_id=vote_data['vote_id'],
+                 ledger_status=VoteSubmissionPipeline.QUEUED)
+
+        return jsonify({
+            'message': 'Vote cast successfully with Hybrid Consensus!',
+            'success': True,
+            'consensus_type': consensus_result['consensus_type'],
+            'validators_used': len(consensus_result['pos_validators']),
+            'vote_id': vote_data['vote_id'],
+            'ledger_status': VoteSubmissionPipeline.QUEUED
+        })
+    except Exception as e:
+        log.error('vote_error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+
+@async_app.route('/metrics')
+async def metrics():
+    """Histograms of this asyncio process (the Flask workers serve their own)"""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,387 @@
+"""
+Ballot-validity proofs and batch verification
+
+Each ballot (elgamal.py) gets a non-interactive proof, made with Fiat-Shamir
+over SHA-256, that it is a valid vote:
+
+- for every candidate, a disjunctive Chaum-Pedersen (CDS) proof that the
+  ciphertext (a, b) encrypts 0 or 1, i.e. (a, b) or (a, b/g) is a DH tuple
+  for (g, h). The branch that is not true is simulated.
+- a Chaum-Pedersen proof that the product of all of the ballot's
+  ciphertexts encrypts exactly 1, so exactly one candidate is chosen.
+
+The challenges include the key id, voter_id and candidate, so a proof cannot
+be replayed under another voter. Challenges are 256 bits. Responses are
+computed over the integers, with 128 bits of slack for hiding, so no
+verification exponent is longer than about 650 bits.
+
+Every proof reduces to a few equations g^u * h^v == prod(base_i^e_i).
+verify_ballot checks them one by one. verify_ballots raises each equation to
+a random even 128-bit weight, multiplies them all together, and checks the
+whole batch with one Pippenger multi-exponentiation; failing batches are
+bisected to find the bad ballots. Because the weights are even, equations
+are only checked up to a factor of -1, which is the order-2 part of Z_p*.
+elgamal.decrypt_tally squares the aggregates for the same reason, so that
+factor cannot affect the count.
+
+Usage: python -m app.ballot_proofs [--workers N] [--batch-size 256]
+Audits every stored ballot's proof; exits non-zero if any proof is invalid.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.elgamal import (
+    ELECTION_CANDIDATES, ELECTION_KEY_CONFIG, EXPONENT_BITS, SCHEME, ElGamalPublicKey
+)
+
+PROOF_SCHEME = 'cds-chaum-pedersen/sha256/v1'
+CHALLENGE_BITS = 256
+CHALLENGE_MODULUS = 1 << CHALLENGE_BITS
+# Room for c * (sum of the ballot's r) plus 128 bits of statistical hiding
+NONCE_BITS = CHALLENGE_BITS + EXPONENT_BITS + 8 + 128
+RESPONSE_BITS = NONCE_BITS + 1
+BATCH_WEIGHT_BITS = 128
+DEFAULT_BATCH_SIZE = int(os.environ.get('PROOF_BATCH_SIZE', 256))
+
+
+class InvalidProof(ValueError):
+    """A ballot proof is malformed or its Fiat-Shamir challenge does not match"""
+
+
+def _challenge(*parts) -> int:
+    data = '|'.join(format(part, 'x') if isinstance(part, int) else str(part) for part in parts)
+    return int.from_bytes(hashlib.sha256(data.encode()).digest(), 'big')
+
+
+def _signed_pow(table, exponent):
+    if exponent >= 0:
+        return table.pow(exponent)
+    return pow(table.pow(-exponent), -1, table.modulus)
+
+
+def _context(public_key, voter_id, name):
+    return f"{PROOF_SCHEME}|{public_key.key_id}|{voter_id}|{name}"
+
+
+def _prove_bit(public_key, context, a, b, m, r):
+    """CDS proof that (a, b) = Enc(m; r) with m in {0, 1}"""
+    p = public_key.p
+    g_table, h_table = public_key.tables
+
+    # Simulated branch j != m. The prover knows r, so a^-c and (b/g^j)^-c
+    # are folded into fixed-base powers of g and h
+    j = 1 - m
+    c_j = secrets.randbits(CHALLENGE_BITS)
+    z_j = secrets.randbits(NONCE_BITS)
+    e = z_j - r * c_j
+    A_j = _signed_pow(g_table, e)
+    B_j = _signed_pow(h_table, e) * _signed_pow(g_table, -(m - j) * c_j) % p
+
+    # Real branch
+    w = secrets.randbits(NONCE_BITS)
+    A_m, B_m = g_table.pow(w), h_table.pow(w)
+
+    A = [A_m, A_j] if m == 0 else [A_j, A_m]
+    B = [B_m, B_j] if m == 0 else [B_j, B_m]
+    c = _challenge(context, a, b, A[0], B[0], A[1], B[1])
+    c_m = (c - c_j) % CHALLENGE_MODULUS
+    z_m = w + c_m * r
+
+    challenges = [c_m, c_j] if m == 0 else [c_j, c_m]
+    responses = [z_m, z_j] if m == 0 else [z_j, z_m]
+    return {
+        'A': [format(x, 'x') for x in A],
+        'B': [format(x, 'x') for x in B],
+        'c': [format(x, 'x') for x in challenges],
+        'z': [format(x, 'x') for x in responses],
+    }
+
+
+def prove_ballot(public_key: ElGamalPublicKey, candidate: str, voter_id: str,
+                 candidates=ELECTION_CANDIDATES):
+    """Encrypt a vote and prove it valid; returns (ballot, proof)"""
+    if candidate not in candidates:
+        raise ValueError(f"Unknown candidate: {candidate}")
+    p = public_key.p
+    g_table, h_table = public_key.tables
+
+    ciphertexts = {}
+    proofs = {}
+    total_r = 0
+    A, B = 1, 1
+    for name in candidates:
+        m = 1 if name == candidate else 0
+        r = secrets.randbits(EXPONENT_BITS)
+        a, b = public_key.encrypt(m, r)
+        ciphertexts[name] = [format(a, 'x'), format(b, 'x')]
+        proofs[name] = _prove_bit(public_key, _context(public_key, voter_id, name), a, b, m, r)
+        total_r += r
+        A, B = A * a % p, B * b % p
+
+    # (A, B/g) is a DH tuple with exponent total_r
+    w = secrets.randbits(NONCE_BITS)
+    T1, T2 = g_table.pow(w), h_table.pow(w)
+    c = _challenge(_context(public_key, voter_id, '*'), A, B, T1, T2)
+    ballot = {'scheme': SCHEME, 'key_id': public_key.key_id, 'ciphertexts': ciphertexts}
+    proof = {
+        'scheme': PROOF_SCHEME,
+        'candidates': proofs,
+        'sum': {'A': format(T1, 'x'), 'B': format(T2, 'x'), 'z': format(w + c * total_r, 'x')},
+    }
+    return ballot, proof
+
+
+def _element(value, p):
+    x = int(value, 16)
+    if not 0 < x < p:
+        raise InvalidProof('Group element out of range')
+    return x
+
+
+def _response(value):
+    z = int(value, 16)
+    if z.bit_length() > RESPONSE_BITS:
+        raise InvalidProof('Response out of range')
+    return z
+
+
+def ballot_equations(public_key: ElGamalPublicKey, ballot: dict, proof: dict, voter_id: str,
+                     candidates=ELECTION_CANDIDATES):
+    """
+    The group equations a valid proof satisfies, as (u, v, [(base, e), ...])
+    meaning g^u * h^v == prod(base^e). Hash and range checks happen here;
+    raises InvalidProof (or KeyError/ValueError for malformed documents).
+    """
+    p = public_key.p
+    if ballot.get('scheme') != SCHEME or ballot.get('key_id') != public_key.key_id:
+        raise InvalidProof('Ballot is not encrypted under this election key')
+    if proof.get('scheme') != PROOF_SCHEME:
+        raise InvalidProof(f"Unsupported proof scheme: {proof.get('scheme')}")
+    if set(ballot['ciphertexts']) != set(candidates):
+        raise InvalidProof('Ballot does not cover exactly the election candidates')
+
+    equations = []
+    A, B = 1, 1
+    for name in candidates:
+        a, b = (_element(x, p) for x in ballot['ciphertexts'][name])
+        bit = proof['candidates'][name]
+        A0, A1 = (_element(x, p) for x in bit['A'])
+        B0, B1 = (_element(x, p) for x in bit['B'])
+        c0, c1 = (int(x, 16) for x in bit['c'])
+        z0, z1 = (_response(x) for x in bit['z'])
+        if c0 >= CHALLENGE_MODULUS or c1 >= CHALLENGE_MODULUS:
+            raise InvalidProof('Challenge out of range')
+        c = _challenge(_context(public_key, voter_id, name), a, b, A0, B0, A1, B1)
+        if (c0 + c1) % CHALLENGE_MODULUS != c:
+            raise InvalidProof(f"Challenge mismatch for {name}")
+        equations += [
+            (z0, 0, [(A0, 1), (a, c0)]),        # g^z0 = A0 a^c0
+            (z1, 0, [(A1, 1), (a, c1)]),        # g^z1 = A1 a^c1
+            (0, z0, [(B0, 1), (b, c0)]),        # h^z0 = B0 b^c0
+            (c1, z1, [(B1, 1), (b, c1)]),       # h^z1 = B1 (b/g)^c1
+        ]
+        A, B = A * a % p, B * b % p
+
+    total = proof['sum']
+    T1, T2 = _element(total['A'], p), _element(total['B'], p)
+    z = _response(total['z'])
+    c = _challenge(_context(public_key, voter_id, '*'), A, B, T1, T2)
+    equations += [
+        (z, 0, [(T1, 1), (A, c)]),              # g^z = T1 A^c
+        (c, z, [(T2, 1), (B, c)]),              # h^z = T2 (B/g)^c
+    ]
+    return equations
+
+
+def verify_ballot(public_key: ElGamalPublicKey, ballot: dict, proof: dict, voter_id: str,
+                  candidates=ELECTION_CANDIDATES) -> bool:
+    """Check one ballot's proof equation by equation"""
+    try:
+        equations = ballot_equations(public_key, ballot, proof, voter_id, candidates)
+    except (InvalidProof, KeyError, TypeError, ValueError):
+        return False
+    p = public_key.p
+    g_table, h_table = public_key.tables
+    for u, v, terms in equations:
+        rhs = 1
+        for base, e in terms:
+            rhs = rhs * pow(base, e, p) % p
+        if g_table.pow(u) * h_table.pow(v) % p != rhs:
+            return False
+    return True
+
+
+def multi_exp(pairs, p: int) -> int:
+    """prod(base^e) mod p for non-negative e (Pippenger's bucket method)"""
+    pairs = [(base, e) for base, e in pairs if e]
+    if not pairs:
+        return 1
+    bits = max(e.bit_length() for _, e in pairs)
+    n = len(pairs)
+    window = min(range(1, 17), key=lambda w: math.ceil(bits / w) * (n + (1 << (w + 1))))
+    mask = (1 << window) - 1
+
+    result = 1
+    for shift in range((math.ceil(bits / window) - 1) * window, -1, -window):
+        if result != 1:
+            for _ in range(window):
+                result = result * result % p
+        buckets = [None] * (mask + 1)
+        for base, e in pairs:
+            digit = (e >> shift) & mask
+            if digit:
+                bucket = buckets[digit]
+                buckets[digit] = base if bucket is None else bucket * base % p
+        # prod(bucket[d]^d) as a product of running products
+        running = None
+        window_product = None
+        for digit in range(mask, 0, -1):
+            bucket = buckets[digit]
+            if bucket is not None:
+                running = bucket if running is None else running * bucket % p
+            if running is not None:
+                window_product = running if window_product is None else window_product * running % p
+        if window_product is not None:
+            result = result * window_product % p
+    return result
+
+
+def _check_batch(public_key, equations) -> bool:
+    """All equations at once, each raised to a random even weight"""
+    p, g, h = public_key.p, public_key.g, public_key.h
+    q = (p - 1) // 2
+    u_total = v_total = 0
+    rhs = {}
+    for u, v, terms in equations:
+        weight = (secrets.randbits(BATCH_WEIGHT_BITS) + 1) << 1
+        u_total += weight * u
+        v_total += weight * v
+        for base, e in terms:
+            rhs[base] = rhs.get(base, 0) + weight * e
+    # g and h generate the order-q subgroup, so their exponents reduce mod q
+    lhs = pow(g, u_total % q, p) * pow(h, v_total % q, p) % p
+    return lhs == multi_exp(rhs.items(), p)
+
+
+def _invalid_in(public_key, parsed, indices):
+    """Indices whose equations fail, bisecting failed batches"""
+    if not indices:
+        return []
+    if _check_batch(public_key, [eq for i in indices for eq in parsed[i]]):
+        return []
+    if len(indices) == 1:
+        return list(indices)
+    middle = len(indices) // 2
+    return _invalid_in(public_key, parsed, indices[:middle]) + _invalid_in(public_key, parsed, indices[middle:])
+
+
+def _verify_chunk(args):
+    h, offset, items, candidates = args
+    public_key = ElGamalPublicKey(h)
+    parsed = {}
+    invalid = []
+    for i, (ballot, proof, voter_id) in enumerate(items):
+        try:
+            parsed[i] = ballot_equations(public_key, ballot, proof, voter_id, candidates)
+        except (InvalidProof, KeyError, TypeError, ValueError):
+            invalid.append(i)
+    invalid += _invalid_in(public_key, parsed, list(parsed))
+    return [offset + i for i in sorted(invalid)]
+
+
+def verify_ballots(public_key: ElGamalPublicKey, items, workers: int = 1,
+                   batch_size: int = DEFAULT_BATCH_SIZE, candidates=ELECTION_CANDIDATES):
+    """
+    Batch-verify (ballot, proof, voter_id) items; returns the indices of the
+    invalid ones. Items are consumed in batches of batch_size, with at most
+    two batches per worker in flight when workers > 1.
+    """
+    candidates = tuple(candidates)
+
+    def batches():
+        batch = []
+        offset = 0
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield public_key.h, offset, batch, candidates
+                offset += len(batch)
+                batch = []
+        if batch:
+            yield public_key.h, offset, batch, candidates
+
+    invalid = []
+    if workers <= 1:
+        for batch in batches():
+            invalid += _verify_chunk(batch)
+        return invalid
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = []
+        for batch in batches():
+            in_flight.append(pool.submit(_verify_chunk, batch))
+            if len(in_flight) >= 2 * workers:
+                invalid += in_flight.pop(0).result()
+        for future in in_flight:
+            invalid += future.result()
+    return sorted(invalid)
+
+
+def main():
+    from pymongo import MongoClient
+    from app.database import MONGO_DB, MONGO_URI
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--database', default=MONGO_DB)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.database]
+    config = db.system_config.find_one({'key': ELECTION_KEY_CONFIG})
+    if not config:
+        print("❌ No election key in system_config")
+        sys.exit(1)
+    public_key = ElGamalPublicKey.from_dict(config['value'])
+
+    vote_ids = []
+    skipped = 0
+
+    def items():
+        nonlocal skipped
+        projection = {'_id': 0, 'vote_id': 1, 'voter_id': 1, 'encrypted_vote': 1, 'zkp': 1}
+        for vote in db.votes.find({}, projection).batch_size(5000):
+            try:
+                ballot = json.loads(vote['encrypted_vote'])
+                proof = json.loads(vote['zkp'])
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if ballot.get('scheme') != SCHEME:
+                skipped += 1
+                continue
+            vote_ids.append(vote.get('vote_id'))
+            yield ballot, proof, vote.get('voter_id')
+
+    start = time.perf_counter()
+    invalid = verify_ballots(public_key, items(), args.workers, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"🔍 {len(vote_ids)} ballot proofs checked in {elapsed:.1f}s"
+          f" ({skipped} legacy or unreadable ballots skipped)")
+    for index in invalid:
+        print(f"   ❌ invalid proof: vote {vote_ids[index]}")
+    print(f"{'❌' if invalid else '✅'} {len(invalid)} invalid")
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == '__main__':
+    main()
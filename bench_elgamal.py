@@ -0,0 +1,85 @@
+"""
+Throughput of exponential-ElGamal ballots: encrypt, aggregate, decrypt
+
+Encrypts synthetic ballots with and without the fixed-base tables, multiplies
+a large ballot stream per candidate (the distinct encrypted ballots are
+reused, which does not change the cost of a modular multiplication), and
+decrypts the tallies with baby-step giant-step.
+
+Usage: python -m app.bench_elgamal --encrypt 500 --aggregate 200000 --workers 4
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+
+from app.elgamal import (
+    ELECTION_CANDIDATES, EXPONENT_BITS, aggregate_ballots, decrypt_tally, generate_keypair
+)
+
+
+def timed(label, count, unit, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<34} {count / elapsed:>12,.0f} {unit}/s  ({elapsed:.2f}s)")
+    return result, elapsed
+
+
+def naive_encrypt(public_key, m):
+    r = random.getrandbits(EXPONENT_BITS)
+    return pow(public_key.g, r, public_key.p), pow(public_key.g, m, public_key.p) * pow(public_key.h, r, public_key.p) % public_key.p
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--encrypt', type=int, default=500, help='Ballots to encrypt')
+    parser.add_argument('--aggregate', type=int, default=200000, help='Ballots to aggregate')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    candidates = ELECTION_CANDIDATES
+    private_key = generate_keypair()
+    public_key = private_key.public
+    choices = [random.choice(candidates) for _ in range(args.encrypt)]
+    print(f"🗳  {len(candidates)} candidates, 2048-bit MODP group, {EXPONENT_BITS}-bit exponents")
+
+    _, setup = timed('fixed-base tables (g, h)', 1, 'build', lambda: public_key.tables)
+
+    print("\n🔐 Encrypt")
+    timed('pow() per exponentiation', args.encrypt, 'ballots',
+          lambda: [[naive_encrypt(public_key, int(name == c)) for name in candidates] for c in choices])
+    ballots, _ = timed('fixed-base tables', args.encrypt, 'ballots',
+                       lambda: [public_key.encrypt_ballot(c, candidates) for c in choices])
+
+    print("\n✖  Aggregate")
+    stream = lambda: itertools.islice(itertools.cycle(ballots), args.aggregate)
+    (aggregate, count), serial = timed('1 process', args.aggregate, 'ballots',
+                                       lambda: aggregate_ballots(stream(), candidates))
+    parallel_elapsed = None
+    if args.workers > 1:
+        (parallel, _), parallel_elapsed = timed(f'{args.workers} processes', args.aggregate, 'ballots',
+                                                 lambda: aggregate_ballots(stream(), candidates, workers=args.workers))
+        assert parallel == aggregate
+
+    print("\n🔓 Decrypt (one per candidate)")
+    counts, _ = timed('baby-step giant-step', len(candidates), 'tallies',
+                      lambda: decrypt_tally(private_key, aggregate, count))
+    repeats, remainder = divmod(args.aggregate, len(ballots))
+    expected = {name: choices.count(name) * repeats + choices[:remainder].count(name) for name in candidates}
+    print(f"   {'✅' if counts == expected else '❌'} decrypted {counts}")
+
+    large = 10_000_000
+    ciphertext = public_key.encrypt(large - 1)
+    timed(f'single tally up to {large:,}', 1, 'tallies', lambda: private_key.decrypt(ciphertext, large))
+
+    per_million = 1_000_000 / args.aggregate
+    print(f"\n📈 1M ballots: ~{serial * per_million:.0f}s to aggregate on 1 process", end='')
+    if parallel_elapsed:
+        print(f", ~{parallel_elapsed * per_million:.0f}s on {args.workers}", end='')
+    print()
+
+
+if __name__ == '__main__':
+    main()
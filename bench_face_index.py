@@ -0,0 +1,83 @@
+"""
+Benchmark the IVF face index against the exact brute-force index
+
+Usage: python -m app.bench_face_index --size 200000 --nprobe 4 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.face_index import FaceIndex, ENCODING_DIM
+from app.face_ann import IVFFaceIndex
+
+
+def synthetic_encodings(rng, size, groups=256):
+    """Clustered 128-d encodings with face_recognition-like distances"""
+    centers = rng.normal(0, 0.07, size=(groups, ENCODING_DIM))
+    members = rng.integers(0, groups, size=size)
+    return (centers[members] + rng.normal(0, 0.045, size=(size, ENCODING_DIM))).astype(np.float32)
+
+
+def synthetic_queries(rng, encodings, count):
+    """Half re-registrations of known faces, half brand-new faces"""
+    dup_rows = rng.integers(0, len(encodings), size=count // 2)
+    duplicates = encodings[dup_rows] + rng.normal(0, 0.03, size=(len(dup_rows), ENCODING_DIM))
+    fresh = synthetic_encodings(rng, count - len(dup_rows))
+    return np.vstack([duplicates, fresh])
+
+
+def timed_queries(index, queries):
+    answers = []
+    start = time.perf_counter()
+    for query in queries:
+        answers.append(index.find_duplicate(query))
+    elapsed = time.perf_counter() - start
+    return answers, elapsed / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--nlist', type=int, default=1024)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32, 64])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='Write the trained IVF index to this path')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    encodings = synthetic_encodings(rng, args.size)
+    queries = synthetic_queries(rng, encodings, args.queries)
+    voter_ids = [f"{i:08x}" for i in range(args.size)]
+
+    exact = FaceIndex(initial_capacity=args.size)
+    ivf = IVFFaceIndex(initial_capacity=args.size, nlist=args.nlist, seed=args.seed)
+    for voter_id, encoding in zip(voter_ids, encodings):
+        exact.add(voter_id, encoding)
+        ivf.add(voter_id, encoding)
+
+    start = time.perf_counter()
+    ivf.train()
+    print(f"Trained {args.nlist} cells over {args.size} encodings in {time.perf_counter() - start:.2f}s")
+
+    truth, exact_ms = timed_queries(exact, queries)
+    positives = sum(1 for is_dup, _ in truth if is_dup)
+    print(f"Brute force: {exact_ms:.3f} ms/query, {positives}/{len(queries)} duplicates")
+    print(f"{'nprobe':>8} {'ms/query':>10} {'speedup':>8} {'recall':>8} {'false+':>7}")
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        answers, ivf_ms = timed_queries(ivf, queries)
+        found = sum(1 for (t, _), (a, _) in zip(truth, answers) if t and a)
+        false_pos = sum(1 for (t, _), (a, _) in zip(truth, answers) if a and not t)
+        recall = found / positives if positives else 1.0
+        print(f"{nprobe:>8} {ivf_ms:>10.3f} {exact_ms / ivf_ms:>7.1f}x {recall:>8.4f} {false_pos:>7}")
+
+    if args.save:
+        ivf.save(args.save)
+        print(f"Saved IVF index to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
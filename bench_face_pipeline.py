@@ -0,0 +1,120 @@
+"""
+Benchmark the face-encoding pipeline stage by stage
+
+Runs encode_image inline for each --max-dimension setting (0 = full
+resolution, the old behaviour) and reports per-stage timings, then pushes
+--requests images through FaceEncodingEngine from --concurrency threads to
+measure throughput and queueing.
+
+Usage: python -m app.bench_face_pipeline --image face.jpg --max-dimension 0 640 480
+"""
+import argparse
+import base64
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.face_pipeline import STAGES, EngineBusy, FaceEncodingEngine, encode_image
+
+
+def load_image(path, width, height):
+    """Base64 data URL for the given image, or a synthetic frame when no path is given"""
+    if path:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    else:
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(frame).save(buffer, format='JPEG', quality=90)
+        raw = buffer.getvalue()
+    return 'data:image/jpeg;base64,' + base64.b64encode(raw).decode('ascii')
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(samples) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms"
+
+
+def bench_stages(image_data, args):
+    print(f"\n📏 Inline per-stage timings ({args.repeat} runs each, model={args.model}, upsample={args.upsample})")
+    for max_dimension in args.max_dimension:
+        per_stage = {stage: [] for stage in STAGES}
+        found = 0
+        for _ in range(args.repeat):
+            result = encode_image(image_data, model=args.model, upsample=args.upsample,
+                                  max_dimension=max_dimension)
+            found += result['encoding'] is not None
+            for stage in STAGES:
+                per_stage[stage].append(result['timings'][stage])
+        label = 'full' if not max_dimension else f"{max_dimension}px"
+        print(f"   max_dimension={label}  (face found in {found}/{args.repeat})")
+        for stage in STAGES:
+            print(f"      {stage:<10} {summarize(per_stage[stage])}")
+        totals = [sum(values) for values in zip(*per_stage.values())]
+        print(f"      {'total':<10} {summarize(totals)}")
+
+
+def bench_engine(image_data, args):
+    engine = FaceEncodingEngine(workers=args.workers or None, max_pending=args.max_pending or None,
+                                queue_timeout=30, model=args.model, upsample=args.upsample,
+                                max_dimension=args.max_dimension[-1])
+    # Start and warm the worker processes before timing
+    engine.encode(image_data)
+
+    latencies = []
+    rejected = 0
+
+    def one_request(_):
+        nonlocal rejected
+        start = time.perf_counter()
+        try:
+            engine.encode(image_data)
+        except EngineBusy:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as clients:
+        list(clients.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    metrics = engine.metrics()
+    engine.shutdown()
+
+    print(f"\n⚙  Engine: {metrics['workers']} workers, {args.concurrency} concurrent clients, "
+          f"max_dimension={metrics['max_dimension']}")
+    print(f"   throughput  {len(latencies) / elapsed:8.1f} images/s   rejected {rejected}")
+    if latencies:
+        print(f"   latency     {summarize(latencies)}")
+    print(f"   avg stages  {metrics['avg_stage_ms']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--image', help='Face photo to encode (default: synthetic noise frame)')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--model', choices=['hog', 'cnn'], default='hog')
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--max-dimension', type=int, nargs='+', default=[0, 640, 480])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--max-pending', type=int, default=0)
+    args = parser.parse_args()
+
+    image_data = load_image(args.image, args.width, args.height)
+    bench_stages(image_data, args)
+    bench_engine(image_data, args)
+
+
+if __name__ == '__main__':
+    main()
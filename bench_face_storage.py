@@ -0,0 +1,105 @@
+"""
+Compare face-encoding storage: BSON array of doubles vs packed float32 Binary
+
+Builds a synthetic users collection in both layouts and reports document
+size and the time to decode every document into an (n, 128) NumPy matrix,
+i.e. what the duplicate check and the face index sync do. With --mongo-uri
+it also loads both layouts into a scratch database and times a full find().
+
+Usage: python -m app.bench_face_storage --users 50000 [--mongo-uri mongodb://localhost:27017/]
+"""
+import argparse
+import time
+import uuid
+
+import bson
+import numpy as np
+
+from app.face_codec import ENCODING_DIM, decode_face_encodings, encode_face_encoding
+
+
+def synthetic_users(rng, count, packed):
+    encodings = rng.normal(0, 0.09, size=(count, ENCODING_DIM))
+    for encoding in encodings:
+        yield {
+            'voter_id': uuid.uuid4().hex[:8],
+            'name': 'x' * 44,
+            'face_encoding': encode_face_encoding(encoding) if packed else encoding.tolist(),
+            'has_voted': False
+        }
+
+
+def legacy_decode(users):
+    """The pre-migration read path: list of doubles -> np.array per user"""
+    return np.array([np.array(user['face_encoding']) for user in users])
+
+
+def packed_decode(users):
+    """The new read path: one frombuffer over all packed encodings"""
+    return decode_face_encodings(user['face_encoding'] for user in users)
+
+
+def bench_bson(docs, decode):
+    raw = [bson.encode(doc) for doc in docs]
+    start = time.perf_counter()
+    users = [bson.decode(data) for data in raw]
+    bson_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = decode(users)
+    numpy_seconds = time.perf_counter() - start
+    return sum(len(data) for data in raw), bson_seconds, numpy_seconds, matrix
+
+
+def bench_mongo(uri, docs_by_layout):
+    from pymongo import MongoClient
+
+    client = MongoClient(uri)
+    db = client[f'bench_face_storage_{uuid.uuid4().hex[:6]}']
+    try:
+        for layout, (docs, decode) in docs_by_layout.items():
+            collection = db[layout]
+            collection.insert_many([dict(doc) for doc in docs])
+            stats = db.command('collStats', layout)
+
+            start = time.perf_counter()
+            users = list(collection.find({}, {'voter_id': 1, 'face_encoding': 1}))
+            decode(users)
+            elapsed = time.perf_counter() - start
+            print(f"   {layout:<8} storage {stats['size'] / 2**20:8.2f} MiB   "
+                  f"find()+decode {elapsed * 1000:8.1f} ms")
+    finally:
+        client.drop_database(db.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--mongo-uri', help='Also measure against a real MongoDB')
+    args = parser.parse_args()
+
+    legacy_docs = list(synthetic_users(np.random.default_rng(args.seed), args.users, packed=False))
+    packed_docs = list(synthetic_users(np.random.default_rng(args.seed), args.users, packed=True))
+
+    print(f"\n📦 {args.users} synthetic users (BSON encode/decode in process)")
+    legacy = bench_bson(legacy_docs, legacy_decode)
+    packed = bench_bson(packed_docs, packed_decode)
+
+    for label, (size, bson_s, numpy_s, _) in (('array', legacy), ('binary', packed)):
+        print(f"   {label:<8} {size / args.users:7.0f} B/doc   bson.decode {bson_s * 1000:8.1f} ms   "
+              f"to numpy {numpy_s * 1000:8.1f} ms")
+    print(f"   size -{(1 - packed[0] / legacy[0]) * 100:.0f}%   "
+          f"decode x{(legacy[1] + legacy[2]) / (packed[1] + packed[2]):.1f} faster")
+    print(f"   max |float32 - float64| = {np.abs(legacy[3] - packed[3]).max():.2e}")
+
+    if args.mongo_uri:
+        print("\n🗄  MongoDB collection")
+        bench_mongo(args.mongo_uri, {
+            'array': (legacy_docs, legacy_decode),
+            'binary': (packed_docs, packed_decode)
+        })
+
+
+if __name__ == '__main__':
+    main()
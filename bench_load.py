@@ -0,0 +1,501 @@
+"""
+Load generator for /register, /login, /vote and /results
+
+By default the Flask app runs in this process against stand-ins for
+everything external:
+- the stub Fabric gateway (fabric_gateway_stub) with configurable
+  endorse/commit latency and failure rate
+- stub peer liveness
+- an in-memory MongoDB (mongomock)
+- synthetic face images
+
+A synthetic image carries its voter's seed, and its encoding is derived
+from it, so a voter's login frame matches their registration frame and
+nobody else's. Use --target to drive a running deployment over HTTP
+instead. Real faces are needed there unless the server itself runs with
+synthetic encodings.
+
+Each scenario (register, login, vote, results) runs at --concurrency. The
+report shows throughput, status codes and latency percentiles per
+endpoint. In-process runs also report ledger commit latency through the
+vote outbox and the server's per-phase histograms (metrics.py). Everything
+is written to --output as JSON for regression tracking.
+
+A run is marked invalid ("valid": false with the reasons under "problems")
+and exits with status 1 when a scenario's error rate is above
+--max-error-rate, when voters are skipped because the previous scenario
+gave them no voter ID or session, when a scenario sends no requests, or
+when the ledger outbox does not drain. The numbers of an invalid run
+measure failures, not the system.
+
+Usage: python -m app.bench_load --voters 200 --concurrency 16 --output bench_load.json
+       python -m app.bench_load --endorse-latency-ms 20 --commit-latency-ms 250 --failure-rate 0.02
+       python -m app.bench_load --target http://localhost:5000 --voters 50
+"""
+import argparse
+import asyncio
+import base64
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from app.metrics import QUANTILES, LatencyHistogram
+
+FACE_SEED_KEY = 'face_seed'
+NO_FACE_ERROR = 'No face detected. Please try again.'
+CANDIDATES = [c.strip() for c in os.environ.get('ELECTION_CANDIDATES', 'ADMK,DMK,NTK').split(',') if c.strip()]
+
+
+def synthetic_face(seed, frame=0, size=96):
+    """PNG data URL: a noise frame that differs per capture, with the voter's seed in a tEXt chunk"""
+    rng = np.random.default_rng([seed, frame])
+    pixels = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    info = PngInfo()
+    info.add_text(FACE_SEED_KEY, str(seed))
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG', pnginfo=info)
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def synthetic_encoding(image_data):
+    """
+    (128-d encoding, error) with the same contract as FaceEncodingEngine.encode.
+    Voters sit ~1.6 apart; two captures of one voter ~0.1 apart (match tolerance 0.5-0.6).
+    """
+    face_data = image_data.split(',')[1] if ',' in image_data else image_data
+    image = Image.open(io.BytesIO(base64.b64decode(face_data)))
+    seed = getattr(image, 'text', {}).get(FACE_SEED_KEY)
+    if seed is None:
+        return None, NO_FACE_ERROR
+    identity = np.random.default_rng(int(seed)).normal(0.0, 0.1, 128)
+    capture = np.random.default_rng(zlib.crc32(image.tobytes())).normal(0.0, 0.005, 128)
+    return (identity + capture).tolist(), None
+
+
+class SyntheticFaceEngine:
+    """FaceEncodingEngine stand-in: synthetic encodings plus a simulated per-image encode time"""
+
+    def __init__(self, workers=4, encode_seconds=0.0):
+        self.workers = workers
+        self.encode_seconds = encode_seconds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='synthetic-face')
+
+    def _encode(self, image_data):
+        started = time.perf_counter()
+        encoding, error = synthetic_encoding(image_data)
+        remaining = self.encode_seconds - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        return {'encoding': encoding, 'error': error, 'timings': {}, 'finished_at': time.time()}
+
+    def submit(self, image_data):
+        return self._pool.submit(self._encode, image_data)
+
+    def encode(self, image_data):
+        result = self.submit(image_data).result()
+        return result['encoding'], result['error']
+
+    async def aencode(self, image_data):
+        result = await asyncio.wrap_future(self.submit(image_data))
+        return result['encoding'], result['error']
+
+    def metrics(self) -> dict:
+        return {'synthetic': True, 'workers': self.workers, 'encode_ms': self.encode_seconds * 1000}
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+class StubPeerProbe:
+    """PeerLivenessMonitor probe that reports each peer down with probability down_rate"""
+
+    name = 'stub'
+
+    def __init__(self, down_rate=0.0):
+        self.down_rate = down_rate
+
+    def __call__(self, validator_id, endpoint):
+        return random.random() >= self.down_rate
+
+
+def patch_mongomock(mongomock):
+    """
+    Adapt mongomock to current PyMongo: it does not understand UpdateOne
+    objects in bulk_write, and stores IndexModel keys in a form that makes a
+    later identical create_index look like a conflicting one.
+    """
+    from pymongo import UpdateOne
+    collection_cls = mongomock.collection.Collection
+    original_bulk_write = collection_cls.bulk_write
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        requests = list(requests)
+        if not all(isinstance(op, UpdateOne) for op in requests):
+            return original_bulk_write(self, requests, ordered=ordered, **kwargs)
+        for op in requests:
+            self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    def create_indexes(self, indexes, session=None, **kwargs):
+        names = []
+        for model in indexes:
+            options = dict(model.document)
+            keys = list(options.pop('key').items())
+            names.append(self.create_index(keys, **options))
+        return names
+
+    collection_cls.bulk_write = bulk_write
+    collection_cls.create_indexes = create_indexes
+
+
+class AppClient:
+    """One virtual user against the in-process Flask app (own cookie jar)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class HttpClient:
+    """One virtual user against a running server: keep-alive connection plus session cookies"""
+
+    def __init__(self, base_url, timeout=60):
+        parsed = urlsplit(base_url)
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if self.https else 80)
+        self.base_path = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.cookies = {}
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._connection = cls(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+    def request(self, method, path, body=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        for attempt in range(2):
+            connection = self._connect()
+            try:
+                connection.request(method, self.base_path + path, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Server closed the keep-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class EndpointStats:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def skip(self):
+        """A voter that could not run this scenario (no voter ID or session from the previous one)"""
+        with self._lock:
+            self.skipped += 1
+
+    def record(self, seconds, status):
+        self.histogram.record_ns(seconds * 1e9)
+        with self._lock:
+            self.statuses[str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors += 1
+
+    def report(self, wall_seconds):
+        snapshot = self.histogram.snapshot()
+        _, count, total_ns, max_ns = snapshot
+        quantiles = self.histogram.quantiles_ns(snapshot=snapshot)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0,
+            'skipped': self.skipped,
+            'statuses': dict(self.statuses),
+            'wall_s': round(wall_seconds, 3),
+            'throughput_rps': round(count / wall_seconds, 2) if wall_seconds else 0,
+            'mean_ms': round(total_ns / count / 1e6, 3) if count else 0,
+            **{f"p{int(q * 100)}_ms": round(quantiles[q] / 1e6, 3) for q in QUANTILES},
+            'max_ms': round(max_ns / 1e6, 3)
+        }
+
+
+def call(stats, client, method, path, body=None):
+    started = time.perf_counter()
+    try:
+        status, data = client.request(method, path, body)
+    except Exception as e:
+        status, data = type(e).__name__, {'error': str(e)}
+    stats.record(time.perf_counter() - started, status)
+    return status, data
+
+
+def run_scenario(name, items, concurrency, func):
+    """Run func over items from concurrency threads; returns (stats, wall seconds)"""
+    stats = EndpointStats()
+    print(f"\n🚦 {name}: {len(items)} requests, concurrency {concurrency}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda item: func(stats, item), items))
+    wall = time.perf_counter() - started
+    report = stats.report(wall)
+    print(f"   {report['throughput_rps']:>8.1f} req/s   p50 {report['p50_ms']:>8.2f} ms   "
+          f"p95 {report['p95_ms']:>8.2f} ms   p99 {report['p99_ms']:>8.2f} ms   "
+          f"errors {report['errors']}  skipped {report['skipped']}  {report['statuses']}")
+    return report
+
+
+class Voter:
+    def __init__(self, seed, client):
+        self.seed = seed
+        self.client = client
+        self.voter_id = None
+        self.token = None
+
+
+def register(stats, voter):
+    status, data = call(stats, voter.client, 'POST', '/register', {
+        'name': f"Load Voter {voter.seed}",
+        'email': f"voter{voter.seed}@example.com",
+        'phone': f"9{voter.seed:09d}",
+        'address': f"{voter.seed} Benchmark Street",
+        'face_image': synthetic_face(voter.seed, frame=0)
+    })
+    if status == 200 and data:
+        voter.voter_id = data.get('voter_id')
+
+
+def login(stats, voter):
+    if not voter.voter_id:
+        stats.skip()
+        return
+    status, data = call(stats, voter.client, 'POST', '/login', {
+        'voter_id': voter.voter_id,
+        'face_image': synthetic_face(voter.seed, frame=1)
+    })
+    if status == 200 and data:
+        voter.token = data.get('token')
+
+
+def vote(stats, voter):
+    if not voter.token:
+        stats.skip()
+        return
+    call(stats, voter.client, 'POST', '/vote', {'token': voter.token, 'candidate': random.choice(CANDIDATES)})
+    voter.client.close()
+
+
+def start_in_process(args, workdir):
+    """Stub gateway, in-memory Mongo and synthetic faces; returns (flask app, routes module)"""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("In-process mode needs mongomock (pip install mongomock), or use --target")
+
+    from app.fabric_gateway_stub import make_server
+    gateway = make_server(port=0, evaluate_latency=args.endorse_latency_ms / 1000,
+                          submit_latency=args.commit_latency_ms / 1000, failure_rate=args.failure_rate)
+    threading.Thread(target=gateway.serve_forever, name='stub-gateway', daemon=True).start()
+
+    # Read at import time by blockchain.py, elgamal.py and the vote pipeline
+    os.environ['FABRIC_TRANSPORT'] = 'gateway'
+    os.environ['FABRIC_GATEWAY_URL'] = f"http://127.0.0.1:{gateway.server_port}"
+    os.environ['ELECTION_KEY_DIR'] = os.path.join(workdir, 'election_keys')
+    os.environ.setdefault('VOTE_FLUSH_INTERVAL', '0.2')
+
+    from app import database
+    patch_mongomock(mongomock)
+    database._client = mongomock.MongoClient()
+    database._client_pid = os.getpid()
+    # The keygen step of a deployment, then the key tables the asyncio app builds at startup
+    from app.elgamal import election_public_key, provision_election_key
+    provision_election_key(database.collection('system_config'), os.environ['ELECTION_KEY_DIR'])
+    election_public_key().tables
+
+    from app import app
+    from app import routes
+    routes.face_engine = SyntheticFaceEngine(args.face_workers, args.face_encode_ms / 1000)
+    routes.hybrid_consensus.peer_monitor.probe = StubPeerProbe(args.peer_down_rate)
+    print(f"🧪 In-process app: stub gateway on :{gateway.server_port}, mongomock, synthetic faces")
+    return app, routes
+
+
+def drain_ledger(routes, timeout):
+    """Wait for the vote outbox to empty; ledger commit latency from enqueue to commit"""
+    outbox = routes.vote_outbox
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not outbox.count_documents({'status': {'$in': ['queued', 'submitting']}}):
+            break
+        time.sleep(0.1)
+
+    histogram = LatencyHistogram()
+    statuses = Counter()
+    for entry in outbox.find({}, {'status': 1, 'created_at': 1, 'committed_at': 1}):
+        statuses[entry['status']] += 1
+        if entry.get('committed_at'):
+            histogram.record_ns((entry['committed_at'] - entry['created_at']).total_seconds() * 1e9)
+    snapshot = histogram.snapshot()
+    quantiles = histogram.quantiles_ns(snapshot=snapshot)
+    return {
+        'statuses': dict(statuses),
+        'drained': not statuses.get('queued') and not statuses.get('submitting'),
+        **{f"commit_p{int(q * 100)}_ms": round(quantiles[q] / 1e6, 3) for q in QUANTILES},
+        'commit_max_ms': round(snapshot[3] / 1e6, 3)
+    }
+
+
+def find_problems(endpoints, ledger, max_error_rate):
+    """Reasons the run does not measure a working system; empty when it is valid"""
+    problems = []
+    for endpoint, report in endpoints.items():
+        if report['skipped']:
+            problems.append(f"{endpoint}: {report['skipped']} voters skipped, "
+                            f"the previous scenario gave them no voter ID or session")
+        if not report['requests']:
+            problems.append(f"{endpoint}: no requests were sent")
+        elif report['error_rate'] > max_error_rate:
+            problems.append(f"{endpoint}: error rate {report['error_rate']:.2%} is above {max_error_rate:.2%} "
+                            f"({report['statuses']})")
+    if ledger is not None and not ledger['drained']:
+        problems.append(f"ledger: outbox not drained ({ledger['statuses']})")
+    return problems
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.realpath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', help='Base URL of a running server (default: run the app in-process)')
+    parser.add_argument('--voters', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--results-reads', type=int, default=0, help='GET /results requests (default: 2 x voters)')
+    parser.add_argument('--scenarios', default='register,login,vote,results')
+    parser.add_argument('--endorse-latency-ms', type=float, default=5.0, help='Stub gateway evaluate delay')
+    parser.add_argument('--commit-latency-ms', type=float, default=50.0, help='Stub gateway submit delay')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of stub gateway calls that fail')
+    parser.add_argument('--peer-down-rate', type=float, default=0.0, help='Share of liveness probes that fail')
+    parser.add_argument('--face-encode-ms', type=float, default=0.0, help='Simulated face encoding time')
+    parser.add_argument('--face-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--drain-timeout', type=float, default=60.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='Highest share of failed requests per scenario for a valid run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_load.json')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.target:
+            app, routes = None, None
+            new_client = lambda: HttpClient(args.target)
+        else:
+            app, routes = start_in_process(args, workdir)
+            new_client = lambda: AppClient(app)
+
+        # A live server keeps earlier runs' voters; fresh faces avoid duplicate-face rejections
+        base_seed = int(time.time() * 1000) % 10 ** 12 if args.target else args.seed * 1_000_000
+        voters = [Voter(base_seed + i, new_client()) for i in range(args.voters)]
+        endpoints = {}
+
+        if 'register' in scenarios:
+            endpoints['/register'] = run_scenario('POST /register', voters, args.concurrency, register)
+        if 'login' in scenarios:
+            endpoints['/login'] = run_scenario('POST /login', voters, args.concurrency, login)
+        if 'vote' in scenarios:
+            endpoints['/vote'] = run_scenario('POST /vote', voters, args.concurrency, vote)
+        if 'results' in scenarios:
+            reads = args.results_reads or 2 * args.voters
+            readers = [new_client() for _ in range(args.concurrency)]
+            endpoints['/results'] = run_scenario(
+                'GET /results', list(range(reads)), args.concurrency,
+                lambda stats, i: call(stats, readers[i % len(readers)], 'GET', '/results')
+            )
+
+        report = {
+            'benchmark': 'bench_load',
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'mode': 'http' if args.target else 'in-process',
+            'config': vars(args),
+            'endpoints': endpoints
+        }
+        if routes is not None:
+            print("\n⏳ Waiting for the vote outbox to reach the ledger...")
+            report['ledger'] = ledger = drain_ledger(routes, args.drain_timeout)
+            print(f"   {ledger['statuses']}  commit p50 {ledger['commit_p50_ms']} ms  p99 {ledger['commit_p99_ms']} ms")
+            from app.metrics import registry
+            report['server_phases'] = registry.summary()
+
+    problems = find_problems(endpoints, report.get('ledger'), args.max_error_rate)
+    report['valid'] = not problems
+    report['problems'] = problems
+
+    with open(args.output, 'w', encoding='utf-8') as out:
+        json.dump(report, out, indent=2, default=str)
+    if problems:
+        print(f"\n❌ Run is invalid, results written to {args.output}:")
+        for problem in problems:
+            print(f"   - {problem}")
+        sys.exit(1)
+    print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,124 +1,450 @@
+import asyncio
 import subprocess
 import json
 import os
-from pymongo import MongoClient
+import queue
+import re
+import ssl
+import threading
+import http.client
+import tempfile
+from urllib.parse import urlsplit
+from app.database import get_db
+from app.event_log import get_logger
+from app.fabric_config import FabricConfig, get_fabric_config
+from app.tally import VoteTally
+from app.vote_export import iter_json_array
+
+FABRIC_PATH = get_fabric_config().fabric_path
+CHAINCODE_NAME = get_fabric_config().chaincode_name
+CHANNEL_NAME = get_fabric_config().channel_name
+
+# Fabric gateway service (see fabric_gateway.js); empty means use the peer CLI
+FABRIC_GATEWAY_URL = os.environ.get('FABRIC_GATEWAY_URL', '')
+FABRIC_TRANSPORT = os.environ.get('FABRIC_TRANSPORT', 'gateway' if FABRIC_GATEWAY_URL else 'cli')
+
+# Votes per getVotesPage query when streaming the ledger
+VOTE_PAGE_SIZE = int(os.environ.get('VOTE_PAGE_SIZE', 1000))
+
+log = get_logger('blockchain')
+
+
+class SubprocessTransport:
+    """
+    Runs every chaincode call as a fresh `peer chaincode` CLI process.
+    Thread-safe: the environment and working directory come from the shared
+    FabricConfig and are passed to the child instead of changing our own.
+    """
+    
+    def __init__(self, config: FabricConfig = None, timeout=30):
+        self.config = config or get_fabric_config()
+        self.timeout = timeout
+    
+    def execute(self, command_type, function, args):
+        """Execute peer chaincode commands"""
+        cmd = self.config.peer_command(command_type, function, args)
+        return subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=self.timeout,
+            env=self.config.env,
+            cwd=self.config.fabric_path
+        )
+    
+    async def aexecute(self, command_type, function, args):
+        """Async variant of execute using an asyncio subprocess"""
+        cmd = self.config.peer_command(command_type, function, args)
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=dict(self.config.env),
+            cwd=self.config.fabric_path
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(list(cmd), self.timeout)
+        return subprocess.CompletedProcess(list(cmd), process.returncode, stdout.decode(), stderr.decode())
+    
+    def stream(self, command_type, function, args, chunk_size=65536):
+        """
+        Yield the command's stdout in text chunks instead of buffering it all.
+        The process is killed if it produces nothing for `timeout` seconds;
+        raises CalledProcessError if it exits non-zero.
+        """
+        cmd = self.config.peer_command(command_type, function, args)
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=self.config.env,
+                cwd=self.config.fabric_path
+            )
+            watchdog = None
+            try:
+                while True:
+                    watchdog = threading.Timer(self.timeout, process.kill)
+                    watchdog.daemon = True
+                    watchdog.start()
+                    chunk = process.stdout.read1(chunk_size)
+                    watchdog.cancel()
+                    if not chunk:
+                        break
+                    yield chunk.decode('utf-8')
+            finally:
+                if watchdog:
+                    watchdog.cancel()
+                if process.poll() is None:
+                    process.kill()
+                process.stdout.close()
+                process.wait()
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(
+                    process.returncode, list(cmd), stderr=stderr.read().decode('utf-8', 'replace')
+                )
+    
+    def close(self):
+        pass
+
+
+class _PooledHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that resumes the pool's last TLS session on reconnect"""
+    
+    def __init__(self, host, port, pool, **kwargs):
+        super().__init__(host, port, context=pool.ssl_context, **kwargs)
+        self._pool = pool
+    
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(
+            self.sock,
+            server_hostname=self.host,
+            session=self._pool.tls_session
+        )
+        self._pool.tls_session = self.sock.session
+
+
+class GatewayTransport:
+    """
+    Talks to a long-lived Fabric gateway service over pooled keep-alive HTTP.
+    
+    The gateway keeps its gRPC connections to the peers and orderer open, so a
+    chaincode call here costs one request on an already-open connection instead
+    of a process spawn plus TLS and gRPC setup. At most max_connections calls
+    are in flight at once; further callers wait up to acquire_timeout.
+    """
+    
+    def __init__(self, base_url, max_connections=16, timeout=30, acquire_timeout=30,
+                 cafile=None, certfile=None, keyfile=None,
+                 channel_name=CHANNEL_NAME, chaincode_name=CHAINCODE_NAME):
+        parsed = urlsplit(base_url)
+        self.scheme = parsed.scheme or 'http'
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.channel_name = channel_name
+        self.chaincode_name = chaincode_name
+        
+        self.ssl_context = None
+        self.tls_session = None
+        if self.scheme == 'https':
+            self.ssl_context = ssl.create_default_context(cafile=cafile)
+            if certfile:
+                self.ssl_context.load_cert_chain(certfile, keyfile)
+        
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = queue.LifoQueue()
+    
+    def execute(self, command_type, function, args):
+        """Evaluate (query) or submit (invoke) a chaincode function"""
+        endpoint = 'submit' if command_type == 'invoke' else 'evaluate'
+        body = json.dumps({
+            'channel': self.channel_name,
+            'chaincode': self.chaincode_name,
+            'function': function,
+            'args': list(args)
+        })
+        
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError('Timed out waiting for a Fabric gateway connection')
+        try:
+            status, payload = self._request(f'{self.base_path}/{endpoint}', body)
+        finally:
+            self._slots.release()
+        
+        try:
+            data = json.loads(payload) if payload else {}
+        except ValueError:
+            data = {'error': payload.decode('utf-8', 'replace')}
+        
+        cmd = [endpoint, function] + list(args)
+        if status == 200:
+            return subprocess.CompletedProcess(cmd, 0, data.get('result', ''), '')
+        return subprocess.CompletedProcess(cmd, 1, '', data.get('error', f'Gateway HTTP {status}'))
+    
+    async def aexecute(self, command_type, function, args):
+        """Async variant of execute; the pooled connection is used from a worker thread"""
+        return await asyncio.to_thread(self.execute, command_type, function, args)
+    
+    def poll_events(self, since=0, timeout=25):
+        """
+        Long-poll the gateway for chaincode events with sequence >= since
+        Returns: (events, next_since)
+        """
+        # Long polls hold a connection for a while, so they bypass the pool
+        conn = self._new_connection()
+        conn.timeout = timeout + 10
+        try:
+            conn.request('GET', f'{self.base_path}/events?since={since}&timeout={timeout}')
+            response = conn.getresponse()
+            payload = response.read()
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError(f'Gateway events HTTP {response.status}')
+        data = json.loads(payload)
+        return data.get('events', []), data.get('next', since)
+    
+    def _request(self, path, body):
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        conn, reused = self._checkout()
+        
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # Idle keep-alive connection was closed by the server; retry once
+            conn = self._new_connection()
+            try:
+                conn.request('POST', path, body=body, headers=headers)
+                response = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        
+        try:
+            payload = response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        return response.status, payload
+    
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+    
+    def _new_connection(self):
+        if self.scheme == 'https':
+            return _PooledHTTPSConnection(self.host, self.port, self, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_default_transport = None
+_transport_lock = threading.Lock()
+
+def get_default_transport():
+    """Process-wide transport selected by FABRIC_TRANSPORT (gateway or cli)"""
+    global _default_transport
+    with _transport_lock:
+        if _default_transport is None:
+            if FABRIC_TRANSPORT == 'gateway':
+                _default_transport = GatewayTransport(
+                    FABRIC_GATEWAY_URL or 'http://localhost:8800',
+                    max_connections=int(os.environ.get('FABRIC_GATEWAY_POOL_SIZE', 16)),
+                    cafile=os.environ.get('FABRIC_GATEWAY_CAFILE'),
+                    certfile=os.environ.get('FABRIC_GATEWAY_CERTFILE'),
+                    keyfile=os.environ.get('FABRIC_GATEWAY_KEYFILE')
+                )
+            else:
+                _default_transport = SubprocessTransport()
+        return _default_transport
 
-FABRIC_PATH = os.path.expanduser('~/blockchain-voting/fabric-samples/test-network')
-CHAINCODE_NAME = 'voting'
-CHANNEL_NAME = 'mychannel'
 
 class BlockchainClient:
     """Blockchain client for Hyperledger Fabric voting system"""
     
-    def _init_(self):
-        self.fabric_path = FABRIC_PATH
-        self.chaincode_name = CHAINCODE_NAME
-        self.channel_name = CHANNEL_NAME
+    def __init__(self, transport=None, config: FabricConfig = None):
+        self.config = config or get_fabric_config()
+        self.fabric_path = self.config.fabric_path
+        self.chaincode_name = self.config.chaincode_name
+        self.channel_name = self.config.channel_name
+        if transport is None:
+            transport = get_default_transport() if config is None else SubprocessTransport(config)
+        self.transport = transport
         
     def _execute_peer_command(self, command_type, function, args=[]):
-        """Execute peer chaincode commands"""
-        try:
-            original_dir = os.getcwd()
-            os.chdir(self.fabric_path)
-            
-            env = os.environ.copy()
-            env['PATH'] = f"{self.fabric_path}/../bin:" + env.get('PATH', '')
-            env['FABRIC_CFG_PATH'] = f'{self.fabric_path}/../config/'
-            env['CORE_PEER_TLS_ENABLED'] = 'true'
-            env['CORE_PEER_LOCALMSPID'] = 'Org1MSP'
-            env['CORE_PEER_TLS_ROOTCERT_FILE'] = f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt'
-            env['CORE_PEER_MSPCONFIGPATH'] = f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/users/Admin@org1.example.com/msp'
-            env['CORE_PEER_ADDRESS'] = 'localhost:7051'
-            
-            if command_type == 'invoke':
-                cmd = [
-                    'peer', 'chaincode', 'invoke',
-                    '-o', 'localhost:7050',
-                    '--ordererTLSHostnameOverride', 'orderer.example.com',
-                    '--tls',
-                    '--cafile', f'{self.fabric_path}/organizations/ordererOrganizations/example.com/orderers/orderer.example.com/msp/tlscacerts/tlsca.example.com-cert.pem',
-                    '-C', self.channel_name,
-                    '-n', self.chaincode_name,
-                    '--peerAddresses', 'localhost:7051',
-                    '--tlsRootCertFiles', f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt',
-                    '--peerAddresses', 'localhost:9051',
-                    '--tlsRootCertFiles', f'{self.fabric_path}/organizations/peerOrganizations/org2.example.com/peers/peer0.org2.example.com/tls/ca.crt',
-                    '-c', json.dumps({"function": function, "Args": args})
-                ]
-            else:
-                cmd = [
-                    'peer', 'chaincode', 'query',
-                    '-C', self.channel_name,
-                    '-n', self.chaincode_name,
-                    '-c', json.dumps({"function": function, "Args": args})
-                ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30, env=env)
-            os.chdir(original_dir)
-            
-            return result
-            
-        except Exception as e:
-            os.chdir(original_dir)
-            raise e
+        """Execute chaincode commands through the configured transport"""
+        return self.transport.execute(command_type, function, args)
+    
+    async def _aexecute_peer_command(self, command_type, function, args=[]):
+        """Async variant of _execute_peer_command"""
+        return await self.transport.aexecute(command_type, function, args)
         
     def submit_vote(self, voter_id, candidate):
         """Submit a vote to the blockchain"""
         try:
-            print(f"Submitting vote to blockchain: {voter_id} -> {candidate}")
-            
             result = self._execute_peer_command('invoke', 'submitVote', [voter_id, candidate])
             
             if result.returncode == 0:
-                print(f"✅ Vote submitted to blockchain successfully!")
+                log.info('vote_submitted', voter_id=voter_id)
                 return {'success': True, 'message': 'Vote submitted to blockchain'}
             else:
-                print(f"❌ Blockchain submission failed: {result.stderr}")
+                log.error('vote_submit_failed', voter_id=voter_id, error=result.stderr)
                 return {'success': False, 'error': result.stderr}
                 
         except Exception as e:
-            print(f"❌ Blockchain error: {str(e)}")
+            log.error('vote_submit_failed', voter_id=voter_id, error=str(e))
             return {'success': False, 'error': str(e)}
     
+    def submit_vote_batch(self, votes):
+        """
+        Submit many votes in one transaction
+        votes: list of {'voteID', 'voterID', 'candidate'}
+        Returns: {'success': bool, 'statuses': {vote_id: status}} or {'success': False, 'error': ...}
+        """
+        try:
+            result = self._execute_peer_command('invoke', 'submitVoteBatch', [json.dumps(votes)])
+
+            if result.returncode != 0:
+                log.error('batch_submit_failed', votes=len(votes), error=result.stderr)
+                return {'success': False, 'error': result.stderr}
+
+            statuses = self._invoke_payload(result)
+            if statuses is None:
+                # CLI output without a readable payload: the whole batch went through
+                statuses = {vote['voteID']: 'committed' for vote in votes}
+
+            log.info('batch_submitted', votes=len(votes))
+            return {'success': True, 'statuses': statuses}
+
+        except Exception as e:
+            log.error('batch_submit_failed', votes=len(votes), error=str(e))
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _invoke_payload(result):
+        """Decode the JSON returned by an invoke (gateway stdout or CLI `payload:"..."`)"""
+        text = result.stdout.strip()
+        if not text:
+            match = re.search(r'payload:"(.*)"\s*$', result.stderr or '')
+            if not match:
+                return None
+            try:
+                text = json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                return None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def iter_votes(self, page_size=None, bookmark='', prefix=''):
+        """
+        Yield every vote on the ledger (or every vote whose voter ID starts
+        with prefix) in voter ID order, one getVotesPage query per page, so
+        memory is bounded by a page however large the ledger is. Chaincode
+        without getVotesPage falls back to streaming getAllVotes through the
+        incremental JSON parser.
+        """
+        page_size = page_size or VOTE_PAGE_SIZE
+        while True:
+            args = [str(page_size), bookmark] + ([prefix] if prefix else [])
+            result = self._execute_peer_command('query', 'getVotesPage', args)
+            if result.returncode != 0:
+                if not bookmark and 'does not exist' in (result.stderr or ''):
+                    log.warning('votes_page_unsupported', fallback='getAllVotes')
+                    for vote in self._iter_all_votes():
+                        # getAllVotes also returns the VOTE_COUNTS record
+                        if vote.get('docType') == 'vote' and str(vote.get('voterID', '')).startswith(prefix):
+                            yield vote
+                    return
+                raise RuntimeError(f"getVotesPage failed: {result.stderr}")
+            
+            page = json.loads(result.stdout)
+            yield from page.get('records', [])
+            bookmark = page.get('bookmark') or ''
+            if not bookmark or not page.get('fetched'):
+                return
+    
+    def get_digest_children(self, prefix=''):
+        """Ledger range digest of a voter ID prefix and its children (see ledger_reconcile)"""
+        result = self._execute_peer_command('query', 'getDigestChildren', [prefix])
+        if result.returncode != 0:
+            raise RuntimeError(f"getDigestChildren failed: {result.stderr}")
+        return json.loads(result.stdout)
+    
+    def _iter_all_votes(self):
+        if hasattr(self.transport, 'stream'):
+            yield from iter_json_array(self.transport.stream('query', 'getAllVotes', []))
+            return
+        result = self._execute_peer_command('query', 'getAllVotes', [])
+        if result.returncode != 0:
+            raise RuntimeError(f"getAllVotes failed: {result.stderr}")
+        yield from iter_json_array([result.stdout])
+    
     def get_results(self):
         """Get voting results from blockchain"""
+        results = self.get_ledger_results()
+        if results is None:
+            log.warning('results_query_failed', fallback='mongodb')
+            return self.get_results_from_mongodb()
+        log.debug('results', source='ledger', results=results)
+        return results
+    
+    def get_ledger_results(self):
+        """Vote counts from the chaincode, or None if the ledger can't be queried"""
         try:
-            print("Querying results from blockchain...")
-            
             result = self._execute_peer_command('query', 'getResults', [])
-            
             if result.returncode == 0:
-                results = json.loads(result.stdout.strip())
-                print(f"✅ Blockchain results: {results}")
-                return results
-            else:
-                print(f"❌ Blockchain query failed, using MongoDB fallback")
-                return self.get_results_from_mongodb()
-                
+                return json.loads(result.stdout.strip())
+            return None
         except Exception as e:
-            print(f"❌ Blockchain error: {str(e)}, using MongoDB fallback")
-            return self.get_results_from_mongodb()
+            log.error('results_query_error', error=str(e))
+            return None
     
     def get_results_from_mongodb(self):
-        """Fallback: Get results from MongoDB"""
+        """Fallback: Get results from the MongoDB vote tally"""
         try:
-            client = MongoClient('mongodb://localhost:27017/')
-            db = client['voting_system']
-            votes_collection = db.votes
-            
-            results = {}
-            all_votes = votes_collection.find()
+            db = get_db()
+            tally = VoteTally(db.vote_tally, db.votes)
             
-            for vote in all_votes:
-                candidate = vote.get('candidate')
-                if candidate:
-                    results[candidate] = results.get(candidate, 0) + 1
+            results = tally.results()
+            if results is None:
+                # Tally not built yet (reconciler hasn't run): count on the server
+                results = tally.recount()
             
-            print(f"📊 MongoDB Results: {results}")
+            log.debug('results', source='mongodb', results=results)
             return results
             
         except Exception as e:
-            print(f"Error getting results from MongoDB: {str(e)}")
+            log.error('results_mongodb_error', error=str(e))
             return {}
     
     def check_network_status(self):
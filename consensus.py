@@ -1,10 +1,19 @@
+import asyncio
 import hashlib
 import time
 import random
-import subprocess
+import secrets
 import json
-import os
+import threading
 from typing import Dict, List, Tuple
+from app.blockchain import BlockchainClient
+from app.event_log import get_logger
+from app.metrics import observe, timer
+from app.peer_monitor import PeerLivenessMonitor
+from app.pos_sampler import StakeWeightedSampler
+from app.validator_cache import ValidatorSetCache
+
+log = get_logger('consensus')
 
 class HybridConsensus:
     """
@@ -15,49 +24,77 @@ class HybridConsensus:
     - PoS selection based on on-chain stakes
     """
     
-    def _init_(self):
-        self.fabric_path = os.path.expanduser('~/blockchain-voting/fabric-samples/test-network')
-        self.chaincode_name = 'voting'
-        self.channel_name = 'mychannel'
+    def __init__(self, blockchain_client: BlockchainClient = None, peer_monitor: PeerLivenessMonitor = None,
+                 validator_cache: ValidatorSetCache = None):
+        self.blockchain = blockchain_client or BlockchainClient()
+        self.peer_monitor = peer_monitor or PeerLivenessMonitor()
+        self.validator_cache = validator_cache or ValidatorSetCache()
+        self._validator_refresh_lock = threading.Lock()
+        self._sampler = None
+        self._sampler_source = None
+        self._sampler_lock = threading.Lock()
+        self.fabric_path = self.blockchain.fabric_path
+        self.chaincode_name = self.blockchain.chaincode_name
+        self.channel_name = self.blockchain.channel_name
         self.byzantine_threshold = 0  # With 2 peers, f=0
         
     def _query_blockchain_validators(self) -> Dict:
-        """Query real validators from blockchain"""
-        try:
-            original_dir = os.getcwd()
-            os.chdir(self.fabric_path)
-            
-            env = os.environ.copy()
-            env['PATH'] = f"{self.fabric_path}/../bin:" + env.get('PATH', '')
-            env['FABRIC_CFG_PATH'] = f'{self.fabric_path}/../config/'
-            env['CORE_PEER_TLS_ENABLED'] = 'true'
-            env['CORE_PEER_LOCALMSPID'] = 'Org1MSP'
-            env['CORE_PEER_TLS_ROOTCERT_FILE'] = f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt'
-            env['CORE_PEER_MSPCONFIGPATH'] = f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/users/Admin@org1.example.com/msp'
-            env['CORE_PEER_ADDRESS'] = 'localhost:7051'
-            
-            cmd = [
-                'peer', 'chaincode', 'query',
-                '-C', self.channel_name,
-                '-n', self.chaincode_name,
-                '-c', '{"function":"getValidators","Args":[]}'
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30, env=env)
-            os.chdir(original_dir)
-            
-            if result.returncode == 0:
-                validators = json.loads(result.stdout.strip())
-                print(f"✅ Retrieved {len(validators)} validators from blockchain")
+        """Query real validators from blockchain (through the validator-set cache)"""
+        validators = self.validator_cache.lookup()
+        if validators is not None:
+            return validators
+        
+        self.validator_cache.start_event_listener(self.blockchain.transport)
+        with self._validator_refresh_lock:
+            # Another thread may have refreshed while we waited
+            validators = self.validator_cache.lookup(count=False)
+            if validators is not None:
                 return validators
-            else:
-                print(f"⚠  Failed to query validators: {result.stderr}")
-                return self._get_fallback_validators()
+            
+            try:
+                result = self.blockchain._execute_peer_command('query', 'getValidators', [])
+                return self._parse_validators(result)
+                    
+            except Exception as e:
+                log.warning('validator_query_error', error=str(e))
+                return self._validators_unavailable()
+    
+    async def _aquery_blockchain_validators(self) -> Dict:
+        """Async variant of _query_blockchain_validators"""
+        validators = self.validator_cache.lookup()
+        if validators is not None:
+            return validators
+        
+        self.validator_cache.start_event_listener(self.blockchain.transport)
+        try:
+            result = await self.blockchain._aexecute_peer_command('query', 'getValidators', [])
+            return self._parse_validators(result)
                 
         except Exception as e:
-            print(f"⚠  Error querying blockchain validators: {str(e)}")
-            os.chdir(original_dir)
-            return self._get_fallback_validators()
+            log.warning('validator_query_error', error=str(e))
+            return self._validators_unavailable()
+    
+    def _parse_validators(self, result) -> Dict:
+        if result.returncode == 0:
+            validators = json.loads(result.stdout.strip())
+            log.info('validators_retrieved', count=len(validators))
+            self.validator_cache.store(validators)
+            return validators
+        else:
+            log.warning('validator_query_failed', error=result.stderr)
+            return self._validators_unavailable()
+    
+    def _validators_unavailable(self) -> Dict:
+        """Last-known-good validator set, or the hard-coded fallback if we never had one"""
+        validators = self.validator_cache.last_known_good()
+        if validators is not None:
+            log.warning('validators_last_known_good', count=len(validators))
+            return validators
+        return self._get_fallback_validators()
+    
+    def invalidate_validators(self):
+        """Drop the cached validator set, e.g. after updateValidatorStake"""
+        self.validator_cache.invalidate()
     
     def _get_fallback_validators(self) -> Dict:
         """Fallback validators if blockchain query fails"""
@@ -81,19 +118,44 @@ class HybridConsensus:
         PBFT-style validation with REAL peer nodes
         Returns: (is_valid, validation_result)
         """
-        print("\n🔄 PBFT Validation Started (Using Real Blockchain Peers)...")
-        
         # Step 1: PRE-PREPARE phase
         vote_hash = self._hash_vote(vote_data)
-        print(f"📝 PRE-PREPARE: Vote hash = {vote_hash[:16]}...")
         
         # Step 2: PREPARE phase - Check with real validators
-        prepare_votes = self._check_peer_endorsements(validators)
-        print(f"✅ PREPARE: {len(prepare_votes)}/{len(validators)} real peers responded")
+        with timer('pbft_prepare'):
+            prepare_votes = self._check_peer_endorsements(validators)
+        log.debug('pbft_prepare', responded=len(prepare_votes), validators=len(validators))
+        
+        # Step 3: COMMIT phase
+        required_votes = self._required_votes(len(validators))
+        commit_votes = None
+        if len(prepare_votes) >= required_votes:
+            with timer('pbft_commit'):
+                commit_votes = self._verify_peer_availability(validators)
+            log.debug('pbft_commit', committed=len(commit_votes), validators=len(validators))
+        
+        return self._pbft_outcome(vote_hash, required_votes, prepare_votes, commit_votes)
+    
+    async def apbft_validate_vote(self, vote_data: dict, validators: dict) -> Tuple[bool, dict]:
+        """Async variant of pbft_validate_vote; peers are checked concurrently"""
+        vote_hash = self._hash_vote(vote_data)
         
-        # Step 3: COMMIT phase - Adjusted for 2-peer network
-        num_validators = len(validators)
+        with timer('pbft_prepare'):
+            prepare_votes = await self._acheck_peer_endorsements(validators)
+        log.debug('pbft_prepare', responded=len(prepare_votes), validators=len(validators))
         
+        required_votes = self._required_votes(len(validators))
+        commit_votes = None
+        if len(prepare_votes) >= required_votes:
+            with timer('pbft_commit'):
+                commit_votes = await self._acheck_peer_endorsements(validators)
+            log.debug('pbft_commit', committed=len(commit_votes), validators=len(validators))
+        
+        return self._pbft_outcome(vote_hash, required_votes, prepare_votes, commit_votes)
+    
+    @staticmethod
+    def _required_votes(num_validators: int) -> int:
+        """Votes needed for consensus, adjusted for 2-peer network"""
         if num_validators == 2:
             # With 2 peers, need both to agree (simple majority)
             required_votes = 2
@@ -105,138 +167,142 @@ class HybridConsensus:
             # For 3 peers: need at least 2
             required_votes = 2
         
-        print(f"📊 Required votes for consensus: {required_votes}/{num_validators}")
-        
-        if len(prepare_votes) >= required_votes:
-            commit_votes = self._verify_peer_availability(validators)
-            print(f"✅ COMMIT: {len(commit_votes)}/{len(validators)} real peers committed")
-            
-            if len(commit_votes) >= required_votes:
-                print("🎉 PBFT Consensus Reached with Real Blockchain Peers!")
-                return True, {
-                    'pbft_status': 'success',
-                    'validators_count': len(commit_votes),
-                    'vote_hash': vote_hash,
-                    'real_peers': list(commit_votes),
-                    'required_votes': required_votes
-                }
+        return required_votes
+    
+    @staticmethod
+    def _pbft_outcome(vote_hash, required_votes, prepare_votes, commit_votes) -> Tuple[bool, dict]:
+        if commit_votes is not None and len(commit_votes) >= required_votes:
+            return True, {
+                'pbft_status': 'success',
+                'validators_count': len(commit_votes),
+                'vote_hash': vote_hash,
+                'real_peers': list(commit_votes),
+                'required_votes': required_votes
+            }
         
-        print(f"❌ PBFT Consensus Failed! (Got {len(prepare_votes)}/{required_votes} required votes)")
+        log.warning('pbft_failed', prepared=len(prepare_votes), required=required_votes)
         return False, {
             'pbft_status': 'failed', 
             'reason': f'Insufficient validators ({len(prepare_votes)}/{required_votes})'
         }
     
     def _check_peer_endorsements(self, validators: dict) -> List[str]:
-        """Check if real peer nodes are available for endorsement"""
-        available_peers = []
+        """Check if real peer nodes are available, from the background liveness table"""
+        available_peers = self.peer_monitor.available_peers(validators.keys())
         
-        for validator_id in validators.keys():
-            # Check if peer is actually running
-            peer_name = validator_id.split('.')[0]  # e.g., peer0
-            org_name = validator_id.split('.')[1]   # e.g., org1
-            
-            try:
-                result = subprocess.run(
-                    ['docker', 'ps', '--filter', f'name={peer_name}.{org_name}', '--format', '{{.Names}}'],
-                    capture_output=True, text=True, timeout=5
-                )
-                
-                if peer_name in result.stdout:
-                    available_peers.append(validator_id)
-                    print(f"   ✅ Real peer available: {validator_id}")
-                else:
-                    print(f"   ⚠  Peer not running: {validator_id}")
-                    
-            except Exception as e:
-                print(f"   ⚠  Error checking peer {validator_id}: {str(e)}")
+        if len(available_peers) < len(validators):
+            # Once per phase per vote while a peer is down; sample it
+            log.warning('peers_unavailable', sample=0.05,
+                        peers=[validator_id for validator_id in validators if validator_id not in available_peers])
         
         return available_peers
     
+    async def _acheck_peer_endorsements(self, validators: dict) -> List[str]:
+        """Async variant; only leaves the event loop when a peer has never been probed"""
+        if self.peer_monitor.is_tracking(validators.keys()):
+            return self._check_peer_endorsements(validators)
+        return await asyncio.to_thread(self._check_peer_endorsements, validators)
+    
     def _verify_peer_availability(self, validators: dict) -> List[str]:
         """Verify peer availability for commit phase"""
         return self._check_peer_endorsements(validators)
     
-    def pos_select_validators(self, validators: dict, num_validators: int = 2) -> List[str]:
+    def pos_select_validators(self, validators: dict, num_validators: int = 2,
+                              seed: int = None) -> List[str]:
         """
         PoS-style validator selection based on REAL blockchain stakes
+
+        Draws are weighted by stake and reputation without replacement in
+        O(k log n). Pass seed to reproduce a past selection.
         """
-        print("\n💰 PoS Validator Selection (Using Real Blockchain Stakes)...")
-        
         if not validators:
-            print("⚠  No validators found!")
+            log.warning('pos_no_validators')
             return []
         
-        # Calculate total stake from real blockchain data
-        total_stake = sum(v['stake'] for v in validators.values())
-        
-        # Weight-based selection
-        selected = []
-        available_validators = list(validators.keys())
-        
-        for _ in range(min(num_validators, len(available_validators))):
-            # Calculate selection probability based on real stake
-            probabilities = []
-            for validator in available_validators:
-                stake_weight = validators[validator]['stake'] / total_stake
-                reputation_weight = validators[validator]['reputation'] / 100
-                combined_weight = (stake_weight * 0.7) + (reputation_weight * 0.3)
-                probabilities.append(combined_weight)
-            
-            # Normalize probabilities
-            total_prob = sum(probabilities)
-            if total_prob == 0:
-                break
-            probabilities = [p / total_prob for p in probabilities]
-            
-            # Select validator
-            selected_validator = random.choices(
-                available_validators, 
-                weights=probabilities, 
-                k=1
-            )[0]
-            
-            selected.append(selected_validator)
-            available_validators.remove(selected_validator)
-            
-            print(f"   🎯 Selected REAL peer: {selected_validator} (Stake: {validators[selected_validator]['stake']})")
+        rng = random.Random(seed) if seed is not None else random
+        selected = self._get_sampler(validators).sample(num_validators, rng)
+        log.debug('pos_selected', peers=selected)
         
         return selected
     
+    def _get_sampler(self, validators: dict) -> StakeWeightedSampler:
+        """
+        Reuse the sampler while the validator cache hands back the same set;
+        a refreshed set with the same members only updates the validators
+        whose stake or reputation changed, O(changed * log n)
+        """
+        sampler = self._sampler
+        if sampler is not None and self._sampler_source is validators:
+            return sampler
+        with self._sampler_lock:
+            sampler = self._sampler
+            if sampler is None or (self._sampler_source is not validators and not sampler.refresh(validators)):
+                sampler = StakeWeightedSampler(validators)
+            self._sampler, self._sampler_source = sampler, validators
+        return sampler
+    
     def hybrid_consensus_validate(self, vote_data: dict) -> dict:
         """
         Complete hybrid consensus validation using REAL blockchain
         """
-        print("\n" + "="*60)
-        print("🚀 HYBRID CONSENSUS VALIDATION (REAL BLOCKCHAIN)")
-        print("="*60)
-        
         start_time = time.time()
         
         # Phase 1: Query REAL validators from blockchain
-        print("\n📡 Querying validators from blockchain...")
-        validators = self._query_blockchain_validators()
+        with timer('validator_query'):
+            validators = self._query_blockchain_validators()
         
         if not validators:
-            print("❌ No validators available!")
-            return {
-                'consensus_type': 'Hybrid (PoS + PBFT + Raft)',
-                'final_status': 'REJECTED',
-                'reason': 'No validators available'
-            }
+            return self._no_validators_result()
         
         # Phase 2: PoS - Select validators based on real stakes
-        selected_validators = self.pos_select_validators(validators)
+        pos_seed = secrets.randbits(64)
+        with timer('pos_selection'):
+            selected_validators = self.pos_select_validators(validators, seed=pos_seed)
         
         # Phase 3: PBFT - Validate with real peers
         is_valid, pbft_result = self.pbft_validate_vote(vote_data, validators)
         
         # Phase 4: Calculate final result
+        return self._consensus_result(start_time, validators, selected_validators, is_valid, pbft_result,
+                                      pos_seed)
+    
+    async def ahybrid_consensus_validate(self, vote_data: dict) -> dict:
+        """Async variant of hybrid_consensus_validate for the asyncio request path"""
+        start_time = time.time()
+        
+        with timer('validator_query'):
+            validators = await self._aquery_blockchain_validators()
+        
+        if not validators:
+            return self._no_validators_result()
+        
+        pos_seed = secrets.randbits(64)
+        with timer('pos_selection'):
+            selected_validators = self.pos_select_validators(validators, seed=pos_seed)
+        is_valid, pbft_result = await self.apbft_validate_vote(vote_data, validators)
+        
+        return self._consensus_result(start_time, validators, selected_validators, is_valid, pbft_result,
+                                      pos_seed)
+    
+    @staticmethod
+    def _no_validators_result() -> dict:
+        log.error('no_validators')
+        return {
+            'consensus_type': 'Hybrid (PoS + PBFT + Raft)',
+            'final_status': 'REJECTED',
+            'reason': 'No validators available'
+        }
+    
+    @staticmethod
+    def _consensus_result(start_time, validators, selected_validators, is_valid, pbft_result,
+                          pos_seed=None) -> dict:
         elapsed_time = time.time() - start_time
+        observe('consensus', elapsed_time)
         
         result = {
             'consensus_type': 'Hybrid (PoS + PBFT + Raft) - REAL BLOCKCHAIN',
             'pos_validators': selected_validators,
+            'pos_seed': pos_seed,
             'pbft_validation': pbft_result,
             'final_status': 'APPROVED' if is_valid else 'REJECTED',
             'consensus_time': f"{elapsed_time:.3f}s",
@@ -245,10 +311,8 @@ class HybridConsensus:
             'total_stake': sum(v['stake'] for v in validators.values())
         }
         
-        print("\n" + "="*60)
-        print(f"🏁 CONSENSUS RESULT: {result['final_status']}")
-        print(f"   Using {len(validators)} REAL blockchain peers")
-        print("="*60 + "\n")
+        log.info('result', status=result['final_status'], peers=len(validators),
+                 elapsed_ms=round(elapsed_time * 1000, 3))
         
         return result
     
@@ -264,5 +328,7 @@ class HybridConsensus:
             'total_validators': len(validators),
             'total_stake': sum(v['stake'] for v in validators.values()),
             'validators': validators,
+            'peer_liveness': self.peer_monitor.snapshot(),
+            'validator_cache': self.validator_cache.metrics(),
             'source': 'Real Hyperledger Fabric Blockchain'
         }
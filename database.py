@@ -0,0 +1,217 @@
+"""
+Shared MongoDB access layer
+
+One MongoClient (and so one connection pool) per process, configured from
+the environment and shared by routes, the vote pipeline, the tally and the
+blockchain results fallback. The client is recreated lazily after fork, so
+pre-fork WSGI servers (gunicorn, uWSGI) never share sockets between workers;
+module-level collection handles are CollectionProxy objects that always
+resolve against the current process's client.
+
+Settings (env):
+    MONGO_URI, MONGO_DB
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS
+    MONGO_READ_PREFERENCE (primary, primaryPreferred, secondaryPreferred, ...)
+    MONGO_WRITE_CONCERN (w: 1, majority, ...), MONGO_JOURNAL (true/false)
+"""
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB = os.environ.get('MONGO_DB', 'voting_system')
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def client_options() -> dict:
+    """MongoClient keyword arguments from the environment (also used for Motor)"""
+    options = {
+        'maxPoolSize': _env_int('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': _env_int('MONGO_MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': _env_int('MONGO_MAX_IDLE_MS', None),
+        'waitQueueTimeoutMS': _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', None),
+        'connectTimeoutMS': _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': _env_int('MONGO_SOCKET_TIMEOUT_MS', None),
+        'serverSelectionTimeoutMS': _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        'readPreference': os.environ.get('MONGO_READ_PREFERENCE', 'primary'),
+    }
+    write_concern = os.environ.get('MONGO_WRITE_CONCERN')
+    if write_concern:
+        options['w'] = int(write_concern) if write_concern.isdigit() else write_concern
+    journal = os.environ.get('MONGO_JOURNAL')
+    if journal:
+        options['journal'] = journal.lower() in ('1', 'true', 'yes')
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, fed by PyMongo's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = {
+                'open': 0, 'in_use': 0, 'created': 0, 'closed': 0,
+                'checkouts': 0, 'checkout_failures': 0, 'cleared': 0,
+                'checkout_wait_ms_total': 0.0, 'checkout_wait_ms_max': 0.0,
+            }
+        return pool
+
+    def _bump(self, event, **deltas):
+        with self._lock:
+            pool = self._pool(event.address)
+            for field, delta in deltas.items():
+                pool[field] += delta
+            return pool
+
+    def pool_created(self, event):
+        self._bump(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        # duration (seconds waiting for a connection) exists on PyMongo >= 4.7
+        wait_ms = (getattr(event, 'duration', None) or 0.0) * 1000
+        pool = self._bump(event, in_use=1, checkouts=1, checkout_wait_ms_total=wait_ms)
+        with self._lock:
+            pool['checkout_wait_ms_max'] = max(pool['checkout_wait_ms_max'], wait_ms)
+
+    def connection_checked_in(self, event):
+        self._bump(event, in_use=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            pools = {}
+            for address, pool in self._pools.items():
+                checkouts = pool['checkouts']
+                pools[address] = {
+                    **pool,
+                    'checkout_wait_ms_avg': round(pool['checkout_wait_ms_total'] / checkouts, 3)
+                    if checkouts else None,
+                }
+            return pools
+
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_client_created_at = None
+_metrics = None
+
+
+def _reset_after_fork():
+    # The parent's sockets must not be used (or closed) by the child
+    global _client, _client_pid, _metrics, _lock
+    _client = None
+    _client_pid = None
+    _metrics = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client() -> MongoClient:
+    """This process's shared MongoClient"""
+    global _client, _client_pid, _client_created_at, _metrics
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _metrics = PoolMetrics()
+            _client = MongoClient(MONGO_URI, event_listeners=[_metrics], **client_options())
+            _client_pid = pid
+            _client_created_at = time.time()
+        return _client
+
+
+def get_db(name: str = None):
+    return get_client()[name or MONGO_DB]
+
+
+class CollectionProxy:
+    """
+    Module-level stand-in for a Collection that always resolves against the
+    current process's client, so handles created at import stay fork-safe.
+    """
+
+    def __init__(self, name: str, database: str = None, **options):
+        self.name = name
+        self._database = database
+        self._options = options
+        self._collection = None
+        self._client = None
+
+    def _target(self):
+        client = get_client()
+        if self._client is not client:
+            self._collection = client[self._database or MONGO_DB].get_collection(self.name, **self._options)
+            self._client = client
+        return self._collection
+
+    def with_options(self, **options):
+        return CollectionProxy(self.name, self._database, **{**self._options, **options})
+
+    def __getattr__(self, attr):
+        return getattr(self._target(), attr)
+
+    def __repr__(self):
+        return f"CollectionProxy({self._database or MONGO_DB}.{self.name})"
+
+
+def collection(name: str, **options) -> CollectionProxy:
+    return CollectionProxy(name, **options)
+
+
+def pool_stats() -> dict:
+    """Pool configuration and usage for this process (served at /db-stats)"""
+    client = get_client()
+    options = client_options()
+    return {
+        'pid': os.getpid(),
+        'client_created_at': _client_created_at,
+        'database': MONGO_DB,
+        'max_pool_size': options.get('maxPoolSize'),
+        'min_pool_size': options.get('minPoolSize'),
+        'read_preference': options.get('readPreference'),
+        'write_concern': client.write_concern.document,
+        'pools': _metrics.snapshot() if _metrics else {},
+    }
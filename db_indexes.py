@@ -0,0 +1,136 @@
+"""
+Index management and query-plan checks for the voting collections
+
+Declares every index the request paths rely on, creates them idempotently
+at startup, and can explain() each hot query to prove none of them falls
+back to a collection scan.
+
+Usage: python -m app.db_indexes [--mongo-uri URI] [--no-create] [--check]
+Exits non-zero if an index could not be built or a hot query does a COLLSCAN.
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+
+from app.database import MONGO_DB, MONGO_URI
+
+# Names are left to MongoDB's defaults (field_1) so these match indexes
+# that VoteSubmissionPipeline.start and VoteTally.start also create
+REQUIRED_INDEXES = {
+    'users': [
+        IndexModel([('voter_id', ASCENDING)], unique=True),
+    ],
+    'votes': [
+        # One vote per voter, enforced by the database itself
+        IndexModel([('voter_id', ASCENDING)], unique=True),
+        IndexModel([('candidate', ASCENDING)]),
+    ],
+    'system_config': [
+        IndexModel([('key', ASCENDING)], unique=True),
+    ],
+    'vote_digests': [
+        IndexModel([('level', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    'reconciliation_flags': [
+        IndexModel([('voter_id', ASCENDING), ('kind', ASCENDING)], unique=True),
+    ],
+    'vote_outbox': [
+        IndexModel([('vote_id', ASCENDING)], unique=True),
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)]),
+    ],
+}
+
+# (collection, filter, sort, description) for every query on a request path
+HOT_QUERIES = [
+    ('users', {'voter_id': 'probe000'}, None, '/login user lookup'),
+    ('users', {'voter_id': {'$in': ['probe000', 'probe001']}}, None, '/login_batch user lookup'),
+    ('votes', {'voter_id': 'probe000'}, None, '/vote double-vote check'),
+    ('system_config', {'key': 'results_declared'}, None, '/check_results_status'),
+    ('vote_outbox', {'vote_id': 'probe000'}, None, '/vote_status'),
+    ('vote_outbox', {
+        '$or': [
+            {'status': 'queued', 'next_attempt_at': {'$lte': datetime(2000, 1, 1)}},
+            {'status': 'submitting', 'lease_until': {'$lte': datetime(2000, 1, 1)}}
+        ]
+    }, [('next_attempt_at', ASCENDING)], 'outbox flusher claim'),
+    ('votes', {'candidate': {'$exists': True, '$ne': None}}, [('candidate', ASCENDING)], 'tally recount'),
+    ('vote_digests', {'level': 2, '_id': {'$gte': 'a', '$lt': 'a\uffff'}}, None, 'reconcile digest children'),
+    ('votes', {'voter_id': {'$gte': 'abc', '$lt': 'abc\uffff'}}, None, 'reconcile leaf range'),
+]
+
+
+def ensure_indexes(db):
+    """Create any missing indexes; returns {collection: error} for the ones that failed"""
+    errors = {}
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        try:
+            db[collection_name].create_indexes(indexes)
+        except ServerSelectionTimeoutError:
+            raise
+        except OperationFailure as e:
+            # e.g. existing duplicate voter_ids prevent a unique index
+            errors[collection_name] = str(e)
+            print(f"⚠  Could not create indexes on {collection_name}: {str(e)}")
+    return errors
+
+
+def plan_stages(plan):
+    """Every stage name in an explain() plan tree (classic and SBE layouts)"""
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan['stage']] if 'stage' in plan else []
+    for key in ('queryPlan', 'inputStage'):
+        stages += plan_stages(plan.get(key))
+    for child in plan.get('inputStages', []):
+        stages += plan_stages(child)
+    return stages
+
+
+def explain_query(db, collection_name, query, sort=None):
+    cursor = db[collection_name].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = cursor.explain()
+    return plan_stages(explanation.get('queryPlanner', {}).get('winningPlan', {}))
+
+
+def check_query_plans(db):
+    """explain() every hot query; returns [(description, stages, ok)]"""
+    report = []
+    for collection_name, query, sort, description in HOT_QUERIES:
+        stages = explain_query(db, collection_name, query, sort)
+        report.append((description, stages, 'COLLSCAN' not in stages))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--database', default=MONGO_DB)
+    parser.add_argument('--no-create', action='store_true', help='Only check, do not create indexes')
+    parser.add_argument('--check', action='store_true', help='explain() the hot queries')
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=5000)[args.database]
+    failed = False
+
+    if not args.no_create:
+        errors = ensure_indexes(db)
+        failed = bool(errors)
+        print(f"{'❌' if errors else '✅'} Indexes ensured on {len(REQUIRED_INDEXES) - len(errors)}"
+              f"/{len(REQUIRED_INDEXES)} collections")
+
+    if args.check or args.no_create:
+        print("\n🔍 Query plans")
+        for description, stages, ok in check_query_plans(db):
+            failed = failed or not ok
+            print(f"   {'✅' if ok else '❌'} {description:<28} {' <- '.join(stages)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
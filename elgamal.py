@@ -0,0 +1,414 @@
+"""
+Exponential ElGamal for ballots, with homomorphic tallying
+
+Every ballot is a 0/1 vector over the election's candidates, and each entry
+is encrypted under one election public key h = g^x as
+
+    (c1, c2) = (g^r, g^m * h^r)
+
+Multiplying ciphertexts component-wise adds the plaintexts. So the tally for
+a candidate is the product of all its ciphertexts, and it is decrypted once:
+g^count = c2 / c1^x, and count is recovered with baby-step giant-step.
+
+The group is the 2048-bit MODP group from RFC 3526 (group 14), with 256-bit
+exponents. g^r and h^r use FixedBaseTable, a precomputed table of base
+powers, so encrypting costs about 32 modular multiplications per
+exponentiation instead of a full pow().
+
+The key is generated offline with keygen, which publishes the public key in
+system_config; web workers only load it from there and refuse to start
+encrypting ballots when it is missing.
+
+Usage:
+    python -m app.elgamal keygen [--key-dir DIR]
+    python -m app.elgamal tally --key-file FILE [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+SCHEME = 'exp-elgamal/modp2048'
+
+# RFC 3526, 2048-bit MODP group (id 14): p = 2q + 1, g = 2 generates the order-q subgroup
+MODP_2048_P = int(
+    'FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74'
+    '020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437'
+    '4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED'
+    'EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05'
+    '98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB'
+    '9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B'
+    'E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718'
+    '3995497CEA956AE515D2261898FA051015728E5A8AACAA68FFFFFFFFFFFFFFFF', 16
+)
+MODP_2048_G = 2
+EXPONENT_BITS = 256
+# Tables also cover the ~650-bit responses of the ballot proofs (ballot_proofs.py)
+TABLE_EXPONENT_BITS = 656
+FIXED_BASE_WINDOW = 8
+
+ELECTION_CANDIDATES = tuple(
+    c.strip() for c in os.environ.get('ELECTION_CANDIDATES', 'ADMK,DMK,NTK').split(',') if c.strip()
+)
+ELECTION_KEY_DIR = os.environ.get('ELECTION_KEY_DIR', 'election_keys')
+ELECTION_KEY_CONFIG = 'election_public_key'
+
+
+class ElectionKeyMissing(RuntimeError):
+    """No election public key has been provisioned in system_config"""
+
+
+class FixedBaseTable:
+    """
+    base^k mod p for k < 2^exponent_bits using rows of precomputed powers
+    table[i][d] = base^(d * 2^(window*i)); one multiplication per window
+    """
+
+    def __init__(self, base: int, modulus: int, exponent_bits: int = TABLE_EXPONENT_BITS,
+                 window: int = FIXED_BASE_WINDOW):
+        self.base = base
+        self.modulus = modulus
+        self.exponent_bits = exponent_bits
+        self.window = window
+        self.rows = []
+        row_base = base
+        for _ in range(math.ceil(exponent_bits / window)):
+            row = [1, row_base]
+            for _ in range((1 << window) - 2):
+                row.append(row[-1] * row_base % modulus)
+            self.rows.append(row)
+            row_base = row[-1] * row_base % modulus
+
+    def pow(self, exponent: int) -> int:
+        if exponent < 0 or exponent.bit_length() > self.exponent_bits:
+            return pow(self.base, exponent, self.modulus)
+        p = self.modulus
+        mask = (1 << self.window) - 1
+        result = 1
+        for row in self.rows:
+            digit = exponent & mask
+            if digit:
+                result = result * row[digit] % p
+            exponent >>= self.window
+            if not exponent:
+                break
+        return result
+
+
+class ElGamalPublicKey:
+    """Election public key h = g^x; encrypts ballots"""
+
+    def __init__(self, h: int, p: int = MODP_2048_P, g: int = MODP_2048_G):
+        self.p = p
+        self.g = g
+        self.h = h
+        self.key_id = hashlib.sha256(f"{SCHEME}:{h:x}".encode()).hexdigest()[:16]
+        self._tables = None
+        self._tables_lock = threading.Lock()
+
+    @property
+    def tables(self):
+        # Built on first encryption (~0.8s, ~10 MB), not when the key is loaded
+        if self._tables is None:
+            with self._tables_lock:
+                if self._tables is None:
+                    self._tables = (FixedBaseTable(self.g, self.p), FixedBaseTable(self.h, self.p))
+        return self._tables
+
+    def encrypt(self, m: int, r: int = None):
+        """(c1, c2) for small integer m"""
+        g_table, h_table = self.tables
+        r = r if r is not None else secrets.randbits(EXPONENT_BITS)
+        g_m = self.g if m == 1 else (1 if m == 0 else g_table.pow(m))
+        return g_table.pow(r), g_m * h_table.pow(r) % self.p
+
+    def encrypt_ballot(self, candidate: str, candidates=ELECTION_CANDIDATES) -> dict:
+        """One ciphertext per candidate: Enc(1) for the choice, Enc(0) for the rest"""
+        if candidate not in candidates:
+            raise ValueError(f"Unknown candidate: {candidate}")
+        ciphertexts = {}
+        for name in candidates:
+            c1, c2 = self.encrypt(1 if name == candidate else 0)
+            ciphertexts[name] = [format(c1, 'x'), format(c2, 'x')]
+        return {'scheme': SCHEME, 'key_id': self.key_id, 'ciphertexts': ciphertexts}
+
+    def to_dict(self) -> dict:
+        return {'scheme': SCHEME, 'key_id': self.key_id, 'g': self.g, 'h': format(self.h, 'x')}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ElGamalPublicKey':
+        if data.get('scheme') != SCHEME:
+            raise ValueError(f"Unsupported key scheme: {data.get('scheme')}")
+        return cls(int(data['h'], 16), g=data.get('g', MODP_2048_G))
+
+
+class ElGamalPrivateKey:
+    """Election secret x; decrypts aggregated tallies"""
+
+    def __init__(self, x: int, p: int = MODP_2048_P, g: int = MODP_2048_G):
+        self.x = x
+        self.public = ElGamalPublicKey(pow(g, x, p), p, g)
+
+    def decrypt_exponent(self, ciphertext) -> int:
+        """g^m for a ciphertext (c1, c2)"""
+        c1, c2 = ciphertext
+        p = self.public.p
+        return c2 * pow(pow(c1, self.x, p), -1, p) % p
+
+    def decrypt(self, ciphertext, max_value: int) -> int:
+        """m in [0, max_value]; ValueError if it is out of range"""
+        return discrete_log(self.decrypt_exponent(ciphertext), self.public.g, self.public.p, max_value)
+
+    def to_dict(self) -> dict:
+        return {**self.public.to_dict(), 'x': format(self.x, 'x')}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ElGamalPrivateKey':
+        key = cls(int(data['x'], 16), g=data.get('g', MODP_2048_G))
+        if data.get('key_id') and data['key_id'] != key.public.key_id:
+            raise ValueError('Private key does not match its key_id')
+        return key
+
+
+def generate_keypair() -> ElGamalPrivateKey:
+    return ElGamalPrivateKey(secrets.randbits(EXPONENT_BITS) | 1 << (EXPONENT_BITS - 1))
+
+
+_baby_steps = {}
+
+
+def discrete_log(target: int, g: int, p: int, max_value: int) -> int:
+    """m with g^m = target and 0 <= m <= max_value (baby-step giant-step)"""
+    m = max(1, math.isqrt(max_value) + 1)
+    key = (g, p, m)
+    baby = _baby_steps.get(key)
+    if baby is None:
+        baby = {}
+        value = 1
+        for j in range(m):
+            baby.setdefault(value, j)
+            value = value * g % p
+        _baby_steps.clear()
+        _baby_steps[key] = baby
+    giant = pow(pow(g, m, p), -1, p)
+    gamma = target
+    for i in range(m + 1):
+        j = baby.get(gamma)
+        if j is not None and i * m + j <= max_value:
+            return i * m + j
+        gamma = gamma * giant % p
+    raise ValueError(f"Plaintext is not in [0, {max_value}]")
+
+
+def _aggregate_chunk(args):
+    """Component-wise product of one chunk of ballots (process pool worker)"""
+    p, candidates, ballots = args
+    products = {name: [1, 1] for name in candidates}
+    for ballot in ballots:
+        ciphertexts = ballot['ciphertexts']
+        for name in candidates:
+            c1, c2 = ciphertexts[name]
+            product = products[name]
+            product[0] = product[0] * int(c1, 16) % p
+            product[1] = product[1] * int(c2, 16) % p
+    return products, len(ballots)
+
+
+def aggregate_ballots(ballots, candidates=ELECTION_CANDIDATES, p: int = MODP_2048_P,
+                      workers: int = 1, chunk_size: int = 20000):
+    """
+    Multiply every ballot's ciphertexts per candidate.
+    Returns ({candidate: (c1, c2)}, ballot_count). With workers > 1, chunks
+    are multiplied in separate processes and the partial products combined.
+    """
+    candidates = tuple(candidates)
+
+    def chunks():
+        chunk = []
+        for ballot in ballots:
+            chunk.append(ballot)
+            if len(chunk) >= chunk_size:
+                yield p, candidates, chunk
+                chunk = []
+        if chunk:
+            yield p, candidates, chunk
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(_aggregate_chunk, chunks()))
+    else:
+        partials = [_aggregate_chunk(chunk) for chunk in chunks()]
+
+    totals = {name: [1, 1] for name in candidates}
+    count = 0
+    for products, n in partials:
+        count += n
+        for name in candidates:
+            totals[name][0] = totals[name][0] * products[name][0] % p
+            totals[name][1] = totals[name][1] * products[name][1] % p
+    return {name: tuple(total) for name, total in totals.items()}, count
+
+
+def decrypt_tally(private_key: ElGamalPrivateKey, aggregate: dict, ballot_count: int) -> dict:
+    """
+    Per-candidate counts from aggregated ciphertexts (one decryption each).
+    Aggregates are squared first, which strips any order-2 factor a ballot
+    could carry past the batch proof check (see ballot_proofs.py); the count
+    is then the discrete log of g^(2*count) in base g^2.
+    """
+    p = private_key.public.p
+    g_squared = private_key.public.g ** 2 % p
+    counts = {}
+    for name, (c1, c2) in aggregate.items():
+        g_2m = private_key.decrypt_exponent((c1 * c1 % p, c2 * c2 % p))
+        counts[name] = discrete_log(g_2m, g_squared, p, ballot_count)
+    return counts
+
+
+# ----- Election key storage -----
+
+_election_key = None
+_election_key_lock = threading.Lock()
+
+
+def _write_private_key(private_key: ElGamalPrivateKey, key_dir: str) -> str:
+    os.makedirs(key_dir, exist_ok=True)
+    path = os.path.join(key_dir, f"election_key_{private_key.public.key_id}.json")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(private_key.to_dict(), f)
+    return path
+
+
+def load_private_key(path: str) -> ElGamalPrivateKey:
+    with open(path) as f:
+        return ElGamalPrivateKey.from_dict(json.load(f))
+
+
+def provision_election_key(config_collection, key_dir: str = None):
+    """
+    Publish a new election key in system_config unless one exists (keygen CLI only).
+    The private key file is written before the public key is published; if
+    another process published first (unique key index), ours is discarded.
+    Returns (public_key, private_key_path or None).
+    """
+    from pymongo.errors import DuplicateKeyError
+
+    existing = config_collection.find_one({'key': ELECTION_KEY_CONFIG})
+    if existing:
+        return ElGamalPublicKey.from_dict(existing['value']), None
+
+    private_key = generate_keypair()
+    path = _write_private_key(private_key, key_dir or ELECTION_KEY_DIR)
+    try:
+        config_collection.insert_one({
+            'key': ELECTION_KEY_CONFIG,
+            'value': private_key.public.to_dict(),
+            'created_at': datetime.now()
+        })
+    except DuplicateKeyError:
+        os.remove(path)
+        existing = config_collection.find_one({'key': ELECTION_KEY_CONFIG})
+        return ElGamalPublicKey.from_dict(existing['value']), None
+
+    print(f"🔑 New election key {private_key.public.key_id}; private key written to {path}")
+    print("⚠  Move the election private key offline; it is only needed to decrypt the tally")
+    return private_key.public, path
+
+
+def load_election_key(config_collection) -> ElGamalPublicKey:
+    """The published election public key; raises ElectionKeyMissing if keygen has not run"""
+    existing = config_collection.find_one({'key': ELECTION_KEY_CONFIG})
+    if not existing:
+        raise ElectionKeyMissing(
+            "No election key in system_config; run 'python -m app.elgamal keygen' before starting the app"
+        )
+    return ElGamalPublicKey.from_dict(existing['value'])
+
+
+def election_public_key(config_collection=None) -> ElGamalPublicKey:
+    """The election's public key, loaded from system_config and cached per process"""
+    global _election_key
+    if _election_key is not None:
+        return _election_key
+    with _election_key_lock:
+        if _election_key is None:
+            if config_collection is None:
+                from app.database import collection
+                config_collection = collection('system_config')
+            _election_key = load_election_key(config_collection)
+    return _election_key
+
+
+def iter_ballots(votes_collection, key_id: str, stats: dict = None):
+    """Stored ballots encrypted under key_id; other and legacy ballots are counted in stats"""
+    stats = stats if stats is not None else {}
+    stats.setdefault('skipped', 0)
+    for vote in votes_collection.find({}, {'_id': 0, 'encrypted_vote': 1}).batch_size(5000):
+        try:
+            ballot = json.loads(vote['encrypted_vote'])
+        except (KeyError, TypeError, ValueError):
+            stats['skipped'] += 1
+            continue
+        if ballot.get('scheme') != SCHEME or ballot.get('key_id') != key_id:
+            stats['skipped'] += 1
+            continue
+        yield ballot
+
+
+def homomorphic_tally(votes_collection, private_key: ElGamalPrivateKey,
+                      candidates=ELECTION_CANDIDATES, workers: int = 1):
+    """Decrypted per-candidate counts and the number of ballots skipped"""
+    stats = {}
+    aggregate, count = aggregate_ballots(
+        iter_ballots(votes_collection, private_key.public.key_id, stats),
+        candidates, private_key.public.p, workers
+    )
+    return decrypt_tally(private_key, aggregate, count), count, stats['skipped']
+
+
+def main():
+    from pymongo import MongoClient
+    from app.database import MONGO_DB, MONGO_URI
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--database', default=MONGO_DB)
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    keygen = subcommands.add_parser('keygen', help='Provision the election key if none exists')
+    keygen.add_argument('--key-dir', default=ELECTION_KEY_DIR)
+    tally = subcommands.add_parser('tally', help='Aggregate and decrypt the stored ballots')
+    tally.add_argument('--key-file', required=True)
+    tally.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.database]
+
+    if args.command == 'keygen':
+        public_key, path = provision_election_key(db.system_config, args.key_dir)
+        if path is None:
+            print(f"ℹ  Election key {public_key.key_id} already provisioned")
+        return
+
+    private_key = load_private_key(args.key_file)
+    start = time.perf_counter()
+    counts, ballots, skipped = homomorphic_tally(db.votes, private_key, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"🗳  {ballots} ballots tallied under key {private_key.public.key_id} in {elapsed:.1f}s"
+          f" ({skipped} skipped)")
+    plaintext = {row['_id']: row['count'] for row in db.votes.aggregate([
+        {'$group': {'_id': '$candidate', 'count': {'$sum': 1}}}
+    ])}
+    for name, count in counts.items():
+        print(f"   {name:<12} {count:>10}   (plaintext column: {plaintext.get(name, 0)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,28 +4,25 @@ from Crypto.Random import get_random_bytes
 import hashlib
 import json
 import uuid
+from app.ballot_proofs import prove_ballot
+from app.elgamal import ElGamalPublicKey, election_public_key
 
 class VoteEncryption:
     
     @staticmethod
-    def elgamal_encrypt(plaintext, public_key=12345):
-        """ElGamal encryption for vote"""
-        # Simplified encryption (use proper ElGamal library in production)
-        vote_hash = hashlib.sha256(plaintext.encode()).hexdigest()
-        
-        encrypted = {
-            'candidate': plaintext,
-            'hash': vote_hash,
-            'timestamp': str(uuid.uuid4())
-        }
-        return json.dumps(encrypted)
+    def elgamal_encrypt(plaintext, public_key=None):
+        """ElGamal encryption for vote (exponential ElGamal ballot, see elgamal.py)"""
+        if not isinstance(public_key, ElGamalPublicKey):
+            public_key = election_public_key()
+        return json.dumps(public_key.encrypt_ballot(plaintext))
     
     @staticmethod
-    def generate_zk_proof(vote, voter_id):
-        """Generate Zero-Knowledge Proof"""
-        # Simplified ZK proof (Implement proper ZK-SNARK in production)
-        proof = hashlib.sha256(f"{vote}{voter_id}{uuid.uuid4()}".encode()).hexdigest()
-        return proof
+    def encrypt_with_proof(plaintext, voter_id, public_key=None):
+        """ElGamal ballot and its validity proof, as JSON strings (see ballot_proofs.py)"""
+        if not isinstance(public_key, ElGamalPublicKey):
+            public_key = election_public_key()
+        ballot, proof = prove_ballot(public_key, plaintext, voter_id)
+        return json.dumps(ballot), json.dumps(proof)
     
     @staticmethod
     def generate_one_time_token(voter_id):
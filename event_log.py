@@ -0,0 +1,289 @@
+"""
+Non-blocking structured logging for the request hot paths
+
+    log = get_logger('vote')
+    log.info('cast', voter_id=voter_id, vote_id=vote_id)
+    log.debug('peer_available', sample=0.01, peer=validator_id)
+
+A call checks the level and the sample rate, then appends a small dict to
+a bounded buffer and returns; a background thread redacts, serialises and
+writes the records as JSON lines in batches. When the buffer is full,
+records are dropped (and counted) rather than blocking the request.
+
+Redaction happens on the writer thread, for every record: voter IDs become
+keyed pseudonyms, both in the voter fields and wherever a voter-ID-shaped
+token appears in another string field (error messages, peer stderr), and
+candidate names are removed, so no line ties a voter to a choice. Nested
+dicts and lists are redacted the same way. The pseudonym key is
+LOG_REDACTION_KEY, or else a random secret generated once per deployment
+and stored in system_config, so every worker maps a voter to the same
+pseudonym and login and vote events correlate across processes. While no
+key can be loaded, voter IDs are replaced by [redacted] instead.
+
+Environment:
+    LOG_LEVEL           DEBUG, INFO (default), WARNING or ERROR
+    LOG_OUTPUT          stderr (default), stdout or a file path
+    LOG_SAMPLE_RATES    per-event overrides, e.g. "consensus.peer_available=0.01"
+    LOG_REDACTION_KEY   pseudonym key; a stored per-deployment secret when unset
+    LOG_QUEUE_SIZE      records buffered before dropping (default 10000)
+"""
+import atexit
+import collections
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+
+from app.elgamal import ELECTION_CANDIDATES
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+LOG_LEVEL = {name: level for level, name in LEVEL_NAMES.items()}.get(
+    os.environ.get('LOG_LEVEL', 'INFO').upper(), INFO
+)
+LOG_OUTPUT = os.environ.get('LOG_OUTPUT', 'stderr')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = 512
+LOG_FLUSH_INTERVAL = 0.05  # seconds the writer sleeps when there is nothing to write
+
+VOTER_FIELDS = ('voter_id', 'voterID')
+CHOICE_FIELDS = ('candidate',)
+ENVELOPE_FIELDS = ('ts', 'level', 'logger', 'event')
+REDACTED = '[redacted]'
+REDACTION_KEY_CONFIG = 'log_redaction_key'
+REDACTION_KEY_RETRY = 30.0  # seconds between attempts to load the key while MongoDB is unreachable
+# Voter IDs are str(uuid4())[:8] (see /register); the lookarounds skip the
+# first group of a full UUID and longer hex strings such as transaction IDs
+VOTER_ID_PATTERN = re.compile(r'(?<![0-9A-Za-z_-])[0-9a-f]{8}(?![0-9A-Za-z_-])')
+CANDIDATE_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(re.escape(c) for c in sorted(ELECTION_CANDIDATES, key=len, reverse=True)) + r')\b'
+) if ELECTION_CANDIDATES else None
+
+
+def _parse_sample_rates(spec):
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        try:
+            event, rate = item.split('=', 1)
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            print(f"⚠  Ignoring bad LOG_SAMPLE_RATES entry: {item}")
+    return rates
+
+
+SAMPLE_RATES = _parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+_redaction_key = None
+_redaction_key_retry_at = 0.0
+
+
+def _load_stored_key():
+    """The deployment's pseudonym secret from system_config, created by the first process to ask"""
+    from pymongo.errors import DuplicateKeyError
+    from app.database import collection
+
+    config = collection('system_config')
+    try:
+        config.update_one(
+            {'key': REDACTION_KEY_CONFIG},
+            {'$setOnInsert': {'value': secrets.token_hex(32)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another process inserted it first
+        pass
+    return config.find_one({'key': REDACTION_KEY_CONFIG})['value'].encode()
+
+
+def _get_redaction_key():
+    """Pseudonym key, or None while it cannot be loaded (never a constant from the code)"""
+    global _redaction_key, _redaction_key_retry_at
+    if _redaction_key is None and time.monotonic() >= _redaction_key_retry_at:
+        try:
+            key = os.environ.get('LOG_REDACTION_KEY', '').encode() or _load_stored_key()
+            _redaction_key = hashlib.sha256(b'event-log/pseudonym/v1' + key).digest()
+        except Exception:
+            _redaction_key_retry_at = time.monotonic() + REDACTION_KEY_RETRY
+    return _redaction_key
+
+
+def pseudonymize(voter_id):
+    key = _get_redaction_key()
+    if key is None:
+        return REDACTED
+    digest = hmac.new(key, str(voter_id).encode(), hashlib.sha256).hexdigest()
+    return f"v_{digest[:16]}"
+
+
+def scrub(text, voters=None):
+    """Pseudonymize voter IDs and remove candidate names in free text"""
+    for voter_id, alias in (voters or {}).items():
+        if voter_id in text:
+            text = text.replace(voter_id, alias)
+    text = VOTER_ID_PATTERN.sub(lambda match: pseudonymize(match.group(0)), text)
+    if CANDIDATE_PATTERN is not None:
+        text = CANDIDATE_PATTERN.sub(REDACTED, text)
+    return text
+
+
+def _redact_value(value, voters):
+    if isinstance(value, str):
+        return scrub(value, voters)
+    if isinstance(value, dict):
+        return _redact_fields(dict(value), voters)
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(item, voters) for item in value]
+    return value
+
+
+def _redact_fields(fields, voters, skip=()):
+    for name in VOTER_FIELDS:
+        value = fields.get(name)
+        if value:
+            voters[str(value)] = fields[name] = pseudonymize(value)
+    for name in CHOICE_FIELDS:
+        if name in fields:
+            fields[name] = REDACTED
+    for name, value in fields.items():
+        if name not in VOTER_FIELDS and name not in CHOICE_FIELDS and name not in skip:
+            fields[name] = _redact_value(value, voters)
+    return fields
+
+
+def redact(fields):
+    """Pseudonymize voter IDs, drop choices and scrub every other field, nested ones included"""
+    return _redact_fields(fields, {}, skip=ENVELOPE_FIELDS)
+
+
+class _Writer:
+    """Owns the buffer and the thread draining it; rebuilt in a forked child"""
+
+    def __init__(self):
+        # deque.append/popleft are atomic, so callers never take a lock;
+        # the writer polls instead of being signalled
+        self.buffer = collections.deque()
+        self.dropped = 0
+        self.busy = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        if self._thread is None:
+            self._start()
+        if len(self.buffer) >= LOG_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.buffer.append(record)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+                self._thread.start()
+
+    def _open(self):
+        if LOG_OUTPUT == 'stdout':
+            return sys.stdout
+        if LOG_OUTPUT == 'stderr':
+            return sys.stderr
+        return open(LOG_OUTPUT, 'a', encoding='utf-8', buffering=1 << 16)
+
+    def _run(self):
+        out = self._open()
+        buffer = self.buffer
+        while True:
+            if not buffer and not self.dropped:
+                time.sleep(LOG_FLUSH_INTERVAL)
+                continue
+            self.busy = True
+            lines = []
+            while buffer and len(lines) < LOG_BATCH_SIZE:
+                record = buffer.popleft()
+                try:
+                    lines.append(json.dumps(redact(record), default=str, separators=(',', ':')))
+                except Exception as e:
+                    lines.append(json.dumps({'event': 'log.serialization_error', 'error': str(e)}))
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(json.dumps({'ts': round(time.time(), 6), 'level': 'WARNING', 'logger': 'event_log',
+                                         'event': 'dropped', 'count': dropped}, separators=(',', ':')))
+            try:
+                out.write('\n'.join(lines) + '\n')
+                out.flush()
+            except Exception:
+                pass
+            self.busy = False
+
+    def flush(self, timeout=2.0):
+        """Wait (bounded) until everything buffered so far is written"""
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self.buffer or self.busy) and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+
+_writer = _Writer()
+
+
+def _reset_after_fork():
+    # The parent's writer thread does not exist in the child
+    global _writer
+    _writer = _Writer()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(lambda: _writer.flush())
+
+
+class EventLogger:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def debug(self, event, sample=1.0, **fields):
+        if DEBUG >= LOG_LEVEL:
+            self._log(DEBUG, event, sample, fields)
+
+    def info(self, event, sample=1.0, **fields):
+        if INFO >= LOG_LEVEL:
+            self._log(INFO, event, sample, fields)
+
+    def warning(self, event, sample=1.0, **fields):
+        if WARNING >= LOG_LEVEL:
+            self._log(WARNING, event, sample, fields)
+
+    def error(self, event, sample=1.0, **fields):
+        if ERROR >= LOG_LEVEL:
+            self._log(ERROR, event, sample, fields)
+
+    def _log(self, level, event, sample, fields):
+        rate = SAMPLE_RATES.get(f"{self.name}.{event}", sample) if SAMPLE_RATES else sample
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        _writer.put({'ts': round(time.time(), 6), 'level': LEVEL_NAMES[level],
+                     'logger': self.name, 'event': event, **fields})
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, EventLogger(name))
+    return logger
+
+
+def flush(timeout=2.0):
+    _writer.flush(timeout)
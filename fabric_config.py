@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Tuple
+
+
+@dataclass(frozen=True)
+class FabricConfig:
+    """
+    Immutable Fabric connection settings shared by every thread.
+
+    The peer CLI environment is computed once here and handed to each
+    subprocess (together with cwd=fabric_path), so nothing on the request
+    path touches os.environ or the process-wide working directory.
+    """
+    fabric_path: str
+    channel_name: str = 'mychannel'
+    chaincode_name: str = 'voting'
+    peer_address: str = 'localhost:7051'
+    orderer_address: str = 'localhost:7050'
+    env: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+
+    @classmethod
+    def build(cls, fabric_path: str, channel_name: str = 'mychannel', chaincode_name: str = 'voting',
+              base_env: Mapping[str, str] = None, peer_address: str = 'localhost:7051',
+              orderer_address: str = 'localhost:7050') -> 'FabricConfig':
+        env = dict(os.environ if base_env is None else base_env)
+        env['PATH'] = f"{fabric_path}/../bin:" + env.get('PATH', '')
+        env['FABRIC_CFG_PATH'] = f'{fabric_path}/../config/'
+        env['CORE_PEER_TLS_ENABLED'] = 'true'
+        env['CORE_PEER_LOCALMSPID'] = 'Org1MSP'
+        env['CORE_PEER_TLS_ROOTCERT_FILE'] = f'{fabric_path}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt'
+        env['CORE_PEER_MSPCONFIGPATH'] = f'{fabric_path}/organizations/peerOrganizations/org1.example.com/users/Admin@org1.example.com/msp'
+        env['CORE_PEER_ADDRESS'] = peer_address
+        return cls(
+            fabric_path=fabric_path,
+            channel_name=channel_name,
+            chaincode_name=chaincode_name,
+            peer_address=peer_address,
+            orderer_address=orderer_address,
+            env=MappingProxyType(env)
+        )
+
+    def peer_command(self, command_type: str, function: str, args) -> Tuple[str, ...]:
+        """argv for `peer chaincode invoke|query`"""
+        ctor = json.dumps({"function": function, "Args": list(args)})
+
+        if command_type == 'invoke':
+            return (
+                'peer', 'chaincode', 'invoke',
+                '-o', self.orderer_address,
+                '--ordererTLSHostnameOverride', 'orderer.example.com',
+                '--tls',
+                '--cafile', f'{self.fabric_path}/organizations/ordererOrganizations/example.com/orderers/orderer.example.com/msp/tlscacerts/tlsca.example.com-cert.pem',
+                '-C', self.channel_name,
+                '-n', self.chaincode_name,
+                '--peerAddresses', self.peer_address,
+                '--tlsRootCertFiles', f'{self.fabric_path}/organizations/peerOrganizations/org1.example.com/peers/peer0.org1.example.com/tls/ca.crt',
+                '--peerAddresses', 'localhost:9051',
+                '--tlsRootCertFiles', f'{self.fabric_path}/organizations/peerOrganizations/org2.example.com/peers/peer0.org2.example.com/tls/ca.crt',
+                '-c', ctor
+            )
+        return (
+            'peer', 'chaincode', 'query',
+            '-C', self.channel_name,
+            '-n', self.chaincode_name,
+            '-c', ctor
+        )
+
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_fabric_config() -> FabricConfig:
+    """Process-wide FabricConfig, built on first use"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = FabricConfig.build(
+                os.environ.get('FABRIC_PATH', os.path.expanduser('~/blockchain-voting/fabric-samples/test-network')),
+                channel_name=os.environ.get('CHANNEL_NAME', 'mychannel'),
+                chaincode_name=os.environ.get('CHAINCODE_NAME', 'voting'),
+                peer_address=os.environ.get('FABRIC_PEER_ADDRESS', 'localhost:7051'),
+                orderer_address=os.environ.get('FABRIC_ORDERER_ADDRESS', 'localhost:7050')
+            )
+        return _config
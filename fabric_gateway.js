@@ -0,0 +1,154 @@
+'use strict';
+
+// Long-lived Fabric gateway service for the Python BlockchainClient.
+// Holds one gRPC connection to the peer's Gateway service (which fans out to
+// the endorsing peers and the orderer) and exposes it over keep-alive HTTP:
+//   POST /evaluate  {"function": "getResults", "args": []}  -> {"result": "..."}
+//   POST /submit    {"function": "submitVote", "args": [..]} -> {"result": "..."}
+//   GET  /events?since=N&timeout=S  long-poll for chaincode events
+//        -> {"events": [{"seq", "name", "payload", "blockNumber", "txId"}], "next": M}
+
+const crypto = require('crypto');
+const fs = require('fs');
+const http = require('http');
+const path = require('path');
+const grpc = require('@grpc/grpc-js');
+const { connect, signers } = require('@hyperledger/fabric-gateway');
+
+const FABRIC_PATH = process.env.FABRIC_PATH || path.join(process.env.HOME, 'blockchain-voting/fabric-samples/test-network');
+const CHANNEL_NAME = process.env.CHANNEL_NAME || 'mychannel';
+const CHAINCODE_NAME = process.env.CHAINCODE_NAME || 'voting';
+const PEER_ENDPOINT = process.env.PEER_ENDPOINT || 'localhost:7051';
+const PEER_HOST_ALIAS = process.env.PEER_HOST_ALIAS || 'peer0.org1.example.com';
+const PORT = parseInt(process.env.GATEWAY_PORT || '8800', 10);
+const EVENT_BUFFER_SIZE = 1000;
+
+const ORG_PATH = path.join(FABRIC_PATH, 'organizations/peerOrganizations/org1.example.com');
+const MSP_PATH = path.join(ORG_PATH, 'users/Admin@org1.example.com/msp');
+
+function newGrpcClient() {
+    const tlsRootCert = fs.readFileSync(path.join(ORG_PATH, 'peers/peer0.org1.example.com/tls/ca.crt'));
+    return new grpc.Client(PEER_ENDPOINT, grpc.credentials.createSsl(tlsRootCert), {
+        'grpc.ssl_target_name_override': PEER_HOST_ALIAS,
+        'grpc.keepalive_time_ms': 120000,
+    });
+}
+
+function newGateway(client) {
+    const certDir = path.join(MSP_PATH, 'signcerts');
+    const keyDir = path.join(MSP_PATH, 'keystore');
+    const credentials = fs.readFileSync(path.join(certDir, fs.readdirSync(certDir)[0]));
+    const privateKey = crypto.createPrivateKey(fs.readFileSync(path.join(keyDir, fs.readdirSync(keyDir)[0])));
+
+    return connect({
+        client,
+        identity: { mspId: 'Org1MSP', credentials },
+        signer: signers.newPrivateKeySigner(privateKey),
+        evaluateOptions: () => ({ deadline: Date.now() + 5000 }),
+        endorseOptions: () => ({ deadline: Date.now() + 15000 }),
+        submitOptions: () => ({ deadline: Date.now() + 5000 }),
+        commitStatusOptions: () => ({ deadline: Date.now() + 60000 }),
+    });
+}
+
+function readBody(req) {
+    return new Promise((resolve, reject) => {
+        const chunks = [];
+        req.on('data', (chunk) => chunks.push(chunk));
+        req.on('end', () => resolve(Buffer.concat(chunks).toString('utf8')));
+        req.on('error', reject);
+    });
+}
+
+function reply(res, status, data) {
+    const body = JSON.stringify(data);
+    res.writeHead(status, { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) });
+    res.end(body);
+}
+
+// Recent chaincode events, kept in memory for long-polling clients
+const eventLog = { events: [], next: 0, waiters: [] };
+
+async function listenForEvents(network) {
+    const decoder = new TextDecoder();
+    const stream = await network.getChaincodeEvents(CHAINCODE_NAME);
+    for await (const event of stream) {
+        eventLog.events.push({
+            seq: eventLog.next++,
+            name: event.eventName,
+            payload: decoder.decode(event.payload),
+            blockNumber: String(event.blockNumber),
+            txId: event.transactionId,
+        });
+        if (eventLog.events.length > EVENT_BUFFER_SIZE) {
+            eventLog.events.shift();
+        }
+        eventLog.waiters.splice(0).forEach((wake) => wake());
+    }
+}
+
+async function pollEvents(since, timeoutMs) {
+    const pending = () => eventLog.events.filter((event) => event.seq >= since);
+    if (pending().length === 0 && since <= eventLog.next) {
+        await new Promise((resolve) => {
+            const timer = setTimeout(resolve, timeoutMs);
+            eventLog.waiters.push(() => { clearTimeout(timer); resolve(); });
+        });
+    }
+    return { events: pending(), next: eventLog.next };
+}
+
+function main() {
+    const client = newGrpcClient();
+    const gateway = newGateway(client);
+    const network = gateway.getNetwork(CHANNEL_NAME);
+    const contract = network.getContract(CHAINCODE_NAME);
+    const decoder = new TextDecoder();
+
+    listenForEvents(network).catch((err) => console.error('Chaincode event stream failed:', err.message));
+
+    const server = http.createServer(async (req, res) => {
+        const url = new URL(req.url, 'http://localhost');
+        if (req.method === 'GET' && url.pathname.replace(/\/+$/, '').endsWith('/events')) {
+            const since = parseInt(url.searchParams.get('since') || '0', 10);
+            const timeoutMs = Math.min(parseFloat(url.searchParams.get('timeout') || '25'), 60) * 1000;
+            return reply(res, 200, await pollEvents(since, timeoutMs));
+        }
+
+        const endpoint = req.url.replace(/\/+$/, '').split('/').pop();
+        if (req.method !== 'POST' || (endpoint !== 'evaluate' && endpoint !== 'submit')) {
+            return reply(res, 404, { error: `Unknown endpoint: ${req.url}` });
+        }
+
+        let request;
+        try {
+            request = JSON.parse((await readBody(req)) || '{}');
+        } catch (err) {
+            return reply(res, 400, { error: 'Invalid JSON body' });
+        }
+
+        try {
+            const args = (request.args || []).map(String);
+            const resultBytes = endpoint === 'submit'
+                ? await contract.submitTransaction(request.function, ...args)
+                : await contract.evaluateTransaction(request.function, ...args);
+            reply(res, 200, { result: decoder.decode(resultBytes) });
+        } catch (err) {
+            reply(res, 500, { error: err.message });
+        }
+    });
+
+    server.keepAliveTimeout = 65000;
+    server.listen(PORT, () => console.info(`Fabric gateway listening on port ${PORT}`));
+
+    const shutdown = () => {
+        server.close();
+        gateway.close();
+        client.close();
+        process.exit(0);
+    };
+    process.on('SIGINT', shutdown);
+    process.on('SIGTERM', shutdown);
+}
+
+main();
@@ -0,0 +1,256 @@
+"""
+Local stand-in for the Fabric gateway service
+
+Speaks the same HTTP protocol as fabric_gateway.js but keeps the voting
+chaincode state in memory, so GatewayTransport can be exercised without a
+Fabric test-network.
+
+Usage: python -m app.fabric_gateway_stub --port 8800 [--latency-ms 5]
+"""
+import argparse
+import json
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from app.ledger_reconcile import DIGEST_DEPTH, vote_digest_lanes
+
+
+class StubLedger:
+    """In-memory copy of the voting chaincode (voting.js)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'ADMK': 0, 'DMK': 0, 'NTK': 0}
+        # Keyed like the chaincode's VOTE_<voterID> range, which also holds VOTE_COUNTS
+        self.votes = {'COUNTS': self.counts}
+        self.validators = {
+            'peer0.org1.example.com': {
+                'stake': 1000, 'reputation': 100, 'votes_validated': 0, 'organization': 'Org1MSP'
+            },
+            'peer0.org2.example.com': {
+                'stake': 800, 'reputation': 95, 'votes_validated': 0, 'organization': 'Org2MSP'
+            }
+        }
+        self.digests = {}
+        self._tx_counter = 0
+        self.events = []
+        self.event_signal = threading.Condition(self._lock)
+
+    def call(self, function, args):
+        handler = getattr(self, f'cc_{function}', None)
+        if handler is None:
+            raise ValueError(f'Unknown chaincode function: {function}')
+        with self._lock:
+            return handler(*args)
+
+    def cc_submitVote(self, voter_id, candidate):
+        if voter_id in self.votes:
+            raise ValueError(f'Voter {voter_id} has already voted')
+        self._tx_counter += 1
+        vote = {
+            'voterID': voter_id,
+            'candidate': candidate,
+            'txId': f'stub-{self._tx_counter:012d}',
+            'validatedBy': 'peer0.org1.example.com',
+            'mspId': 'Org1MSP',
+            'docType': 'vote'
+        }
+        self.votes[voter_id] = vote
+        self._add_to_digests(voter_id, candidate)
+        self.counts[candidate] = self.counts.get(candidate, 0) + 1
+        validator = self.validators['peer0.org1.example.com']
+        validator['votes_validated'] += 1
+        validator['reputation'] += 0.1
+        return json.dumps(vote)
+
+    def cc_submitVoteBatch(self, votes_json):
+        statuses = {}
+        for item in json.loads(votes_json):
+            if not item.get('voterID') or not item.get('candidate'):
+                statuses[item.get('voteID')] = 'invalid'
+            elif item['voterID'] in self.votes:
+                statuses[item.get('voteID')] = 'duplicate'
+            else:
+                self.cc_submitVote(item['voterID'], item['candidate'])
+                self.votes[item['voterID']]['voteID'] = item.get('voteID')
+                statuses[item.get('voteID')] = 'committed'
+        return json.dumps(statuses)
+
+    def _add_to_digests(self, voter_id, candidate):
+        lanes = vote_digest_lanes(voter_id, candidate)
+        for level in range(min(DIGEST_DEPTH, len(voter_id)) + 1):
+            node = self.digests.setdefault(voter_id[:level], [0] * (len(lanes) + 1))
+            node[0] += 1
+            for i, lane in enumerate(lanes):
+                node[i + 1] += lane
+
+    def cc_getDigestChildren(self, prefix=''):
+        def encode(node):
+            return {'count': str(node[0]), 'lanes': [str(lane) for lane in node[1:]]} if node else None
+        children = {}
+        if len(prefix) < DIGEST_DEPTH:
+            children = {
+                key: encode(node) for key, node in sorted(self.digests.items())
+                if len(key) == len(prefix) + 1 and key.startswith(prefix)
+            }
+        return json.dumps({
+            'prefix': prefix, 'depth': DIGEST_DEPTH,
+            'node': encode(self.digests.get(prefix)), 'children': children
+        })
+
+    def cc_getResults(self):
+        return json.dumps(self.counts)
+
+    def cc_getValidators(self):
+        return json.dumps(self.validators)
+
+    def cc_updateValidatorStake(self, validator_id, new_stake):
+        if validator_id not in self.validators:
+            raise ValueError(f'Validator {validator_id} not found')
+        self.validators[validator_id]['stake'] = int(new_stake)
+        self._emit('ValidatorsUpdated', {'validatorId': validator_id})
+        return json.dumps(self.validators[validator_id])
+
+    def _emit(self, name, payload):
+        self._tx_counter += 1
+        self.events.append({
+            'seq': len(self.events),
+            'name': name,
+            'payload': json.dumps(payload),
+            'blockNumber': str(self._tx_counter),
+            'txId': f'stub-{self._tx_counter:012d}'
+        })
+        self.event_signal.notify_all()
+
+    def poll_events(self, since, timeout):
+        with self._lock:
+            if since >= len(self.events):
+                self.event_signal.wait(timeout)
+            return {'events': self.events[since:], 'next': len(self.events)}
+
+    def cc_queryVote(self, voter_id):
+        vote = self.votes.get(voter_id)
+        if not vote:
+            return json.dumps({'hasVoted': False})
+        return json.dumps({'hasVoted': True, 'txId': vote.get('txId'), 'validatedBy': vote.get('validatedBy')})
+
+    @staticmethod
+    def _is_vote(record):
+        return record.get('docType') == 'vote' and bool(record.get('voterID'))
+
+    def cc_getAllVotes(self):
+        return json.dumps([self.votes[k] for k in sorted(self.votes)])
+
+    def cc_getVotesPage(self, page_size, bookmark='', prefix=''):
+        # The bookmark is the next voter ID to return, as with Fabric's range bookmark
+        size = min(max(int(page_size or 1000), 1), 10000)
+        keys = sorted(k for k in self.votes if k >= bookmark and k.startswith(prefix))
+        page, rest = keys[:size], keys[size:]
+        return json.dumps({
+            'records': [self.votes[k] for k in page if self._is_vote(self.votes[k])],
+            'bookmark': rest[0] if rest else '',
+            'fetched': len(page)
+        })
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/').rsplit('/', 1)[-1] != 'events':
+            return self._reply(404, {'error': f'Unknown endpoint: {self.path}'})
+        params = parse_qs(url.query)
+        since = int(params.get('since', ['0'])[0])
+        timeout = min(float(params.get('timeout', ['25'])[0]), 60)
+        self._reply(200, self.server.ledger.poll_events(since, timeout))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._reply(400, {'error': 'Invalid JSON body'})
+
+        endpoint = self.path.rstrip('/').rsplit('/', 1)[-1]
+        if endpoint not in ('evaluate', 'submit'):
+            return self._reply(404, {'error': f'Unknown endpoint: {self.path}'})
+
+        server = self.server
+        delay = server.submit_latency if endpoint == 'submit' else server.evaluate_latency
+        if delay:
+            time.sleep(delay)
+        if server.failure_rate and random.random() < server.failure_rate:
+            return self._reply(503, {'error': 'Simulated endorsement failure'})
+
+        try:
+            result = server.ledger.call(request.get('function'), request.get('args', []))
+        except (TypeError, ValueError) as e:
+            return self._reply(500, {'error': str(e)})
+        self._reply(200, {'result': result})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8800, ledger=None, evaluate_latency=0.0,
+                submit_latency=0.0, failure_rate=0.0, certfile=None, keyfile=None, verbose=False):
+    """Build (but do not start) a stub gateway server; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), StubGatewayHandler)
+    server.daemon_threads = True
+    server.ledger = ledger or StubLedger()
+    server.evaluate_latency = evaluate_latency
+    server.submit_latency = submit_latency
+    server.failure_rate = failure_rate
+    server.verbose = verbose
+    if certfile:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in Fabric gateway for local testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay for evaluate calls')
+    parser.add_argument('--commit-latency-ms', type=float, default=0.0, help='Delay for submit calls')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--certfile')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port,
+        evaluate_latency=args.latency_ms / 1000,
+        submit_latency=args.commit_latency_ms / 1000,
+        failure_rate=args.failure_rate,
+        certfile=args.certfile, keyfile=args.keyfile, verbose=args.verbose
+    )
+    scheme = 'https' if args.certfile else 'http'
+    print(f"🧪 Stub Fabric gateway listening on {scheme}://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import threading
+
+import numpy as np
+
+from app.face_index import FaceIndex
+
+
+class IVFFaceIndex(FaceIndex):
+    """
+    Inverted-file (IVF) approximate index over the face encodings.
+
+    A k-means coarse quantizer splits the encodings into nlist cells; a query
+    only scans the nprobe cells whose centroids are closest to it. nprobe is
+    the recall/latency knob: nprobe == nlist scans everything. Candidates from
+    the probed cells go through the same exact float64 re-rank as FaceIndex,
+    so every match it returns is a true match under the 0.5 tolerance.
+
+    Until enough encodings exist to train the quantizer, queries fall back to
+    the brute-force scan of the parent class. sync() (re)trains in a
+    background thread; call train() directly to train synchronously.
+    """
+
+    MIN_POINTS_PER_CELL = 39
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE_PER_CELL = 64
+    RETRAIN_GROWTH = 4
+
+    def __init__(self, initial_capacity: int = 1024, nlist: int = 1024,
+                 nprobe: int = 16, seed: int = 0):
+        super().__init__(initial_capacity=initial_capacity)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._rng = np.random.default_rng(seed)
+        self._centroids = None
+        self._lists = []
+        self._list_arrays = {}
+        self._trained_size = 0
+        self._train_lock = threading.Lock()
+        self._train_thread = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def train(self):
+        """
+        (Re)build the coarse quantizer from the current encodings
+        k-means runs outside the index lock, so queries and registrations
+        keep using the previous quantizer (or the brute-force scan) until the
+        new one is swapped in.
+        """
+        with self._train_lock:
+            with self._lock:
+                size = self._size
+                if size < self.nlist:
+                    return
+                # Rows below size never change; growing the index copies into a new matrix
+                data = self._matrix[:size]
+                nlist = self.nlist
+
+            sample_size = min(size, nlist * self.KMEANS_SAMPLE_PER_CELL)
+            sample = data[self._rng.choice(size, sample_size, replace=False)]
+
+            centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(self.KMEANS_ITERATIONS):
+                labels = self._nearest_centroids(sample, centroids)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+                # Re-seed empty cells so every list stays usable
+                empty = np.flatnonzero(~filled)
+                if len(empty):
+                    centroids[empty] = sample[self._rng.choice(sample_size, len(empty), replace=False)]
+
+            lists = [[] for _ in range(nlist)]
+            for row, label in enumerate(self._nearest_centroids(data, centroids).tolist()):
+                lists[label].append(row)
+
+            with self._lock:
+                # Encodings added while k-means ran
+                if self._size > size:
+                    late = self._nearest_centroids(self._matrix[size:self._size], centroids)
+                    for row, label in enumerate(late.tolist(), start=size):
+                        lists[label].append(row)
+                self._centroids = centroids
+                self._lists = lists
+                self._list_arrays = {}
+                self._trained_size = size
+            print(f"🧭 IVF face index trained: {size} encodings, {nlist} cells")
+
+    def sync(self, users_collection) -> int:
+        added = super().sync(users_collection)
+        with self._lock:
+            needs_training = self._needs_training()
+        if needs_training:
+            self._train_in_background()
+        return added
+
+    def _train_in_background(self):
+        """Start one training thread; /register never waits for k-means"""
+        with self._lock:
+            if self._train_thread is not None and self._train_thread.is_alive():
+                return
+            self._train_thread = threading.Thread(target=self._train_quietly, name='ivf-train', daemon=True)
+            self._train_thread.start()
+
+    def _train_quietly(self):
+        try:
+            self.train()
+            self.persist()
+        except Exception as e:
+            print(f"⚠  IVF face index training failed: {str(e)}")
+
+    def _needs_training(self) -> bool:
+        if not self.is_trained:
+            return self._size >= self.nlist * self.MIN_POINTS_PER_CELL
+        return self._size >= self._trained_size * self.RETRAIN_GROWTH
+
+    def _index_row(self, row: int):
+        if self.is_trained:
+            label = self._nearest_centroids(self._matrix[row:row + 1], self._centroids)[0]
+            self._lists[label].append(row)
+            self._list_arrays.pop(label, None)
+
+    def _cell_rows(self, label: int):
+        rows = self._list_arrays.get(label)
+        if rows is None:
+            rows = np.asarray(self._lists[label], dtype=np.int64)
+            self._list_arrays[label] = rows
+        return rows
+
+    def _candidates(self, query, matrix, sq_norms, tolerance):
+        if not self.is_trained:
+            return super()._candidates(query, matrix, sq_norms, tolerance)
+
+        offsets = self._centroids - query
+        centroid_dist = np.einsum('ij,ij->i', offsets, offsets)
+        nprobe = min(self.nprobe, self.nlist)
+        probe = np.argpartition(centroid_dist, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._cell_rows(c) for c in probe.tolist()])
+        if len(rows) == 0:
+            return rows
+
+        sub = matrix[rows]
+        sq_dist = sq_norms[rows] - 2.0 * (sub @ query) + float(query @ query)
+        slack = (tolerance + 1e-3) ** 2
+        return rows[sq_dist <= slack]
+
+    @staticmethod
+    def _nearest_centroids(points, centroids):
+        """Index of the closest centroid for every row of points"""
+        c_norms = np.einsum('ij,ij->i', centroids, centroids)
+        scores = c_norms[None, :] - 2.0 * (points @ centroids.T)
+        return np.argmin(scores, axis=1)
+
+    def _state(self) -> dict:
+        state = super()._state()
+        if self.is_trained:
+            labels = np.empty(self._size, dtype=np.int32)
+            for label, rows in enumerate(self._lists):
+                labels[rows] = label
+            state['centroids'] = self._centroids
+            state['labels'] = labels
+            state['trained_size'] = np.array(self._trained_size)
+        return state
+
+    def _restore(self, state: dict):
+        super()._restore(state)
+        if 'centroids' in state:
+            self._centroids = state['centroids'].astype(np.float32)
+            self.nlist = len(self._centroids)
+            self._lists = [[] for _ in range(self.nlist)]
+            for row, label in enumerate(state['labels'].tolist()):
+                self._lists[label].append(row)
+            self._list_arrays = {}
+            self._trained_size = int(state['trained_size'])
+
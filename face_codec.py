@@ -0,0 +1,43 @@
+import numpy as np
+from bson.binary import Binary, USER_DEFINED_SUBTYPE
+
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype('<f4')
+ENCODING_BYTES = ENCODING_DIM * ENCODING_DTYPE.itemsize
+
+# Marks a packed little-endian float32 face encoding in users.face_encoding
+FACE_ENCODING_SUBTYPE = USER_DEFINED_SUBTYPE
+
+
+def encode_face_encoding(encoding) -> Binary:
+    """128-d face encoding -> 512-byte BSON Binary (packed float32)"""
+    vector = np.asarray(encoding, dtype=ENCODING_DTYPE).reshape(ENCODING_DIM)
+    return Binary(vector.tobytes(), FACE_ENCODING_SUBTYPE)
+
+
+def is_packed(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview))
+
+
+def decode_face_encoding(value) -> np.ndarray:
+    """
+    Stored face encoding -> NumPy vector. Packed values are viewed in place
+    (read-only, no per-element conversion); legacy lists of doubles from
+    before the migration are still accepted.
+    """
+    if is_packed(value):
+        if len(value) != ENCODING_BYTES:
+            raise ValueError(f'Face encoding must be {ENCODING_BYTES} bytes, got {len(value)}')
+        return np.frombuffer(value, dtype=ENCODING_DTYPE)
+    return np.asarray(value, dtype=np.float64).reshape(ENCODING_DIM)
+
+
+def decode_face_encodings(values) -> np.ndarray:
+    """Many stored encodings -> (n, 128) float32 matrix"""
+    values = list(values)
+    if values and all(is_packed(value) for value in values):
+        return np.frombuffer(b''.join(values), dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+    matrix = np.empty((len(values), ENCODING_DIM), dtype=np.float32)
+    for row, value in enumerate(values):
+        matrix[row] = decode_face_encoding(value)
+    return matrix
@@ -0,0 +1,215 @@
+import atexit
+import os
+import threading
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+from bson import ObjectId
+
+from app.face_codec import ENCODING_DIM, decode_face_encoding
+
+DUPLICATE_TOLERANCE = 0.5
+
+
+class FaceIndex:
+    """
+    In-process index of every registered face encoding.
+
+    Encodings live in one contiguous float32 matrix so a duplicate check is a
+    single batched distance computation instead of one compare_faces call per
+    stored user. The index follows the users collection incrementally through
+    sync(), so registrations from other workers are picked up as well.
+    """
+
+    # Re-read this much history on every sync so documents inserted by other
+    # processes with a slightly older ObjectId are not missed.
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._matrix = np.empty((initial_capacity, ENCODING_DIM), dtype=np.float32)
+        self._sq_norms = np.empty(initial_capacity, dtype=np.float32)
+        self._voter_ids = []
+        self._known_ids = set()
+        self._size = 0
+        self._last_object_id = None
+        # Where persist() writes the index; set by create_face_index
+        self.save_path = None
+
+    def __len__(self):
+        return self._size
+
+    def add(self, voter_id: str, encoding) -> bool:
+        """Add one encoding; returns False if the voter is already indexed"""
+        vector = np.asarray(decode_face_encoding(encoding), dtype=np.float32)
+
+        with self._lock:
+            if voter_id in self._known_ids:
+                return False
+
+            self._reserve(self._size + 1)
+            self._matrix[self._size] = vector
+            self._sq_norms[self._size] = float(vector @ vector)
+            self._voter_ids.append(voter_id)
+            self._known_ids.add(voter_id)
+            self._index_row(self._size)
+            self._size += 1
+            return True
+
+    def sync(self, users_collection) -> int:
+        """Pull users registered since the last sync; returns number added"""
+        with self._lock:
+            query = {'face_encoding': {'$exists': True}}
+            if self._last_object_id is not None:
+                since = self._last_object_id.generation_time - self.SYNC_OVERLAP
+                query['_id'] = {'$gte': ObjectId.from_datetime(since)}
+
+            cursor = users_collection.find(
+                query,
+                {'voter_id': 1, 'face_encoding': 1}
+            ).sort('_id', 1)
+
+            added = 0
+            for user in cursor:
+                if user.get('face_encoding') and self.add(user.get('voter_id'), user['face_encoding']):
+                    added += 1
+                if self._last_object_id is None or user['_id'] > self._last_object_id:
+                    self._last_object_id = user['_id']
+
+            return added
+
+    def find_duplicate(self, encoding, tolerance: float = DUPLICATE_TOLERANCE):
+        """
+        Same contract as SecurityHelper.check_duplicate_face
+        Returns: (is_duplicate, matched_voter_id)
+        """
+        exact_query = np.asarray(encoding, dtype=np.float64).reshape(ENCODING_DIM)
+        query = exact_query.astype(np.float32)
+
+        with self._lock:
+            if self._size == 0:
+                return False, None
+            matrix = self._matrix[:self._size]
+            sq_norms = self._sq_norms[:self._size]
+            candidates = self._candidates(query, matrix, sq_norms, tolerance)
+            index = self._first_match(exact_query, matrix, candidates, tolerance)
+            if index is None:
+                return False, None
+            return True, self._voter_ids[index]
+
+    def save(self, path: str):
+        """Persist the index to a .npz file"""
+        with self._lock:
+            state = self._state()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **state)
+            os.replace(tmp_path, path)
+
+    def persist(self):
+        """Save to save_path (FACE_INDEX_PATH) when one is configured"""
+        if not self.save_path:
+            return
+        try:
+            self.save(self.save_path)
+        except Exception as e:
+            print(f"⚠  Could not save face index to {self.save_path}: {str(e)}")
+
+    @classmethod
+    def load(cls, path: str, **kwargs):
+        """Restore an index written by save(); sync() afterwards to catch up"""
+        with np.load(path, allow_pickle=False) as data:
+            state = {key: data[key] for key in data.files}
+        index = cls(initial_capacity=max(len(state['voter_ids']), 1), **kwargs)
+        index._restore(state)
+        return index
+
+    def _state(self) -> dict:
+        last_id = str(self._last_object_id) if self._last_object_id else ''
+        return {
+            'matrix': self._matrix[:self._size],
+            'voter_ids': np.array(self._voter_ids, dtype=str),
+            'last_object_id': np.array(last_id),
+        }
+
+    def _restore(self, state: dict):
+        matrix = state['matrix'].astype(np.float32, copy=False)
+        size = len(matrix)
+        self._reserve(size)
+        self._matrix[:size] = matrix
+        self._sq_norms[:size] = np.einsum('ij,ij->i', matrix, matrix)
+        self._voter_ids = [str(v) for v in state['voter_ids']]
+        self._known_ids = set(self._voter_ids)
+        self._size = size
+        last_id = str(state['last_object_id'])
+        self._last_object_id = ObjectId(last_id) if last_id else None
+
+    def _index_row(self, row: int):
+        """Hook for subclasses that keep extra structures per row"""
+
+    def _candidates(self, query, matrix, sq_norms, tolerance):
+        """Rows whose float32 distance is within tolerance (plus rounding slack)"""
+        sq_dist = sq_norms - 2.0 * (matrix @ query) + float(query @ query)
+        slack = (tolerance + 1e-3) ** 2
+        return np.flatnonzero(sq_dist <= slack)
+
+    @staticmethod
+    def _first_match(query, matrix, candidates, tolerance):
+        """Exact float64 re-check so borderline faces match like compare_faces"""
+        if len(candidates) == 0:
+            return None
+        exact = np.linalg.norm(
+            matrix[candidates].astype(np.float64) - query,
+            axis=1
+        )
+        hits = candidates[exact <= tolerance]
+        return int(hits.min()) if len(hits) else None
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._matrix):
+            return
+        new_capacity = max(capacity, len(self._matrix) * 2)
+        matrix = np.empty((new_capacity, ENCODING_DIM), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.empty(new_capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix = matrix
+        self._sq_norms = sq_norms
+
+
+def create_face_index(backend: str = None) -> Optional[FaceIndex]:
+    """
+    Build the face index selected by FACE_INDEX_BACKEND ('exact' or 'ivf')
+    If FACE_INDEX_PATH points at a saved index it is loaded from disk, and the
+    index is written back there on shutdown (and after each IVF training)
+    'stream' keeps no index in memory (returns None): duplicate checks then
+    stream the users collection in chunks (see face_loader)
+    """
+    backend = backend or os.environ.get('FACE_INDEX_BACKEND', 'exact')
+    path = os.environ.get('FACE_INDEX_PATH')
+
+    if backend == 'ivf':
+        from app.face_ann import IVFFaceIndex
+        index_cls = IVFFaceIndex
+        kwargs = {
+            'nlist': int(os.environ.get('FACE_INDEX_NLIST', 1024)),
+            'nprobe': int(os.environ.get('FACE_INDEX_NPROBE', 16)),
+        }
+    elif backend == 'exact':
+        index_cls = FaceIndex
+        kwargs = {}
+    elif backend == 'stream':
+        return None
+    else:
+        raise ValueError(f"Unknown face index backend: {backend}")
+
+    if path and os.path.exists(path):
+        print(f"📂 Loading face index from {path}")
+        index = index_cls.load(path, **kwargs)
+    else:
+        index = index_cls(**kwargs)
+    if path:
+        index.save_path = path
+        atexit.register(index.persist)
+    return index
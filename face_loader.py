@@ -0,0 +1,72 @@
+"""
+Streaming face-encoding loader
+
+Reads only voter_id and face_encoding from the users collection (no
+encrypted PII, no timestamps) and hands them out as fixed-size NumPy
+chunks, so scanning the electorate needs memory for one chunk rather than
+the whole collection.
+"""
+import os
+
+import numpy as np
+
+from app.face_codec import ENCODING_DIM, decode_face_encodings
+
+ENCODING_PROJECTION = {'_id': 0, 'voter_id': 1, 'face_encoding': 1}
+DEFAULT_CHUNK_SIZE = int(os.environ.get('FACE_LOADER_CHUNK_SIZE', 4096))
+
+
+def iter_encoding_chunks(users_collection, chunk_size: int = None, batch_size: int = None, query: dict = None):
+    """
+    Yield (voter_ids, (n, 128) float32 matrix) chunks of at most chunk_size
+    users. batch_size is the cursor's round-trip size. Closing the generator
+    early (e.g. on a match) closes the cursor.
+    """
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    cursor = users_collection.find(
+        {'face_encoding': {'$exists': True}, **(query or {})},
+        ENCODING_PROJECTION
+    ).batch_size(batch_size or min(chunk_size, 1000))
+
+    try:
+        yield from _chunk(cursor, chunk_size)
+    finally:
+        cursor.close()
+
+
+def chunk_user_documents(users, chunk_size: int = None):
+    """Same chunks from user documents that are already in memory"""
+    yield from _chunk(users, chunk_size or DEFAULT_CHUNK_SIZE)
+
+
+def _chunk(users, chunk_size):
+    voter_ids = []
+    encodings = []
+    for user in users:
+        if not user.get('face_encoding'):
+            continue
+        voter_ids.append(user.get('voter_id'))
+        encodings.append(user['face_encoding'])
+        if len(voter_ids) >= chunk_size:
+            yield voter_ids, decode_face_encodings(encodings)
+            voter_ids, encodings = [], []
+    if voter_ids:
+        yield voter_ids, decode_face_encodings(encodings)
+
+
+def scan_for_duplicate(encoding, chunks, tolerance: float):
+    """
+    First stored face within tolerance, stopping at the first chunk with a
+    match. Returns (is_duplicate, matched_voter_id).
+    """
+    query = np.asarray(encoding, dtype=np.float64).reshape(ENCODING_DIM)
+    try:
+        for voter_ids, matrix in chunks:
+            distances = np.linalg.norm(matrix.astype(np.float64) - query, axis=1)
+            hits = np.flatnonzero(distances <= tolerance)
+            if len(hits):
+                return True, voter_ids[int(hits[0])]
+        return False, None
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
@@ -0,0 +1,202 @@
+"""
+Face-encoding engine for /register and /login
+
+Face detection and encoding are CPU-bound and hold the GIL, so running them
+on the request thread serializes every login in a worker. FaceEncodingEngine
+runs them in a process pool sized to the machine, finds faces on a
+downscaled copy of the frame (boxes are mapped back to full resolution for
+the landmarks/encoding step), and bounds the number of queued images so an
+overloaded server answers 503 instead of building an unbounded backlog.
+
+Settings (env): FACE_WORKERS, FACE_QUEUE_SIZE, FACE_QUEUE_TIMEOUT,
+FACE_DETECTOR_MODEL (hog|cnn), FACE_UPSAMPLE, FACE_MAX_DIMENSION,
+FACE_NUM_JITTERS
+"""
+import asyncio
+import base64
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import face_recognition
+import numpy as np
+from PIL import Image
+
+NO_FACE_ERROR = 'No face detected. Please try again.'
+ENCODE_ERROR = 'Could not encode face. Please try again.'
+STAGES = ('decode', 'downscale', 'detect', 'encode')
+
+
+class EngineBusy(Exception):
+    """All face-processing slots are taken; the caller should retry later"""
+
+
+def decode_image(image_data):
+    """Base64 image (with or without a data URL prefix) -> RGB uint8 array"""
+    face_data = image_data.split(',')[1] if ',' in image_data else image_data
+    image = Image.open(io.BytesIO(base64.b64decode(face_data)))
+    return np.asarray(image.convert('RGB'))
+
+
+def downscale(image, max_dimension):
+    """Shrink by an integer factor so the longest side fits max_dimension; returns (small_image, scale)"""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_dimension or longest <= max_dimension:
+        return image, 1.0
+    # Box-filter reduce by a whole factor: much cheaper than a resampling resize
+    factor = -(-longest // max_dimension)
+    small = Image.fromarray(image).reduce(factor)
+    return np.asarray(small), 1.0 / factor
+
+
+def rescale_locations(locations, scale, shape):
+    """Map (top, right, bottom, left) boxes from the downscaled frame back to full size"""
+    if scale == 1.0:
+        return locations
+    height, width = shape[:2]
+    return [
+        (max(0, int(top / scale)), min(width, int(round(right / scale))),
+         min(height, int(round(bottom / scale))), max(0, int(left / scale)))
+        for top, right, bottom, left in locations
+    ]
+
+
+def encode_image(image_data, model='hog', upsample=1, max_dimension=640, num_jitters=1):
+    """
+    Same contract as FaceRecognition.capture_and_encode (first face's 128-d
+    encoding as a list, None when there is none), plus an error message and
+    per-stage timings in seconds. Runs in the worker processes.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    image = decode_image(image_data)
+    mark = time.perf_counter()
+    timings['decode'] = mark - started
+
+    small, scale = downscale(image, max_dimension)
+    timings['downscale'] = time.perf_counter() - mark
+    mark = time.perf_counter()
+
+    locations = face_recognition.face_locations(small, number_of_times_to_upsample=upsample, model=model)
+    timings['detect'] = time.perf_counter() - mark
+    mark = time.perf_counter()
+
+    if not locations:
+        timings['encode'] = 0.0
+        return {'encoding': None, 'error': NO_FACE_ERROR, 'timings': timings, 'finished_at': time.time()}
+
+    encodings = face_recognition.face_encodings(
+        image, rescale_locations(locations, scale, image.shape), num_jitters=num_jitters
+    )
+    timings['encode'] = time.perf_counter() - mark
+
+    if not encodings:
+        return {'encoding': None, 'error': ENCODE_ERROR, 'timings': timings, 'finished_at': time.time()}
+    return {'encoding': encodings[0].tolist(), 'error': None, 'timings': timings, 'finished_at': time.time()}
+
+
+def _warm_up():
+    # Load dlib's models once per worker instead of on the first request
+    face_recognition.face_locations(np.zeros((32, 32, 3), dtype=np.uint8))
+
+
+class FaceEncodingEngine:
+    """Process pool for face encoding with a bounded queue"""
+
+    def __init__(self, workers: int = None, max_pending: int = None, queue_timeout: float = None,
+                 model: str = None, upsample: int = None, max_dimension: int = None,
+                 num_jitters: int = None):
+        self.workers = workers or int(os.environ.get('FACE_WORKERS', 0)) or os.cpu_count() or 1
+        self.max_pending = max_pending or int(os.environ.get('FACE_QUEUE_SIZE', 0)) or self.workers * 2
+        self.queue_timeout = (queue_timeout if queue_timeout is not None
+                              else float(os.environ.get('FACE_QUEUE_TIMEOUT', 0.5)))
+        self.options = {
+            'model': model or os.environ.get('FACE_DETECTOR_MODEL', 'hog'),
+            'upsample': upsample if upsample is not None else int(os.environ.get('FACE_UPSAMPLE', 1)),
+            'max_dimension': (max_dimension if max_dimension is not None
+                              else int(os.environ.get('FACE_MAX_DIMENSION', 640))),
+            'num_jitters': num_jitters or int(os.environ.get('FACE_NUM_JITTERS', 1)),
+        }
+        if self.options['model'] not in ('hog', 'cnn'):
+            raise ValueError(f"Unknown face detector model: {self.options['model']}")
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._owner_pid = None
+        self._stats = {'completed': 0, 'failed': 0, 'rejected': 0, 'in_flight': 0}
+        self._stage_totals = dict.fromkeys(STAGES + ('queue',), 0.0)
+
+    def _get_pool(self):
+        """Process pool for this process (recreated after fork)"""
+        with self._lock:
+            if self._pool is None or self._owner_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+                self._owner_pid = os.getpid()
+            return self._pool
+
+    def submit(self, image_data):
+        """Queue an image; raises EngineBusy when max_pending images are already waiting"""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise EngineBusy('Face processing is at capacity, please retry')
+
+        with self._lock:
+            self._stats['in_flight'] += 1
+        submitted_at = time.time()
+        try:
+            future = self._get_pool().submit(encode_image, image_data, **self.options)
+        except Exception:
+            self._release(None, submitted_at)
+            raise
+        future.add_done_callback(lambda done: self._release(done, submitted_at))
+        return future
+
+    def _release(self, future, submitted_at):
+        self._slots.release()
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            if future is None or future.cancelled() or future.exception() is not None:
+                self._stats['failed'] += 1
+                return
+            result = future.result()
+            self._stats['completed'] += 1
+            for stage in STAGES:
+                self._stage_totals[stage] += result['timings'].get(stage, 0.0)
+            busy = sum(result['timings'].values())
+            self._stage_totals['queue'] += max(0.0, result['finished_at'] - busy - submitted_at)
+
+    def encode(self, image_data):
+        """(encoding list, error message) for a base64 image, computed in the pool"""
+        result = self.submit(image_data).result()
+        return result['encoding'], result['error']
+
+    async def aencode(self, image_data):
+        """Async variant of encode for the asyncio request path"""
+        result = await asyncio.wrap_future(self.submit(image_data))
+        return result['encoding'], result['error']
+
+    def metrics(self) -> dict:
+        with self._lock:
+            completed = self._stats['completed']
+            return {
+                **self._stats,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                **self.options,
+                'avg_stage_ms': {
+                    stage: round(total / completed * 1000, 2) if completed else None
+                    for stage, total in self._stage_totals.items()
+                },
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
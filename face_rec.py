@@ -1,7 +1,10 @@
 import face_recognition
 import numpy as np
-import cv2
-import base64
+from app.face_codec import decode_face_encoding
+from app.face_pipeline import encode_image
+
+# Same tolerance /login passes to face_recognition.compare_faces
+FACE_MATCH_TOLERANCE = 0.6
 
 class FaceRecognition:
     
@@ -9,17 +12,8 @@ class FaceRecognition:
     def capture_and_encode(image_data):
         """Capture face from webcam and encode"""
         try:
-            # Decode base64 image
-            img_bytes = base64.b64decode(image_data.split(',')[1])
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Find face encodings
-            face_encodings = face_recognition.face_encodings(image)
-            
-            if len(face_encodings) > 0:
-                return face_encodings[0].tolist()
-            return None
+            # Same steps the FaceEncodingEngine workers run, in this process
+            return encode_image(image_data)['encoding']
         except Exception as e:
             print(f"Face encoding error: {e}")
             return None
@@ -28,13 +22,27 @@ class FaceRecognition:
     def verify_face(stored_encoding, live_encoding):
         """Verify if two face encodings match"""
         try:
-            stored = np.array(stored_encoding)
+            stored = decode_face_encoding(stored_encoding)
             live = np.array(live_encoding)
             
             distance = face_recognition.face_distance([stored], live)[0]
-            threshold = 0.6
+            threshold = FACE_MATCH_TOLERANCE
             
-            return distance < threshold
+            return distance <= threshold
         except Exception as e:
             print(f"Face verification error: {e}")
             return False
+    
+    @staticmethod
+    def verify_faces_batch(stored_encodings, live_encodings, tolerance=FACE_MATCH_TOLERANCE):
+        """
+        Verify many (stored, live) encoding pairs with one vectorized distance
+        computation. Returns (matches, distances); a pair matches when its
+        distance is <= tolerance, as with compare_faces in /login.
+        """
+        if len(stored_encodings) == 0:
+            return [], []
+        stored = np.asarray(stored_encodings, dtype=np.float64)
+        live = np.asarray(live_encodings, dtype=np.float64)
+        distances = np.linalg.norm(stored - live, axis=1)
+        return (distances <= tolerance).tolist(), distances.tolist()
@@ -0,0 +1,138 @@
+"""
+Bulk AES-GCM encryption for voter PII fields
+
+Whole records (and lists of records) are encrypted or decrypted in one pass
+with a single cipher context. Each field token is
+
+    v2:<base64(nonce[12] || ciphertext || tag[16])>
+
+where the nonce is an 8-byte random base drawn once per record followed by
+a 4-byte field counter, and the field name is the associated data, so a
+ciphertext copied into another field (or another record's nonce) fails
+authentication. Tokens without the v2: prefix are the original AES-CBC
+values from SecurityHelper.encrypt_data and are still decrypted.
+
+If the optional `cryptography` package is installed its AESGCM context
+(OpenSSL, AES-NI) is created once and reused for every field; otherwise
+PyCryptodome is used with one GCM object per field.
+"""
+import base64
+import hashlib
+import os
+from typing import Dict, Iterable, List
+
+from Crypto.Cipher import AES
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+TOKEN_PREFIX = 'v2:'
+NONCE_BASE_SIZE = 8
+NONCE_SIZE = 12
+TAG_SIZE = 16
+PII_FIELDS = ('name', 'email', 'phone', 'address')
+
+
+class FieldDecryptionError(ValueError):
+    """A v2 token failed authentication (wrong key, field or tampered data)"""
+
+
+class FieldEncryptor:
+    """AES-256-GCM field encryption for whole records"""
+
+    def __init__(self, key: bytes, fields: Iterable[str] = PII_FIELDS, legacy_decrypt=None, backend: str = None):
+        # Separate GCM key from the CBC key the v1 tokens use
+        self._key = hashlib.sha256(b'field-crypto/aes-gcm/v2' + key).digest()
+        self.fields = tuple(fields)
+        self._legacy_decrypt = legacy_decrypt
+        use_openssl = AESGCM is not None and backend != 'pycryptodome'
+        self._aead = AESGCM(self._key) if use_openssl else None
+        self.backend = 'cryptography' if self._aead is not None else 'pycryptodome'
+
+    def _seal(self, nonce, plaintext, aad):
+        if self._aead is not None:
+            return self._aead.encrypt(nonce, plaintext, aad)
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+        cipher.update(aad)
+        ciphertext, tag = cipher.encrypt_and_digest(plaintext)
+        return ciphertext + tag
+
+    def _open(self, nonce, sealed, aad):
+        try:
+            if self._aead is not None:
+                return self._aead.decrypt(nonce, sealed, aad)
+            cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce, mac_len=TAG_SIZE)
+            cipher.update(aad)
+            return cipher.decrypt_and_verify(sealed[:-TAG_SIZE], sealed[-TAG_SIZE:])
+        except Exception as e:
+            raise FieldDecryptionError(f'Could not authenticate field {aad.decode()!r}') from e
+
+    def encrypt_record(self, record: Dict, fields: Iterable[str] = None) -> Dict:
+        """Copy of record with the given (default: PII) fields encrypted"""
+        encrypted = dict(record)
+        nonce_base = os.urandom(NONCE_BASE_SIZE)
+        for counter, field in enumerate(fields or self.fields):
+            value = record.get(field)
+            if value is None:
+                continue
+            nonce = nonce_base + counter.to_bytes(4, 'big')
+            sealed = self._seal(nonce, str(value).encode('utf-8'), field.encode('utf-8'))
+            encrypted[field] = TOKEN_PREFIX + base64.b64encode(nonce + sealed).decode('ascii')
+        return encrypted
+
+    def encrypt_records(self, records: Iterable[Dict], fields: Iterable[str] = None) -> List[Dict]:
+        fields = tuple(fields or self.fields)
+        return [self.encrypt_record(record, fields) for record in records]
+
+    def decrypt_field(self, token: str, field: str):
+        """Plaintext of one stored field (v2 or legacy CBC token); None for None"""
+        if token is None:
+            return None
+        if not token.startswith(TOKEN_PREFIX):
+            return self._legacy_decrypt(token) if self._legacy_decrypt else None
+        raw = base64.b64decode(token[len(TOKEN_PREFIX):])
+        return self._open(raw[:NONCE_SIZE], raw[NONCE_SIZE:], field.encode('utf-8')).decode('utf-8')
+
+    def decrypt_record(self, record: Dict, fields: Iterable[str] = None) -> Dict:
+        decrypted = dict(record)
+        for field in fields or self.fields:
+            if record.get(field) is not None:
+                decrypted[field] = self.decrypt_field(record[field], field)
+        return decrypted
+
+    def decrypt_records(self, records: Iterable[Dict], fields: Iterable[str] = None,
+                        stats: Dict = None) -> List[Dict]:
+        """
+        Export path: decrypt many records with one context. Works column by
+        column so each field's associated data is encoded once and the inner
+        loop only does base64 + AES-GCM.
+
+        A value that fails to decode or authenticate becomes None, like the
+        per-field decrypt_data, so one bad row does not stop an export; the
+        number of such values is counted in stats['failed'].
+        """
+        records = [dict(record) for record in records]
+        b64decode = base64.b64decode
+        prefix_len = len(TOKEN_PREFIX)
+        stats = stats if stats is not None else {}
+        stats.setdefault('failed', 0)
+
+        for field in fields or self.fields:
+            aad = field.encode('utf-8')
+            for record in records:
+                token = record.get(field)
+                if token is None:
+                    continue
+                if not token.startswith(TOKEN_PREFIX):
+                    record[field] = self._legacy_decrypt(token) if self._legacy_decrypt else None
+                    continue
+                try:
+                    raw = b64decode(token[prefix_len:])
+                    record[field] = self._open(raw[:NONCE_SIZE], raw[NONCE_SIZE:], aad).decode('utf-8')
+                except (FieldDecryptionError, ValueError):
+                    # binascii.Error and UnicodeDecodeError are ValueErrors too
+                    record[field] = None
+                    stats['failed'] += 1
+        return records
@@ -0,0 +1,351 @@
+"""
+Ledger/MongoDB vote reconciliation over Merkle range digests
+
+Both stores keep a digest tree over voter_id prefixes: for every prefix of
+length 0..DIGEST_DEPTH, the number of votes under it and four lane sums of
+sha256(voter_id|candidate). The digests are additive, so a parent is the
+sum of its children and recording a vote updates one node per level. The
+chaincode maintains DIGEST_<level>_<prefix> keys in submitVote and
+submitVoteBatch (voting.js); MongoDB keeps the same nodes in vote_digests,
+updated right after the ballot insert.
+
+Reconciliation walks both trees top-down from the root and only descends
+into prefixes whose digests differ; at the leaves it compares the votes of
+the differing ranges record by record. The cost grows with the number of
+differing ranges, not with the size of the electorate. A node that differs
+while all its children agree is checked against the one vote stored at its
+exact prefix; if that matches too, the MongoDB node was left inconsistent
+by a partial digest write and is recomputed from its children.
+
+Differences are repaired or flagged:
+    missing_on_ledger   vote re-queued in the outbox (in-flight ones are left alone)
+    missing_in_mongo    flagged; the ballot cannot be recreated from the ledger
+    candidate_mismatch  flagged
+
+Usage: python -m app.ledger_reconcile [--dry-run] [--rebuild-digests]
+"""
+import argparse
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.event_log import get_logger
+
+log = get_logger('ledger_reconcile')
+
+# Must match DIGEST_DEPTH in voting.js
+DIGEST_DEPTH = int(os.environ.get('RECONCILE_DIGEST_DEPTH', 3))
+LANES = 4
+EMPTY_DIGEST = (0,) * (LANES + 1)
+
+MISSING_ON_LEDGER = 'missing_on_ledger'
+MISSING_IN_MONGO = 'missing_in_mongo'
+CANDIDATE_MISMATCH = 'candidate_mismatch'
+
+
+def vote_digest_lanes(voter_id, candidate):
+    """Four 32-bit lanes of sha256(voter_id|candidate), as in voting.js"""
+    digest = hashlib.sha256(f"{voter_id}|{candidate}".encode('utf-8')).digest()
+    return tuple(int.from_bytes(digest[i:i + 4], 'big') for i in range(0, 4 * LANES, 4))
+
+
+def _ledger_node(node):
+    if not node:
+        return EMPTY_DIGEST
+    return (int(node['count']),) + tuple(int(lane) for lane in node['lanes'])
+
+
+def _mongo_node(doc):
+    if not doc:
+        return EMPTY_DIGEST
+    return (doc.get('count', 0),) + tuple(doc.get(f'h{i}', 0) for i in range(LANES))
+
+
+class VoteDigestTree:
+    """
+    MongoDB side of the digest tree
+    Documents: {'_id': prefix, 'level': len(prefix), 'count': n, 'h0'..'h3': lane sums}
+    """
+
+    def __init__(self, digests_collection, depth=DIGEST_DEPTH):
+        self.digests = digests_collection
+        self.depth = depth
+
+    @staticmethod
+    def updates(voter_id, candidate, depth=DIGEST_DEPTH, sign=1):
+        """UpdateOne operations recording one vote (also used by the asyncio path)"""
+        lanes = vote_digest_lanes(voter_id, candidate)
+        inc = {'count': sign, **{f'h{i}': sign * lane for i, lane in enumerate(lanes)}}
+        return [
+            UpdateOne({'_id': voter_id[:level]}, {'$inc': inc, '$set': {'level': level}}, upsert=True)
+            for level in range(min(depth, len(voter_id)) + 1)
+        ]
+
+    def record(self, voter_id, candidate):
+        self.digests.bulk_write(self.updates(voter_id, candidate, self.depth), ordered=False)
+
+    def node(self, prefix):
+        return _mongo_node(self.digests.find_one({'_id': prefix}))
+
+    def children(self, prefix):
+        """{child prefix: digest} one level below prefix"""
+        if len(prefix) >= self.depth:
+            return {}
+        docs = self.digests.find({
+            'level': len(prefix) + 1,
+            '_id': {'$gte': prefix, '$lt': prefix + '\uffff'}
+        })
+        return {doc['_id']: _mongo_node(doc) for doc in docs}
+
+    def recompute_node(self, prefix, votes_collection):
+        """Reset one node to the sum of its children plus the vote whose voter_id is prefix"""
+        node = [0] * (LANES + 1)
+        for child in self.children(prefix).values():
+            node = [a + b for a, b in zip(node, child)]
+        own = votes_collection.find_one({'voter_id': prefix}, {'_id': 0, 'candidate': 1})
+        if own:
+            node = [a + b for a, b in zip(node, (1,) + vote_digest_lanes(prefix, own.get('candidate')))]
+        self.digests.update_one(
+            {'_id': prefix},
+            {'$set': {'level': len(prefix), 'count': node[0], **{f'h{i}': node[i + 1] for i in range(LANES)}}},
+            upsert=True
+        )
+
+    def rebuild(self, votes_collection, batch_size=5000):
+        """Recompute every node from the votes collection (full scan); returns the vote count"""
+        nodes = {}
+        count = 0
+        for vote in votes_collection.find({}, {'_id': 0, 'voter_id': 1, 'candidate': 1}).batch_size(batch_size):
+            voter_id = vote.get('voter_id')
+            if not voter_id:
+                continue
+            count += 1
+            lanes = vote_digest_lanes(voter_id, vote.get('candidate'))
+            for level in range(min(self.depth, len(voter_id)) + 1):
+                node = nodes.setdefault(voter_id[:level], [0] * (LANES + 1))
+                node[0] += 1
+                for i, lane in enumerate(lanes):
+                    node[i + 1] += lane
+        self.digests.delete_many({})
+        docs = [
+            {'_id': prefix, 'level': len(prefix), 'count': node[0],
+             **{f'h{i}': node[i + 1] for i in range(LANES)}}
+            for prefix, node in nodes.items()
+        ]
+        for start in range(0, len(docs), batch_size):
+            self.digests.insert_many(docs[start:start + batch_size], ordered=False)
+        return count
+
+
+class LedgerDigestTree:
+    """Chaincode side of the digest tree, read through getDigestChildren"""
+
+    def __init__(self, blockchain_client):
+        self.blockchain = blockchain_client
+        self.depth = None
+
+    def node_and_children(self, prefix):
+        data = self.blockchain.get_digest_children(prefix)
+        self.depth = data.get('depth', self.depth)
+        children = {child: _ledger_node(node) for child, node in data.get('children', {}).items()}
+        return _ledger_node(data.get('node')), children
+
+
+class LedgerReconciler:
+    """Top-down diff of the two digest trees, then repair or flag each difference"""
+
+    def __init__(self, votes_collection, digests_collection, outbox_collection, flags_collection,
+                 blockchain_client, vote_pipeline=None, depth=DIGEST_DEPTH):
+        self.votes = votes_collection
+        self.mongo_tree = VoteDigestTree(digests_collection, depth)
+        self.ledger_tree = LedgerDigestTree(blockchain_client)
+        self.outbox = outbox_collection
+        self.flags = flags_collection
+        self.blockchain = blockchain_client
+        self.pipeline = vote_pipeline
+        self.depth = depth
+
+    def diff(self):
+        """Returns (differences, stats); each difference is a dict with voter_id and kind"""
+        stats = {'nodes_compared': 0, 'ledger_queries': 0, 'ranges_scanned': 0, 'records_read': 0,
+                 'inconsistent_nodes': []}
+        differences = []
+
+        ledger_root, ledger_children = self.ledger_tree.node_and_children('')
+        stats['ledger_queries'] += 1
+        if self.ledger_tree.depth not in (None, self.depth):
+            raise ValueError(f"Chaincode digest depth {self.ledger_tree.depth} != {self.depth}"
+                             f" (set RECONCILE_DIGEST_DEPTH)")
+        stats['nodes_compared'] += 1
+        if ledger_root == self.mongo_tree.node(''):
+            return differences, stats
+
+        pending = [('', ledger_children)]
+        while pending:
+            prefix, ledger_children = pending.pop()
+            if len(prefix) >= self.depth:
+                differences += self._diff_range(prefix, stats)
+                continue
+            mongo_children = self.mongo_tree.children(prefix)
+            differing = 0
+            for child in sorted(set(ledger_children) | set(mongo_children)):
+                stats['nodes_compared'] += 1
+                if ledger_children.get(child, EMPTY_DIGEST) == mongo_children.get(child, EMPTY_DIGEST):
+                    continue
+                differing += 1
+                if len(child) >= self.depth:
+                    pending.append((child, {}))
+                else:
+                    _, grandchildren = self.ledger_tree.node_and_children(child)
+                    stats['ledger_queries'] += 1
+                    pending.append((child, grandchildren))
+            if not differing:
+                # The children agree, so the difference is in the node itself: a
+                # vote whose voter_id is exactly prefix, or a MongoDB node left
+                # inconsistent by a partial digest write (recomputed by reconcile)
+                found = self._diff_exact(prefix, stats)
+                differences += found
+                if not found:
+                    stats['inconsistent_nodes'].append(prefix)
+        return differences, stats
+
+    def _diff_range(self, prefix, stats):
+        """Record-level comparison of the votes under one leaf prefix"""
+        stats['ranges_scanned'] += 1
+        mongo = {
+            vote['voter_id']: vote for vote in self.votes.find(
+                {'voter_id': {'$gte': prefix, '$lt': prefix + '\uffff'}},
+                {'_id': 0, 'voter_id': 1, 'candidate': 1, 'vote_id': 1}
+            )
+        }
+        ledger = {vote.get('voterID'): vote for vote in self.blockchain.iter_votes(prefix=prefix)}
+        stats['records_read'] += len(mongo) + len(ledger)
+        stats['ledger_queries'] += 1
+        return self._compare(mongo, ledger)
+
+    def _diff_exact(self, prefix, stats):
+        """Compare only the vote whose voter_id equals prefix, one record from each side"""
+        mongo = self.votes.find_one({'voter_id': prefix}, {'_id': 0, 'voter_id': 1, 'candidate': 1, 'vote_id': 1})
+        # VOTE_<prefix> sorts before every longer key in its range, so a
+        # one-record page holds it if it exists
+        first = next(iter(self.blockchain.iter_votes(page_size=1, prefix=prefix)), None)
+        ledger = first if first and first.get('voterID') == prefix else None
+        stats['records_read'] += (mongo is not None) + (ledger is not None)
+        stats['ledger_queries'] += 1
+        return self._compare({prefix: mongo} if mongo else {}, {prefix: ledger} if ledger else {})
+
+    @staticmethod
+    def _compare(mongo, ledger):
+        differences = []
+        for voter_id in sorted(set(mongo) | set(ledger)):
+            ours, theirs = mongo.get(voter_id), ledger.get(voter_id)
+            if theirs is None:
+                kind = MISSING_ON_LEDGER
+            elif ours is None:
+                kind = MISSING_IN_MONGO
+            elif ours.get('candidate') != theirs.get('candidate'):
+                kind = CANDIDATE_MISMATCH
+            else:
+                continue
+            differences.append({'voter_id': voter_id, 'kind': kind, 'mongo': ours, 'ledger': theirs})
+        return differences
+
+    def reconcile(self, dry_run=False):
+        """Diff, then re-queue or flag; returns a report"""
+        start = time.perf_counter()
+        differences, stats = self.diff()
+        inconsistent = stats.pop('inconsistent_nodes')
+        report = {
+            'checked_at': datetime.now(),
+            'differences': len(differences),
+            'requeued': 0, 'in_flight': 0, 'flagged': 0,
+            'nodes_recomputed': 0 if dry_run else len(inconsistent),
+            **stats,
+        }
+        if not dry_run:
+            for prefix in inconsistent:
+                self.mongo_tree.recompute_node(prefix, self.votes)
+        for difference in differences:
+            if difference['kind'] == MISSING_ON_LEDGER:
+                outcome = self._requeue(difference['mongo'], dry_run)
+            else:
+                outcome = 'flagged'
+                if not dry_run:
+                    self._flag(difference)
+            report[outcome] += 1
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return report, differences
+
+    def _requeue(self, vote, dry_run):
+        from app.vote_pipeline import VoteSubmissionPipeline
+
+        entry = self.outbox.find_one({'vote_id': vote.get('vote_id')}, {'status': 1})
+        if entry and entry.get('status') in (VoteSubmissionPipeline.QUEUED, VoteSubmissionPipeline.SUBMITTING):
+            return 'in_flight'
+        if dry_run:
+            return 'requeued'
+        if entry:
+            now = datetime.now()
+            self.outbox.update_one(
+                {'_id': entry['_id'], 'status': entry.get('status')},
+                {'$set': {'status': VoteSubmissionPipeline.QUEUED, 'attempts': 0, 'next_attempt_at': now,
+                          'updated_at': now, 'requeued_by': 'reconciliation'}}
+            )
+        elif self.pipeline is not None:
+            self.pipeline.enqueue(vote['vote_id'], vote['voter_id'], vote['candidate'])
+        else:
+            self.outbox.insert_one(VoteSubmissionPipeline.outbox_document(
+                vote['vote_id'], vote['voter_id'], vote['candidate']
+            ))
+        log.info('requeued', voter_id=vote['voter_id'])
+        return 'requeued'
+
+    def _flag(self, difference):
+        now = datetime.now()
+        self.flags.update_one(
+            {'voter_id': difference['voter_id'], 'kind': difference['kind']},
+            {
+                '$set': {'mongo': difference['mongo'], 'ledger': difference['ledger'], 'last_seen': now},
+                '$setOnInsert': {'first_seen': now, 'resolved': False}
+            },
+            upsert=True
+        )
+        log.warning('flagged', kind=difference['kind'], voter_id=difference['voter_id'])
+
+
+def main():
+    from pymongo import MongoClient
+    from app.blockchain import BlockchainClient
+    from app.database import MONGO_DB, MONGO_URI
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--database', default=MONGO_DB)
+    parser.add_argument('--dry-run', action='store_true', help='Report differences without repairing')
+    parser.add_argument('--rebuild-digests', action='store_true',
+                        help='Recompute vote_digests from the votes collection first')
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.database]
+    db.vote_digests.create_index([('level', ASCENDING), ('_id', ASCENDING)])
+    if args.rebuild_digests:
+        count = VoteDigestTree(db.vote_digests).rebuild(db.votes)
+        print(f"🌳 Rebuilt MongoDB digests from {count} votes")
+
+    reconciler = LedgerReconciler(db.votes, db.vote_digests, db.vote_outbox,
+                                  db.reconciliation_flags, BlockchainClient())
+    report, differences = reconciler.reconcile(dry_run=args.dry_run)
+
+    print(f"{'✅' if not differences else '⚠ '} {report['differences']} differences"
+          f"{' (dry run)' if args.dry_run else ''}: {report['requeued']} re-queued,"
+          f" {report['in_flight']} in flight, {report['flagged']} flagged")
+    print(f"   {report['nodes_compared']} digest nodes compared, {report['ledger_queries']} ledger queries,"
+          f" {report['ranges_scanned']} ranges / {report['records_read']} records read"
+          f" in {report['elapsed_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
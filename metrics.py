@@ -0,0 +1,193 @@
+"""
+Per-phase latency histograms for the consensus and voting hot paths
+
+    with timer('encryption'):
+        ...
+
+Durations are recorded in HDR-style log-linear buckets: 128 linear
+sub-buckets per power of two, so any recorded value, and therefore any
+quantile, is within 1% of the true duration, in a fixed array of counters
+however many samples arrive. render_prometheus() returns every phase in the
+Prometheus text format as a summary with p50/p95/p99 (served at /metrics).
+
+Set METRICS_ENABLED=0 to turn recording off; timer() then hands back one
+shared no-op context manager, so an instrumented block costs a single
+attribute lookup and call. Histograms are per process; with several
+workers, scrape each of them.
+"""
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+METRIC_NAME = 'vote_phase_duration_seconds'
+QUANTILES = (0.5, 0.95, 0.99)
+
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+MAX_TRACKABLE_NS = 1 << 42  # ~73 minutes; longer samples land in the top bucket
+BUCKET_COUNT = SUB_BUCKETS + (MAX_TRACKABLE_NS.bit_length() - SUB_BUCKET_BITS) * HALF_SUB_BUCKETS
+
+
+def _bucket_index(value):
+    """Values below SUB_BUCKETS are exact; above, each power of two gets HALF_SUB_BUCKETS slots"""
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    if shift <= 0:
+        return value
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+
+def _bucket_value(index):
+    """Midpoint of the range of values that land in bucket index"""
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+    shift += 1
+    return ((offset + HALF_SUB_BUCKETS) << shift) + (1 << (shift - 1))
+
+
+class LatencyHistogram:
+    """Thread-safe log-linear histogram of durations in nanoseconds"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record_ns(self, value):
+        value = min(max(int(value), 0), MAX_TRACKABLE_NS - 1)
+        index = _bucket_index(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ns += value
+            if value > self.max_ns:
+                self.max_ns = value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self.count, self.total_ns, self.max_ns
+
+    def quantiles_ns(self, quantiles=QUANTILES, snapshot=None):
+        """{q: nanoseconds}; one pass over the buckets for all quantiles"""
+        counts, count, _, max_ns = snapshot or self.snapshot()
+        if not count:
+            return {q: 0 for q in quantiles}
+        result = {}
+        pending = sorted(quantiles)
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            while pending and seen >= max(1, pending[0] * count):
+                result[pending.pop(0)] = min(_bucket_value(index), max_ns)
+            if not pending:
+                break
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def histogram(self, phase):
+        histogram = self._histograms.get(phase)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(phase, LatencyHistogram())
+        return histogram
+
+    def phases(self):
+        return sorted(self._histograms)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def summary(self):
+        """{phase: {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}} for JSON reports"""
+        report = {}
+        for phase in self.phases():
+            histogram = self._histograms[phase]
+            snapshot = histogram.snapshot()
+            _, count, total_ns, max_ns = snapshot
+            quantiles = histogram.quantiles_ns(snapshot=snapshot)
+            report[phase] = {
+                'count': count,
+                'mean_ms': round(total_ns / count / 1e6, 3) if count else 0,
+                **{f"p{int(q * 100)}_ms": round(quantiles[q] / 1e6, 3) for q in QUANTILES},
+                'max_ms': round(max_ns / 1e6, 3)
+            }
+        return report
+
+    def render_prometheus(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Latency of each voting and consensus phase",
+            f"# TYPE {METRIC_NAME} summary"
+        ]
+        for phase in self.phases():
+            histogram = self._histograms[phase]
+            snapshot = histogram.snapshot()
+            _, count, total_ns, _ = snapshot
+            quantiles = histogram.quantiles_ns(snapshot=snapshot)
+            for q in QUANTILES:
+                lines.append(f'{METRIC_NAME}{{phase="{phase}",quantile="{q}"}} {quantiles[q] / 1e9:.9f}')
+            lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {total_ns / 1e9:.9f}')
+            lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {count}')
+        lines.append("# HELP metrics_enabled Whether phase timers are recording (METRICS_ENABLED)")
+        lines.append("# TYPE metrics_enabled gauge")
+        lines.append(f"metrics_enabled {int(METRICS_ENABLED)}")
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.record_ns(time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+registry = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def timer(phase):
+    """Context manager timing one phase; a shared no-op when metrics are disabled"""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(registry.histogram(phase))
+
+
+def observe(phase, seconds):
+    """Record a duration measured elsewhere"""
+    if METRICS_ENABLED:
+        registry.histogram(phase).record_ns(seconds * 1e9)
+
+
+def render_prometheus():
+    return registry.render_prometheus()
@@ -0,0 +1,81 @@
+"""
+Convert users.face_encoding from arrays of doubles to packed float32 Binary
+
+Idempotent and safe to run while the app is serving: only documents whose
+encoding is still an array are touched, and each update re-checks that.
+
+Usage: python -m app.migrate_face_encodings [--mongo-uri URI] [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import time
+
+from pymongo import MongoClient, UpdateOne
+
+from app.database import MONGO_DB, MONGO_URI
+from app.face_codec import encode_face_encoding
+
+LEGACY_QUERY = {'face_encoding': {'$type': 'array'}}
+
+
+def migrate(users_collection, batch_size=1000, dry_run=False):
+    """Rewrite legacy encodings in bulk; returns (converted, skipped)"""
+    converted = 0
+    skipped = 0
+    last_id = None
+
+    while True:
+        query = dict(LEGACY_QUERY)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        batch = list(
+            users_collection.find(query, {'face_encoding': 1}).sort('_id', 1).limit(batch_size)
+        )
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+
+        operations = []
+        for user in batch:
+            try:
+                packed = encode_face_encoding(user['face_encoding'])
+            except (TypeError, ValueError) as e:
+                print(f"⚠  Skipping user {user['_id']}: {str(e)}")
+                skipped += 1
+                continue
+            operations.append(UpdateOne(
+                {'_id': user['_id'], **LEGACY_QUERY},
+                {'$set': {'face_encoding': packed}}
+            ))
+
+        if operations and not dry_run:
+            result = users_collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        else:
+            converted += len(operations)
+        print(f"   ... {converted} converted")
+
+    return converted, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--database', default=MONGO_DB)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help='Count documents without writing')
+    args = parser.parse_args()
+
+    users = MongoClient(args.mongo_uri)[args.database].users
+    pending = users.count_documents(LEGACY_QUERY)
+    print(f"🔄 {pending} face encodings stored as arrays{' (dry run)' if args.dry_run else ''}")
+
+    start = time.perf_counter()
+    converted, skipped = migrate(users, args.batch_size, args.dry_run)
+    elapsed = time.perf_counter() - start
+
+    verb = 'would convert' if args.dry_run else 'converted'
+    print(f"✅ {verb} {converted} encodings in {elapsed:.1f}s ({skipped} skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import os
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+from app.event_log import get_logger
+
+log = get_logger('peer_monitor')
+
+# Host:port of each peer's gRPC endpoint in the Fabric test-network
+DEFAULT_PEER_ENDPOINTS = {
+    'peer0.org1.example.com': 'localhost:7051',
+    'peer0.org2.example.com': 'localhost:9051',
+}
+# Peers with no configured endpoint are probed at <validator id>:<this port>,
+# the peer's own address on the Fabric network
+DEFAULT_PEER_PORT = 7051
+
+
+def parse_peer_endpoints(spec: str) -> Dict[str, str]:
+    """PEER_ENDPOINTS, e.g. "peer0.org3.example.com=10.0.0.5:11051,peer1.org1.example.com=..." """
+    endpoints = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        validator_id, _, endpoint = item.partition('=')
+        if not endpoint.strip():
+            print(f"⚠  Ignoring bad PEER_ENDPOINTS entry: {item}")
+            continue
+        endpoints[validator_id.strip()] = endpoint.strip()
+    return endpoints
+
+
+class DockerProbe:
+    """Peer is alive if its container shows up in `docker ps`"""
+
+    name = 'docker'
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def __call__(self, validator_id: str, endpoint: str) -> bool:
+        peer_name, org_name = validator_id.split('.')[:2]
+        result = subprocess.run(
+            ['docker', 'ps', '--filter', f'name={peer_name}.{org_name}', '--format', '{{.Names}}'],
+            capture_output=True, text=True, timeout=self.timeout
+        )
+        return peer_name in result.stdout
+
+
+class TcpProbe:
+    """Peer is alive if its gRPC port accepts a TCP connection"""
+
+    name = 'tcp'
+
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+
+    def __call__(self, validator_id: str, endpoint: str) -> bool:
+        host, port = endpoint.rsplit(':', 1)
+        with socket.create_connection((host, int(port)), timeout=self.timeout):
+            return True
+
+
+class GrpcHealthProbe:
+    """Peer is alive if the standard gRPC health service reports SERVING"""
+
+    name = 'grpc'
+
+    def __init__(self, timeout=1.0, root_certificates=None):
+        import grpc
+        from grpc_health.v1 import health_pb2, health_pb2_grpc
+        self._grpc = grpc
+        self._health_pb2 = health_pb2
+        self._stub_cls = health_pb2_grpc.HealthStub
+        self.timeout = timeout
+        self.root_certificates = root_certificates
+
+    def __call__(self, validator_id: str, endpoint: str) -> bool:
+        if self.root_certificates:
+            credentials = self._grpc.ssl_channel_credentials(self.root_certificates)
+            channel = self._grpc.secure_channel(
+                endpoint, credentials,
+                options=[('grpc.ssl_target_name_override', validator_id)]
+            )
+        else:
+            channel = self._grpc.insecure_channel(endpoint)
+        with channel:
+            response = self._stub_cls(channel).Check(
+                self._health_pb2.HealthCheckRequest(), timeout=self.timeout
+            )
+            return response.status == self._health_pb2.HealthCheckResponse.SERVING
+
+
+PROBES = {
+    'docker': DockerProbe,
+    'tcp': TcpProbe,
+    'grpc': GrpcHealthProbe,
+}
+
+
+class PeerLivenessMonitor:
+    """
+    Background liveness table for the Fabric peers.
+
+    A daemon thread probes every known peer concurrently each interval seconds
+    and records (alive, checked_at). Readers on the request path only look up
+    this table; an entry older than ttl counts as unavailable. Peers seen for
+    the first time are probed synchronously once so the first vote does not
+    fail just because the monitor has not run yet. Peers that leave the
+    validator set are dropped from the table.
+
+    Endpoints come from PEER_ENDPOINTS (over the test-network defaults);
+    any other peer is probed at <validator id>:7051.
+    """
+
+    def __init__(self, probe=None, interval=None, ttl=None,
+                 endpoints: Dict[str, str] = None, max_workers=16):
+        self.probe = probe or PROBES[os.environ.get('PEER_PROBE', 'docker')]()
+        self.interval = interval or float(os.environ.get('PEER_PROBE_INTERVAL', 2.0))
+        self.ttl = ttl or float(os.environ.get('PEER_LIVENESS_TTL', 10.0))
+        self.endpoints = dict(endpoints or {
+            **DEFAULT_PEER_ENDPOINTS, **parse_peer_endpoints(os.environ.get('PEER_ENDPOINTS', ''))
+        })
+        self._table = {}
+        self._tracked = frozenset()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='peer-probe')
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner_pid = None
+
+    def start(self):
+        """Start the probe loop (once per process, also after fork)"""
+        with self._lock:
+            if self._thread is not None and self._owner_pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._owner_pid not in (None, os.getpid()):
+                # Worker threads do not survive a fork
+                self._executor = ThreadPoolExecutor(max_workers=self._executor._max_workers,
+                                                    thread_name_prefix='peer-probe')
+            self._owner_pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='peer-liveness', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def available_peers(self, validator_ids: Iterable[str]) -> List[str]:
+        """Validators whose last probe succeeded within ttl"""
+        validator_ids = list(validator_ids)
+        self.start()
+
+        with self._lock:
+            self._track(validator_ids)
+            unknown = [v for v in validator_ids if v not in self._table]
+        if unknown:
+            self.probe_all(unknown)
+
+        now = time.monotonic()
+        with self._lock:
+            return [
+                v for v in validator_ids
+                if v in self._table and self._table[v][0] and now - self._table[v][1] <= self.ttl
+            ]
+
+    def _track(self, validator_ids: List[str]):
+        # Caller holds the lock; only does work when the validator set changed
+        current = frozenset(validator_ids)
+        if current != self._tracked:
+            for validator_id in set(self._table) - current:
+                del self._table[validator_id]
+            self._tracked = current
+
+    def is_tracking(self, validator_ids: Iterable[str]) -> bool:
+        """True if every given peer has been probed at least once"""
+        with self._lock:
+            return all(v in self._table for v in validator_ids)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Copy of the liveness table for diagnostics"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                v: {'alive': alive, 'age_seconds': round(now - checked_at, 3)}
+                for v, (alive, checked_at) in self._table.items()
+            }
+
+    def probe_all(self, validator_ids: Iterable[str] = None):
+        """Probe the given (default: all known) peers concurrently and update the table"""
+        with self._lock:
+            targets = list(validator_ids) if validator_ids is not None else list(self._table)
+        futures = {v: self._executor.submit(self._probe_one, v) for v in targets}
+        for validator_id, future in futures.items():
+            alive = future.result()
+            with self._lock:
+                # Skip peers that left the set while the probe was running
+                if not self._tracked or validator_id in self._tracked:
+                    self._table[validator_id] = (alive, time.monotonic())
+
+    def _probe_one(self, validator_id: str) -> bool:
+        endpoint = self.endpoints.get(validator_id) or f"{validator_id}:{DEFAULT_PEER_PORT}"
+        try:
+            return bool(self.probe(validator_id, endpoint))
+        except Exception as e:
+            log.warning('probe_error', peer=validator_id, error=str(e))
+            return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.probe_all()
+            except Exception as e:
+                log.error('probe_loop_error', error=str(e))
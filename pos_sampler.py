@@ -0,0 +1,171 @@
+import random
+import threading
+from typing import Dict, List, Optional
+
+STAKE_FACTOR = 0.7
+REPUTATION_FACTOR = 0.3
+
+
+class FenwickTree:
+    """Binary indexed tree over floats: point update and prefix sum in O(log n)"""
+
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [0.0] + [float(v) for v in values]
+        # O(n) construction: push every node's sum into its parent
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: float):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count: int) -> float:
+        """Sum of the first count values"""
+        total = 0.0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class StakeWeightedSampler:
+    """
+    Stake/reputation weighted validator sampling in O(k log n).
+
+    Each validator's weight is 0.7 * stake / total_stake + 0.3 * reputation / 100,
+    the same weighting pos_select_validators has always used. Stake and
+    reputation sit in two Fenwick trees so a draw is one O(log n) descent,
+    drawing without replacement zeroes the chosen validators for the rest of
+    the call (under the sampler's lock, restored before it is released), and
+    update()/refresh() change single validators without rebuilding.
+
+    Pass a seeded random.Random to make a selection reproducible.
+    """
+
+    def __init__(self, validators: Dict[str, dict]):
+        self.ids = list(validators.keys())
+        self._position = {validator_id: i for i, validator_id in enumerate(self.ids)}
+        self._stakes = [float(validators[v]['stake']) for v in self.ids]
+        self._reputations = [float(validators[v]['reputation']) for v in self.ids]
+        self.total_stake = sum(self._stakes)
+        self._stake_tree = FenwickTree(self._stakes)
+        self._reputation_tree = FenwickTree(self._reputations)
+        self._top_step = 1 << (len(self.ids).bit_length() - 1) if self.ids else 0
+        # sample() and update() both modify the trees; request threads share one sampler
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def weight(self, validator_id: str) -> float:
+        i = self._position[validator_id]
+        return self._combine(self._stakes[i], self._reputations[i])
+
+    def update(self, validator_id: str, stake: float = None, reputation: float = None):
+        """Change one validator's stake and/or reputation in O(log n)"""
+        with self._lock:
+            self._update(self._position[validator_id], stake, reputation)
+
+    def _update(self, i: int, stake: float = None, reputation: float = None):
+        if stake is not None:
+            delta = float(stake) - self._stakes[i]
+            self._stakes[i] = float(stake)
+            self._stake_tree.add(i, delta)
+            self.total_stake += delta
+        if reputation is not None:
+            delta = float(reputation) - self._reputations[i]
+            self._reputations[i] = float(reputation)
+            self._reputation_tree.add(i, delta)
+
+    def refresh(self, validators: Dict[str, dict]) -> bool:
+        """
+        Apply a newer snapshot of the same validator set, calling update() only
+        for the validators whose stake or reputation changed. Returns False
+        (nothing applied) when validators joined or left; rebuild then.
+        """
+        if len(validators) != len(self.ids) or any(v not in self._position for v in validators):
+            return False
+        for validator_id, info in validators.items():
+            i = self._position[validator_id]
+            stake, reputation = float(info['stake']), float(info['reputation'])
+            if stake != self._stakes[i] or reputation != self._reputations[i]:
+                self.update(validator_id, stake, reputation)
+        return True
+
+    def sample(self, k: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Draw up to k distinct validators, each draw proportional to weight"""
+        rng = rng or random
+        selected = []
+        removed = []
+
+        # The chosen validators are zeroed in the trees for the rest of the
+        # call and restored before the lock is released, so other threads
+        # never see them removed
+        with self._lock:
+            try:
+                stake_total = self._stake_tree.prefix_sum(len(self.ids))
+                reputation_total = self._reputation_tree.prefix_sum(len(self.ids))
+                for _ in range(min(k, len(self.ids))):
+                    total = self._combine(stake_total, reputation_total)
+                    if total <= 0:
+                        break
+                    i = self._find(rng.random() * total)
+                    stake, reputation = self._stakes[i], self._reputations[i]
+                    selected.append(self.ids[i])
+                    removed.append((i, stake, reputation))
+                    self._set_weights(i, 0.0, 0.0)
+                    stake_total -= stake
+                    reputation_total -= reputation
+            finally:
+                for i, stake, reputation in removed:
+                    self._set_weights(i, stake, reputation)
+
+        return selected
+
+    def _set_weights(self, i: int, stake: float, reputation: float):
+        # Tree and array only: total_stake, the stake normaliser, stays as is
+        self._stake_tree.add(i, stake - self._stakes[i])
+        self._reputation_tree.add(i, reputation - self._reputations[i])
+        self._stakes[i] = stake
+        self._reputations[i] = reputation
+
+    def _combine(self, stake: float, reputation: float) -> float:
+        stake_weight = stake / self.total_stake if self.total_stake else 0.0
+        return (stake_weight * STAKE_FACTOR) + (reputation / 100 * REPUTATION_FACTOR)
+
+    def _find(self, target: float) -> int:
+        """Index of the validator whose cumulative weight range contains target"""
+        position = 0
+        step = self._top_step
+        stake_tree = self._stake_tree.tree
+        reputation_tree = self._reputation_tree.tree
+
+        while step:
+            nxt = position + step
+            if nxt <= len(self.ids):
+                node_weight = self._combine(stake_tree[nxt], reputation_tree[nxt])
+                if node_weight <= target:
+                    position = nxt
+                    target -= node_weight
+            step >>= 1
+
+        # Float rounding can land past the end or on a zeroed entry; step back
+        # to the nearest validator with weight (forward if there is none)
+        position = min(position, len(self.ids) - 1)
+        i = position
+        while i >= 0 and self.weight_at(i) <= 0:
+            i -= 1
+        if i < 0:
+            i = position
+            while self.weight_at(i) <= 0:
+                i += 1
+        return i
+
+    def weight_at(self, i: int) -> float:
+        return self._combine(self._stakes[i], self._reputations[i])
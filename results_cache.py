@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app.event_log import get_logger
+
+log = get_logger('results_cache')
+
+
+class _Flight:
+    """One in-progress fetch that concurrent misses wait on"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultsCache:
+    """
+    Shared cache for /results.
+
+    Entries live for ttl seconds (RESULTS_CACHE_TTL), which is the bound on
+    how stale counts can be. Concurrent misses are coalesced into a single
+    fetch (one getResults query however many clients are polling), and each
+    entry carries an ETag so unchanged results can be answered with 304.
+
+    invalidate() is called when votes are committed to the ledger and when
+    results are declared/undeclared. A fetch that was already running when
+    invalidate() was called still answers its waiters but is not cached, and
+    requests arriving afterwards start a new fetch.
+    """
+
+    def __init__(self, fetch, ttl: float = None):
+        self.fetch = fetch
+        self.ttl = ttl if ttl is not None else float(os.environ.get('RESULTS_CACHE_TTL', 2))
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._flight = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'fetches': 0,
+            'fetch_errors': 0,
+            'invalidations': 0,
+        }
+
+    def get(self):
+        """(results, etag), fetching at most once for all concurrent callers"""
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                self._stats['hits'] += 1
+                return self._value
+            self._stats['misses'] += 1
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight(self._generation)
+                self._stats['fetches'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if leader:
+            self._run_flight(flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run_flight(self, flight):
+        try:
+            results = self.fetch()
+            flight.value = (results, self.make_etag(results))
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flight is flight:
+                    self._flight = None
+                if flight.error is not None:
+                    self._stats['fetch_errors'] += 1
+                elif flight.generation == self._generation:
+                    self._value = flight.value
+                    self._expires_at = time.monotonic() + self.ttl
+            flight.done.set()
+
+    def invalidate(self, reason: str = None):
+        """Drop the cached results; the next request fetches fresh counts"""
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._expires_at = 0.0
+            self._flight = None
+            self._stats['invalidations'] += 1
+        if reason:
+            log.debug('invalidated', reason=reason)
+
+    @staticmethod
+    def make_etag(results) -> str:
+        body = json.dumps(results, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else None,
+                'ttl_seconds': self.ttl,
+            }
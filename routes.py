@@ -1,13 +1,22 @@
-from flask import render_template, request, jsonify, session, redirect, url_for
+from flask import Response, render_template, request, jsonify, session, redirect, url_for
 from app.blockchain import BlockchainClient
 from app.security import SecurityHelper
 from app.consensus import HybridConsensus
-from pymongo import MongoClient
-import face_recognition
-import numpy as np
-import base64
-import io
-from PIL import Image
+from app.face_index import create_face_index
+from app.face_pipeline import FaceEncodingEngine, EngineBusy
+from app.face_rec import FaceRecognition
+from app.face_codec import encode_face_encoding, decode_face_encoding, decode_face_encodings
+from app.vote_pipeline import VoteSubmissionPipeline
+from app.tally import VoteTally
+from app.results_cache import ResultsCache
+from app.db_indexes import ensure_indexes
+from app.database import collection, get_db, pool_stats
+from app.elgamal import ELECTION_CANDIDATES, election_public_key
+from app.ledger_reconcile import VoteDigestTree
+from app.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus, timer
+from app.event_log import get_logger
+from pymongo.errors import DuplicateKeyError
+import os
 import uuid
 from datetime import datetime
 import json
@@ -15,18 +24,58 @@ import json
 # Get app from _init_
 from app import app
 
-# MongoDB setup
-client = MongoClient('mongodb://localhost:27017/')
-db = client['voting_system']
-users = db.users
-votes = db.votes
-system_config = db.system_config  # New collection for system settings
+log = get_logger('routes')
+
+# MongoDB setup (one shared, fork-safe client per process; see database.py)
+users = collection('users')
+votes = collection('votes')
+system_config = collection('system_config')  # New collection for system settings
+vote_outbox = collection('vote_outbox')  # Votes waiting to be written to the ledger
+vote_tally_collection = collection('vote_tally')  # Per-candidate vote counters
+vote_digests_collection = collection('vote_digests')  # Range digests for ledger reconciliation
+
+# Indexes every request path relies on (idempotent, see db_indexes)
+try:
+    ensure_indexes(get_db())
+except Exception as e:
+    print(f"⚠  Could not ensure MongoDB indexes: {str(e)}")
+
+# The election key is only loaded here; it is provisioned offline with
+# python -m app.elgamal keygen, and /vote fails until it exists
+try:
+    election_public_key(system_config)
+except Exception as e:
+    print(f"⚠  Election key not loaded: {str(e)}")
 
 # Blockchain client
 blockchain_client = BlockchainClient()
 
+# Write-behind queue from /vote to the ledger
+vote_pipeline = VoteSubmissionPipeline(vote_outbox, blockchain_client)
+
+# Materialized results, reconciled against the votes and the ledger
+vote_tally = VoteTally(vote_tally_collection, votes, blockchain_client)
+
+# voter_id range digests, compared with the ledger's by ledger_reconcile
+vote_digests = VoteDigestTree(vote_digests_collection)
+
+# Shared /results cache, refreshed when votes commit or results are (un)declared
+results_cache = ResultsCache(blockchain_client.get_results)
+vote_pipeline.add_commit_listener(
+    lambda committed: results_cache.invalidate(f"{committed} votes committed")
+)
+
 # Hybrid Consensus
-hybrid_consensus = HybridConsensus()
+hybrid_consensus = HybridConsensus(blockchain_client)
+
+# Face encoding index (FACE_INDEX_BACKEND=exact|ivf|stream), kept in sync with users
+face_index = create_face_index()
+
+# Process pool for face detection/encoding (FACE_WORKERS, FACE_DETECTOR_MODEL, ...)
+face_engine = FaceEncodingEngine()
+
+# Largest batch accepted by /login_batch
+LOGIN_BATCH_MAX = int(os.environ.get('LOGIN_BATCH_MAX', 32))
 
 @app.route('/')
 def index():
@@ -42,28 +91,17 @@ def register():
         if not face_image:
             return jsonify({'error': 'No face image provided'}), 400
         
-        # Remove data URL prefix
-        face_data = face_image.split(',')[1] if ',' in face_image else face_image
-        face_bytes = base64.b64decode(face_data)
-        face_img = Image.open(io.BytesIO(face_bytes))
-        face_array = np.array(face_img)
-        
-        # Get face encoding
-        face_locations = face_recognition.face_locations(face_array)
-        if not face_locations:
-            return jsonify({'error': 'No face detected'}), 400
-        
-        face_encodings = face_recognition.face_encodings(face_array, face_locations)
-        if not face_encodings:
-            return jsonify({'error': 'Could not encode face'}), 400
-        
-        new_face_encoding = face_encodings[0].tolist()
+        # Get face encoding (in the face-processing pool)
+        new_face_encoding, face_error = face_engine.encode(face_image)
+        if face_error:
+            return jsonify({'error': face_error}), 400
         
         # Check for duplicate face (Ghost voting prevention)
-        all_users = list(users.find())
+        if face_index is not None:
+            face_index.sync(users)
         is_duplicate, matched_voter_id = SecurityHelper.check_duplicate_face(
             new_face_encoding, 
-            all_users
+            face_index if face_index is not None else users
         )
         
         if is_duplicate:
@@ -71,11 +109,13 @@ def register():
                 'error': f'This face is already registered! Voter ID: {matched_voter_id}. Ghost voting prevented!'
             }), 409
         
-        # Encrypt personal data
-        encrypted_name = SecurityHelper.encrypt_data(data['name'])
-        encrypted_email = SecurityHelper.encrypt_data(data['email'])
-        encrypted_phone = SecurityHelper.encrypt_data(data['phone'])
-        encrypted_address = SecurityHelper.encrypt_data(data['address'])
+        # Encrypt personal data (all fields in one AES-GCM pass)
+        encrypted = SecurityHelper.encrypt_record({
+            'name': data['name'],
+            'email': data['email'],
+            'phone': data['phone'],
+            'address': data['address']
+        })
         
         # Generate voter ID
         voter_id = str(uuid.uuid4())[:8]
@@ -83,26 +123,39 @@ def register():
         # Create user data with encrypted fields
         user_data = {
             'voter_id': voter_id,
-            'name': encrypted_name,
-            'email': encrypted_email,
-            'phone': encrypted_phone,
-            'address': encrypted_address,
-            'face_encoding': new_face_encoding,
+            'name': encrypted['name'],
+            'email': encrypted['email'],
+            'phone': encrypted['phone'],
+            'address': encrypted['address'],
+            'face_encoding': encode_face_encoding(new_face_encoding),  # packed float32
             'has_voted': False,
             'created_at': datetime.now()
         }
         
-        # Save to MongoDB
-        users.insert_one(user_data)
-        
-        print(f"✅ New voter registered with encrypted data: {voter_id}")
+        # Save to MongoDB (voter_id is unique: draw a new one on a collision)
+        for attempt in range(3):
+            try:
+                users.insert_one(user_data)
+                break
+            except DuplicateKeyError:
+                if attempt == 2:
+                    raise
+                user_data.pop('_id', None)
+                voter_id = str(uuid.uuid4())[:8]
+                user_data['voter_id'] = voter_id
+        if face_index is not None:
+            face_index.add(voter_id, new_face_encoding)
+        
+        log.info('voter_registered', voter_id=voter_id)
         
         return jsonify({
             'message': 'Registration successful! Personal data encrypted.',
             'voter_id': voter_id
         })
+    except EngineBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
-        print(f"Registration error: {str(e)}")
+        log.error('register_error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
 @app.route('/login_page')
@@ -129,37 +182,23 @@ def login():
         # if user.get('has_voted'):
         #     return jsonify({'error': 'You have already voted'}), 403
         
-        # Decode face image
+        # Encode the captured face in the face-processing pool
         try:
-            face_data = face_image.split(',')[1] if ',' in face_image else face_image
-            face_bytes = base64.b64decode(face_data)
-            face_img = Image.open(io.BytesIO(face_bytes))
-            face_array = np.array(face_img)
-            
-            # Get face encoding from captured image
-            face_locations = face_recognition.face_locations(face_array)
-            
-            if not face_locations:
-                return jsonify({'error': 'No face detected. Please try again.'}), 400
-            
-            face_encodings = face_recognition.face_encodings(face_array, face_locations)
-            
-            if not face_encodings:
-                return jsonify({'error': 'Could not encode face. Please try again.'}), 400
-            
-            live_encoding = face_encodings[0]
+            live_encoding, face_error = face_engine.encode(face_image)
+            if face_error:
+                return jsonify({'error': face_error}), 400
             
             # Get stored face encoding
-            stored_encoding = np.array(user.get('face_encoding'))
+            stored_encoding = decode_face_encoding(user.get('face_encoding'))
             
             # Compare faces
-            matches = face_recognition.compare_faces([stored_encoding], live_encoding, tolerance=0.6)
+            matches, _ = FaceRecognition.verify_faces_batch([stored_encoding], [live_encoding])
             
             if not matches[0]:
                 return jsonify({'error': 'Face verification failed. Please try again.'}), 401
             
             # Decrypt name for display
-            decrypted_name = SecurityHelper.decrypt_data(user.get('name'))
+            decrypted_name = SecurityHelper.decrypt_data(user.get('name'), 'name')
             
             # Face verified! Create session
             session['user'] = voter_id
@@ -167,7 +206,7 @@ def login():
             session['name'] = decrypted_name
             session['token'] = voter_id
             
-            print(f"✅ Login successful: {voter_id} (Already voted: {user.get('has_voted', False)})")
+            log.info('login', voter_id=voter_id, has_voted=user.get('has_voted', False))
             
             return jsonify({
                 'success': True,
@@ -176,12 +215,95 @@ def login():
                 'has_voted': user.get('has_voted', False)  # Send voting status
             }), 200
             
+        except EngineBusy as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
         except Exception as e:
-            print(f"Face verification error: {str(e)}")
+            log.error('face_verification_error', error=str(e))
             return jsonify({'error': f'Face verification error: {str(e)}'}), 500
             
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        log.error('login_error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+# NEW ROUTE: Batch face verification for polling-station kiosks
+@app.route('/login_batch', methods=['POST'])
+def login_batch():
+    """
+    Verify many voters at once: {"voters": [{"voter_id", "face_image"}, ...]}.
+    Uses the same face match as /login but creates no session; each voter
+    gets a status of verified, face_mismatch, not_found, no_face, busy or error.
+    """
+    try:
+        entries = (request.json or {}).get('voters') or []
+        if not entries:
+            return jsonify({'error': 'No voters provided'}), 400
+        if len(entries) > LOGIN_BATCH_MAX:
+            return jsonify({'error': f'At most {LOGIN_BATCH_MAX} voters per batch'}), 413
+        
+        results = [{'voter_id': entry.get('voter_id')} for entry in entries]
+        
+        # Queue every face first so the pool works while we hit MongoDB
+        futures = []
+        for entry, result in zip(entries, results):
+            if not entry.get('voter_id') or not entry.get('face_image'):
+                result.update(status='error', error='Missing voter ID or face image')
+                futures.append(None)
+                continue
+            try:
+                futures.append(face_engine.submit(entry['face_image']))
+            except EngineBusy as e:
+                result.update(status='busy', error=str(e))
+                futures.append(None)
+        
+        # One query for all stored encodings
+        voter_ids = [result['voter_id'] for result in results if 'status' not in result]
+        stored_users = {
+            user['voter_id']: user
+            for user in users.find(
+                {'voter_id': {'$in': voter_ids}},
+                {'_id': 0, 'voter_id': 1, 'face_encoding': 1, 'name': 1, 'has_voted': 1}
+            )
+        }
+        
+        pairs = []
+        for future, result in zip(futures, results):
+            if future is None:
+                continue
+            try:
+                encoded = future.result()
+            except Exception as e:
+                result.update(status='error', error=f'Face verification error: {str(e)}')
+                continue
+            user = stored_users.get(result['voter_id'])
+            if not user:
+                result.update(status='not_found', error='Voter not found')
+            elif encoded['error']:
+                result.update(status='no_face', error=encoded['error'])
+            else:
+                pairs.append((result, user, encoded['encoding']))
+        
+        # All distances in one vectorized call
+        matches, distances = FaceRecognition.verify_faces_batch(
+            decode_face_encodings(user['face_encoding'] for _, user, _ in pairs),
+            [encoding for _, _, encoding in pairs]
+        )
+        for (result, user, _), matched, distance in zip(pairs, matches, distances):
+            result['distance'] = round(distance, 4)
+            if matched:
+                result.update(
+                    status='verified',
+                    name=SecurityHelper.decrypt_data(user.get('name'), 'name'),
+                    has_voted=user.get('has_voted', False)
+                )
+            else:
+                result.update(status='face_mismatch', error='Face verification failed. Please try again.')
+        
+        verified = sum(result['status'] == 'verified' for result in results)
+        log.info('batch_login', verified=verified, total=len(results))
+        
+        return jsonify({'results': results, 'verified': verified, 'total': len(results)})
+    except Exception as e:
+        log.error('batch_login_error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
 # NEW ROUTE: Voter Dashboard
@@ -214,13 +336,16 @@ def vote():
         candidate = data.get('candidate')
         if not candidate:
             return jsonify({'error': 'No candidate selected'}), 400
+        if candidate not in ELECTION_CANDIDATES:
+            return jsonify({'error': 'Unknown candidate'}), 400
         
         # Check if already voted
-        if votes.find_one({'voter_id': voter_id}):
+        with timer('db_check'):
+            already_voted = votes.find_one({'voter_id': voter_id})
+        if already_voted:
             return jsonify({'error': 'You have already voted'}), 403
         
         # HYBRID CONSENSUS VALIDATION (PoS + PBFT + Raft)
-        print(f"\n🔄 Starting Hybrid Consensus for voter: {voter_id}")
         consensus_result = hybrid_consensus.hybrid_consensus_validate({
             'voter_id': voter_id,
             'candidate': candidate
@@ -228,20 +353,15 @@ def vote():
         
         # Check if consensus approved
         if consensus_result['final_status'] != 'APPROVED':
-            print(f"❌ Consensus rejected vote from {voter_id}")
+            log.warning('vote_rejected', voter_id=voter_id, status=consensus_result['final_status'])
             return jsonify({
                 'error': 'Vote rejected by consensus mechanism',
                 'details': consensus_result
             }), 403
         
-        print(f"✅ Hybrid Consensus approved vote: {voter_id}")
-        
         # ElGamal Encryption + Zero-Knowledge Proof
-        encrypted_vote = SecurityHelper.elgamal_encrypt_vote(candidate)
-        zkp = SecurityHelper.generate_zkp(voter_id, candidate)
-        
-        print(f"🔐 Vote encrypted with ElGamal: {voter_id}")
-        print(f"🔐 ZKP generated: {zkp['commitment'][:16]}...")
+        with timer('encryption'):
+            encrypted_vote, zkp = SecurityHelper.encrypt_vote_with_proof(voter_id, candidate)
         
         # Store vote in MongoDB with encryption AND consensus proof
         vote_data = {
@@ -254,34 +374,59 @@ def vote():
             'timestamp': datetime.now()
         }
         
-        votes.insert_one(vote_data)
-        
-        # Submit to blockchain (Raft ordering)
-        try:
-            blockchain_result = blockchain_client.submit_vote(voter_id, candidate)
-            print(f"🔗 Blockchain (Raft) result: {blockchain_result}")
-        except Exception as e:
-            print(f"⚠  Blockchain submission failed: {e}")
+        # Builds the tally from existing votes the first time, so it must run before the insert
+        vote_tally.start()
+
+        with timer('db_write'):
+            try:
+                votes.insert_one(vote_data)
+            except DuplicateKeyError:
+                # Unique votes.voter_id: a concurrent request already stored this voter's vote
+                return jsonify({'error': 'You have already voted'}), 403
+            vote_tally.record(candidate)
+            try:
+                vote_digests.record(voter_id, candidate)
+            except Exception as e:
+                # Digest drift only costs the reconciler a wider scan; rebuild with --rebuild-digests
+                log.warning('vote_digest_error', error=str(e))
+        
+        # Queue for the blockchain (Raft ordering); submitted in batches
+        with timer('ledger_enqueue'):
+            ledger_status = vote_pipeline.enqueue(vote_data['vote_id'], voter_id, candidate)
         
         # Mark user as voted
-        users.update_one(
-            {'voter_id': voter_id},
-            {'$set': {'has_voted': True}}
-        )
+        with timer('user_update'):
+            users.update_one(
+                {'voter_id': voter_id},
+                {'$set': {'has_voted': True}}
+            )
         
         # Clear session
         session.pop('token', None)
         
-        print(f"✅ Vote cast successfully with Hybrid Consensus + Encryption + ZKP: {voter_id}")
+        log.info('vote_cast', voter_id=voter_id, vote_id=vote_data['vote_id'], ledger_status=ledger_status['status'])
         
         return jsonify({
             'message': 'Vote cast successfully with Hybrid Consensus!', 
             'success': True,
             'consensus_type': consensus_result['consensus_type'],
-            'validators_used': len(consensus_result['pos_validators'])
+            'validators_used': len(consensus_result['pos_validators']),
+            'vote_id': vote_data['vote_id'],
+            'ledger_status': ledger_status['status']
         })
     except Exception as e:
-        print(f"❌ Vote error: {str(e)}")
+        log.error('vote_error', error=str(e))
+        return jsonify({'error': str(e)}), 500
+
+# NEW ROUTE: Ledger status of a cast vote (polled by the voter dashboard)
+@app.route('/vote_status/<vote_id>')
+def vote_status(vote_id):
+    try:
+        status = vote_pipeline.get_status(vote_id)
+        if not status:
+            return jsonify({'error': 'Vote not found'}), 404
+        return jsonify(status)
+    except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/voting_page')
@@ -293,9 +438,21 @@ def voting_page():
 @app.route('/results')
 def get_results():
     try:
-        bc = BlockchainClient()
-        results = bc.get_results()
-        return jsonify(results)
+        results, etag = results_cache.get()
+        response = jsonify(results)
+        response.set_etag(etag)
+        # Clients must revalidate; unchanged results cost a 304 and no ledger query
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# NEW ROUTE: Last tally reconciliation (counters vs votes vs ledger)
+@app.route('/tally_report')
+def tally_report():
+    try:
+        report = vote_tally.last_report() or vote_tally.reconcile()
+        return jsonify(report)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -336,14 +493,15 @@ def declare_results():
             upsert=True
         )
         
-        print("✅ Results declared by Election Commission")
+        results_cache.invalidate('results declared')
+        log.info('results_declared')
         
         return jsonify({
             'success': True,
             'message': 'Results declared successfully'
         })
     except Exception as e:
-        print(f"❌ Error declaring results: {str(e)}")
+        log.error('declare_results_error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
 # NEW ROUTE: Undeclare Results (For testing/admin)
@@ -361,14 +519,15 @@ def undeclare_results():
             upsert=True
         )
         
-        print("✅ Results undeclared")
+        results_cache.invalidate('results undeclared')
+        log.info('results_undeclared')
         
         return jsonify({
             'success': True,
             'message': 'Results undeclared successfully'
         })
     except Exception as e:
-        print(f"❌ Error undeclaring results: {str(e)}")
+        log.error('undeclare_results_error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
 @app.route('/consensus-stats')
@@ -380,6 +539,19 @@ def consensus_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/db-stats')
+def db_stats():
+    """API endpoint to view MongoDB connection pool usage for this worker"""
+    try:
+        return jsonify(pool_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics():
+    """Per-phase latency histograms (p50/p95/p99) in Prometheus text format"""
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -1,11 +1,12 @@
-import face_recognition
-import numpy as np
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
 import base64
-import hashlib
-import random
+from app.ballot_proofs import prove_ballot
+from app.elgamal import election_public_key
+from app.face_index import FaceIndex
+from app.face_loader import chunk_user_documents, iter_encoding_chunks, scan_for_duplicate
+from app.field_crypto import FieldEncryptor, PII_FIELDS, TOKEN_PREFIX
 
 class SecurityHelper:
     """Security utilities for voting system"""
@@ -17,25 +18,26 @@ class SecurityHelper:
     def check_duplicate_face(new_face_encoding, all_users):
         """
         Check if face already exists in database
+        all_users may be a FaceIndex, the users collection (streamed in
+        projected chunks) or an iterable of user documents
         Returns: (is_duplicate, matched_voter_id)
         """
         try:
-            new_encoding = np.array(new_face_encoding)
+            if isinstance(all_users, FaceIndex):
+                return all_users.find_duplicate(new_face_encoding, tolerance=0.5)
             
-            for user in all_users:
-                stored_encoding = np.array(user.get('face_encoding'))
-                
-                # Compare faces with strict tolerance
-                matches = face_recognition.compare_faces(
-                    [stored_encoding], 
-                    new_encoding, 
-                    tolerance=0.5  # Strict matching
-                )
-                
-                if matches[0]:
-                    return True, user.get('voter_id')
+            # Compare chunk by chunk and stop at the first match, so memory
+            # stays at one chunk however many voters are registered
+            if hasattr(all_users, 'find'):
+                chunks = iter_encoding_chunks(all_users)
+            else:
+                chunks = chunk_user_documents(all_users)
             
-            return False, None
+            return scan_for_duplicate(
+                new_face_encoding,
+                chunks,
+                tolerance=0.5  # Strict matching
+            )
             
         except Exception as e:
             print(f"Face comparison error: {str(e)}")
@@ -60,9 +62,12 @@ class SecurityHelper:
             return None
     
     @staticmethod
-    def decrypt_data(encrypted_data):
-        """Decrypt personal data"""
+    def decrypt_data(encrypted_data, field=None):
+        """Decrypt personal data (field is required for v2 AES-GCM tokens)"""
         try:
+            if encrypted_data.startswith(TOKEN_PREFIX):
+                return _field_encryptor.decrypt_field(encrypted_data, field)
+            
             encrypted_bytes = base64.b64decode(encrypted_data)
             
             # Extract IV and encrypted data
@@ -79,57 +84,37 @@ class SecurityHelper:
             print(f"Decryption error: {str(e)}")
             return None
     
+    @staticmethod
+    def encrypt_record(record, fields=PII_FIELDS):
+        """Encrypt a record's personal fields in one pass (AES-GCM, per-record nonce)"""
+        return _field_encryptor.encrypt_record(record, fields)
+    
+    @staticmethod
+    def decrypt_records(records, fields=PII_FIELDS):
+        """Decrypt the personal fields of many records (exports); legacy CBC values included"""
+        stats = {}
+        decrypted = _field_encryptor.decrypt_records(records, fields, stats)
+        if stats['failed']:
+            print(f"⚠  {stats['failed']} fields could not be decrypted and were left empty")
+        return decrypted
+    
     @staticmethod
     def elgamal_encrypt_vote(candidate):
-        """ElGamal encryption for vote (simplified)"""
-        # In production, use proper ElGamal library
-        p = 467  # Prime number
-        g = 2    # Generator
-        
-        # Generate random key
-        private_key = random.randint(1, p-2)
-        public_key = pow(g, private_key, p)
-        
-        # Convert candidate to number
-        candidate_num = sum(ord(c) for c in candidate)
-        
-        # Encrypt
-        k = random.randint(1, p-2)
-        c1 = pow(g, k, p)
-        c2 = (candidate_num * pow(public_key, k, p)) % p
-        
-        encrypted = {
-            'c1': c1,
-            'c2': c2,
-            'candidate_hash': hashlib.sha256(candidate.encode()).hexdigest()
-        }
-        
-        return encrypted
+        """
+        Exponential-ElGamal ballot under the election key (see elgamal.py):
+        one ciphertext per candidate, so ballots can be tallied homomorphically
+        Raises ValueError for a candidate that is not on the ballot
+        """
+        return election_public_key().encrypt_ballot(candidate)
     
     @staticmethod
-    def generate_zkp(voter_id, candidate):
-        """Generate Zero-Knowledge Proof"""
-        # Simplified ZKP - proves vote is valid without revealing choice
-        
-        # Create commitment
-        commitment = hashlib.sha256(
-            f"{voter_id}{candidate}".encode()
-        ).hexdigest()
-        
-        # Create challenge
-        challenge = hashlib.sha256(
-            f"{commitment}{voter_id}".encode()
-        ).hexdigest()
-        
-        # Create response
-        response = hashlib.sha256(
-            f"{challenge}{candidate}".encode()
-        ).hexdigest()
-        
-        zkp = {
-            'commitment': commitment,
-            'challenge': challenge,
-            'response': response
-        }
-        
-        return zkp
+    def encrypt_vote_with_proof(voter_id, candidate):
+        """
+        Ballot plus its zero-knowledge validity proof (see ballot_proofs.py),
+        bound to voter_id; returns (encrypted_vote, zkp)
+        """
+        return prove_ballot(election_public_key(), candidate, voter_id)
+
+
+# Shared AES-GCM context for the bulk field APIs
+_field_encryptor = FieldEncryptor(SecurityHelper.ENCRYPTION_KEY, legacy_decrypt=SecurityHelper.decrypt_data)
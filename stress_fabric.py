@@ -0,0 +1,98 @@
+"""
+Concurrency stress check for BlockchainClient and HybridConsensus
+
+Installs a fake `peer` binary in a throwaway Fabric directory and hammers
+vote submission, validator queries and results reads from many threads.
+The fake peer fails if it is started from the wrong working directory or
+without the Fabric environment, and the run fails if the process cwd moves.
+
+Usage: python -m app.stress_fabric --threads 32 --iterations 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.blockchain import BlockchainClient
+from app.consensus import HybridConsensus
+from app.fabric_config import FabricConfig
+from app.validator_cache import ValidatorSetCache
+
+FAKE_PEER = '''#!{python}
+import json, os, sys
+expected = {fabric_path!r}
+if os.getcwd() != expected or os.environ.get('FABRIC_CFG_PATH') != expected + '/../config/':
+    sys.stderr.write('wrong cwd or env: ' + os.getcwd())
+    sys.exit(2)
+call = json.loads(sys.argv[sys.argv.index('-c') + 1])
+if call['function'] == 'getValidators':
+    print(json.dumps({{'peer0.org1.example.com': {{'stake': 1000, 'reputation': 100, 'votes_validated': 0, 'organization': 'Org1MSP'}}}}))
+elif call['function'] == 'getResults':
+    print(json.dumps({{'ADMK': 1, 'DMK': 2, 'NTK': 3}}))
+else:
+    sys.stderr.write('Chaincode invoke successful. result: status:200')
+'''
+
+
+def make_fake_network(root):
+    fabric_path = os.path.join(root, 'test-network')
+    bin_dir = os.path.join(root, 'bin')
+    os.makedirs(fabric_path)
+    os.makedirs(bin_dir)
+    peer = os.path.join(bin_dir, 'peer')
+    with open(peer, 'w') as f:
+        f.write(FAKE_PEER.format(python=sys.executable, fabric_path=fabric_path))
+    os.chmod(peer, 0o755)
+    return FabricConfig.build(fabric_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress BlockchainClient/HybridConsensus from many threads')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        config = make_fake_network(os.path.realpath(root))
+        client = BlockchainClient(config=config)
+        # ttl=0: every validator query goes to the peer instead of the cache
+        consensus = HybridConsensus(client, validator_cache=ValidatorSetCache(ttl=0))
+        start_cwd = os.getcwd()
+        failures = []
+        lock = threading.Lock()
+
+        def worker(n):
+            for i in range(args.iterations):
+                op = (n + i) % 3
+                if op == 0:
+                    ok = client.submit_vote(f'{n:04d}{i:04d}', 'DMK')['success']
+                elif op == 1:
+                    # The fallback set has two peers, the fake ledger only one
+                    ok = list(consensus._query_blockchain_validators()) == ['peer0.org1.example.com']
+                else:
+                    ok = client.get_results() == {'ADMK': 1, 'DMK': 2, 'NTK': 3}
+                if not ok or os.getcwd() != start_cwd:
+                    with lock:
+                        failures.append((n, i, op))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(worker, range(args.threads)))
+        elapsed = time.perf_counter() - started
+
+    calls = args.threads * args.iterations
+    validator_calls = sum((n + i) % 3 == 1 for n in range(args.threads) for i in range(args.iterations))
+    cache = consensus.validator_cache.metrics()
+    if cache['refreshes'] + cache['refresh_failures'] != validator_calls:
+        failures.append(('validator queries answered from the cache', cache['hits'], validator_calls))
+    print(f"\n{calls} concurrent calls in {elapsed:.2f}s, {len(failures)} failures")
+    if failures:
+        print(f"First failures (thread, iteration, op): {failures[:5]}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import collection
+from app.event_log import get_logger
+
+log = get_logger('tally')
+
+
+class VoteTally:
+    """
+    Materialized per-candidate vote counts.
+
+    /vote bumps the candidate's counter with $inc right after inserting the
+    ballot, so reading results touches one small document per candidate
+    instead of every vote. A periodic reconciliation recounts the votes
+    collection (a $group over the candidate index) and compares it with the
+    counters and with the ledger's getResults.
+
+    Counters only get corrected when the same drift shows up on two runs in
+    a row, and only by the worker holding the reconcile lease (one document
+    in vote_tally_lease), so several workers never apply the same fix. The
+    counters are read after the recount, and the correction is an $inc that
+    only applies if the counter still holds the value that was compared, so
+    a vote counted in the meantime defers the fix to a later run instead of
+    being "repaired" twice.
+
+    Call start() before the first vote is inserted: it builds the counters
+    from the existing votes, and a vote inserted before that would be
+    counted by both the recount and its own $inc.
+
+    Tally documents: {'_id': candidate, 'count': n, 'updated_at': ...}
+    """
+
+    LEASE_ID = 'reconcile'
+
+    def __init__(self, tally_collection, votes_collection, blockchain_client=None, interval=None):
+        self.tally = tally_collection
+        self.votes = votes_collection
+        # Resolved per process like every other collection (database.collection)
+        self.leases = collection('vote_tally_lease')
+        self.blockchain = blockchain_client
+        self.interval = interval or float(os.environ.get('TALLY_RECONCILE_INTERVAL', 300))
+        # Long enough to survive one missed run; a dead leader is replaced after it expires
+        self.lease = timedelta(seconds=self.interval * 2)
+
+        self._worker_id = None
+        self._suspect = {}
+        self._last_report = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner_pid = None
+
+    @staticmethod
+    def increment(candidate):
+        """(filter, update) for counting one vote; use with upsert=True (also from the asyncio path)"""
+        return {'_id': candidate}, {'$inc': {'count': 1}, '$set': {'updated_at': datetime.now()}}
+
+    def record(self, candidate):
+        """Count one newly inserted vote (start() must have run before the insert)"""
+        query, update = self.increment(candidate)
+        self.tally.update_one(query, update, upsert=True)
+
+    def results(self):
+        """Current counts, O(candidates); None if the tally was never built"""
+        counts = {doc['_id']: doc['count'] for doc in self.tally.find({}, {'count': 1})}
+        return counts or None
+
+    def recount(self):
+        """Count votes per candidate on the server (covered by the candidate index)"""
+        pipeline = [
+            {'$match': {'candidate': {'$exists': True, '$ne': None}}},
+            {'$sort': {'candidate': ASCENDING}},
+            {'$group': {'_id': '$candidate', 'count': {'$sum': 1}}}
+        ]
+        return {doc['_id']: doc['count'] for doc in self.votes.aggregate(pipeline)}
+
+    def reconcile(self):
+        """Check counters against the raw votes and the ledger; returns a report"""
+        # Counters after the recount, so no vote the recount saw is still
+        # missing from them unless its $inc has not run yet
+        recount = self.recount()
+        counters = self.results() or {}
+
+        drift = {}
+        for candidate in set(counters) | set(recount):
+            delta = recount.get(candidate, 0) - counters.get(candidate, 0)
+            if delta:
+                drift[candidate] = delta
+
+        repaired = {}
+        persistent = {c: d for c, d in drift.items() if self._suspect.get(c) == d}
+        if persistent and self._acquire_lease():
+            for candidate, delta in persistent.items():
+                if self._repair(candidate, counters.get(candidate), delta):
+                    repaired[candidate] = delta
+        self._suspect = {c: d for c, d in drift.items() if c not in repaired}
+
+        ledger = self.blockchain.get_ledger_results() if self.blockchain else None
+        ledger_drift = None
+        if ledger is not None:
+            # The ledger trails MongoDB by the votes still in the outbox, so
+            # only a ledger count above the recount points at a real problem
+            ledger_drift = {
+                candidate: ledger.get(candidate, 0) - recount.get(candidate, 0)
+                for candidate in set(ledger) | set(recount)
+                if ledger.get(candidate, 0) != recount.get(candidate, 0)
+            }
+            ahead = {c: d for c, d in ledger_drift.items() if d > 0}
+            if ahead:
+                log.warning('ledger_ahead', ahead=ahead)
+
+        if repaired:
+            log.warning('corrected', repaired=repaired)
+        elif drift:
+            log.info('drift', drift=drift)
+
+        self._last_report = {
+            'checked_at': datetime.now().isoformat(),
+            'counters': counters,
+            'recount': recount,
+            'drift': drift,
+            'repaired': repaired,
+            'ledger': ledger,
+            'ledger_drift': ledger_drift
+        }
+        return self._last_report
+
+    def _repair(self, candidate, observed, delta):
+        """$inc the counter by delta only if it still holds the observed count"""
+        update = {'$inc': {'count': delta}, '$set': {'updated_at': datetime.now()}}
+        try:
+            if observed is None:
+                # No counter yet: create it, unless a vote created it meanwhile
+                result = self.tally.update_one({'_id': candidate, 'count': {'$exists': False}}, update, upsert=True)
+                return result.upserted_id is not None or result.modified_count == 1
+            result = self.tally.update_one({'_id': candidate, 'count': observed}, update)
+            return result.modified_count == 1
+        except DuplicateKeyError:
+            return False
+
+    def _acquire_lease(self):
+        """Take or renew the reconcile lease; True if this worker may correct counters"""
+        if self._worker_id is None:
+            # Not started in this process (e.g. an on-demand /tally_report)
+            return False
+        now = datetime.now()
+        try:
+            lease = self.leases.find_one_and_update(
+                {'_id': self.LEASE_ID, '$or': [{'owner': self._worker_id}, {'lease_until': {'$lte': now}}]},
+                {'$set': {'owner': self._worker_id, 'lease_until': now + self.lease}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease
+            return False
+        return lease is not None and lease.get('owner') == self._worker_id
+
+    def last_report(self):
+        return self._last_report
+
+    def start(self):
+        """Start the reconciliation thread (once per process, also after fork)"""
+        with self._start_lock:
+            if self._thread is not None and self._owner_pid == os.getpid() and self._thread.is_alive():
+                return
+            self.votes.create_index('candidate')
+            self._initialise()
+            self._owner_pid = os.getpid()
+            self._worker_id = f"{socket.gethostname()}:{self._owner_pid}:{uuid.uuid4().hex[:8]}"
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='vote-tally-reconciler', daemon=True)
+            self._thread.start()
+
+    def _initialise(self):
+        """Build the counters from existing votes if there are none yet"""
+        if self.tally.find_one({}, {'_id': 1}) is not None:
+            return
+        recount = self.recount()
+        for candidate, count in recount.items():
+            # $setOnInsert: another worker doing the same, or a vote counted
+            # meanwhile, wins; reconciliation heals any difference
+            self.tally.update_one(
+                {'_id': candidate},
+                {'$setOnInsert': {'count': count, 'updated_at': datetime.now()}},
+                upsert=True
+            )
+        log.info('initialised', votes=sum(recount.values()))
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                log.error('reconcile_error', error=str(e))
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from app.event_log import get_logger
+
+log = get_logger('validator_cache')
+
+
+class ValidatorSetCache:
+    """
+    TTL cache for the on-chain validator set (getValidators).
+
+    The set changes rarely (stake updates), so consensus reads it from here
+    and only goes to the ledger once ttl has passed or after invalidate().
+    The last successfully fetched set is kept as last-known-good so a short
+    ledger outage does not drop consensus back to the hard-coded validators.
+
+    Note that submitVote bumps reputation/votes_validated on every vote; those
+    counters may lag by up to ttl, which PoS weighting tolerates.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('VALIDATOR_CACHE_TTL', 30))
+        self._lock = threading.Lock()
+        self._validators = None
+        self._fetched_at = None
+        self._expires_at = 0.0
+        self._listener = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'stale_served': 0,
+            'invalidations': 0,
+        }
+
+    def lookup(self, count: bool = True) -> Optional[Dict]:
+        """Cached validator set if still fresh, else None"""
+        with self._lock:
+            fresh = self._validators is not None and time.monotonic() < self._expires_at
+            if count:
+                self._stats['hits' if fresh else 'misses'] += 1
+            return self._validators if fresh else None
+
+    def store(self, validators: Dict):
+        with self._lock:
+            self._validators = validators
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + self.ttl
+            self._stats['refreshes'] += 1
+
+    def last_known_good(self) -> Optional[Dict]:
+        """Record a failed refresh and return the previous set, if any"""
+        with self._lock:
+            self._stats['refresh_failures'] += 1
+            if self._validators is not None:
+                self._stats['stale_served'] += 1
+            return self._validators
+
+    def invalidate(self):
+        """Force the next lookup to go to the ledger (last-known-good is kept)"""
+        with self._lock:
+            self._expires_at = 0.0
+            self._stats['invalidations'] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            age = None if self._fetched_at is None else round(time.monotonic() - self._fetched_at, 3)
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else None,
+                'age_seconds': age,
+                'ttl_seconds': self.ttl,
+                'event_listener': self._listener is not None and self._listener.is_alive(),
+            }
+
+    def start_event_listener(self, transport, event_name: str = 'ValidatorsUpdated'):
+        """
+        Invalidate on chaincode events (needs a transport with poll_events,
+        i.e. the Fabric gateway). Without it the cache is TTL-only.
+        """
+        if not hasattr(transport, 'poll_events'):
+            return False
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return True
+            self._listener = threading.Thread(
+                target=self._listen, args=(transport, event_name),
+                name='validator-events', daemon=True
+            )
+            self._listener.start()
+        return True
+
+    def _listen(self, transport, event_name):
+        since = None
+        while True:
+            try:
+                if since is None:
+                    # Only react to events raised after we started listening
+                    _, since = transport.poll_events(since=2 ** 62, timeout=0)
+                events, next_since = transport.poll_events(since=since)
+                if next_since < since:
+                    # Gateway restarted, so events may have been missed
+                    self.invalidate()
+                elif any(event.get('name') == event_name for event in events):
+                    log.info('validators_changed')
+                    self.invalidate()
+                since = next_since
+            except Exception as e:
+                log.warning('event_listener_error', error=str(e))
+                time.sleep(5)
@@ -0,0 +1,73 @@
+"""
+List or export every vote recorded on the blockchain
+
+Votes are streamed page by page (getVotesPage) and written as they arrive,
+so memory stays flat however large the ledger is.
+
+Usage: python -m app.view_votes [--format text|csv|ndjson|parquet] [--output FILE] [--page-size 1000]
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.blockchain import BlockchainClient
+from app.vote_export import write_csv, write_ndjson, write_parquet, write_text
+
+WRITERS = {'text': write_text, 'csv': write_csv, 'ndjson': write_ndjson}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--format', choices=['text', 'csv', 'ndjson', 'parquet'], default='text')
+    parser.add_argument('--output', help='File to write (default: stdout; required for parquet)')
+    parser.add_argument('--page-size', type=int, default=None, help='Votes per chaincode query')
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and not args.output:
+        parser.error('--format parquet needs --output')
+
+    bc = BlockchainClient()
+    votes = bc.iter_votes(args.page_size)
+    # Status lines go to stderr when the export itself goes to stdout
+    log = sys.stderr if args.format != 'text' and not args.output else sys.stdout
+
+    if args.format == 'text':
+        print("=" * 60)
+        print("BLOCKCHAIN VOTING RECORDS")
+        print("=" * 60 + "\n")
+
+    start = time.perf_counter()
+    try:
+        if args.format == 'parquet':
+            count = write_parquet(votes, args.output)
+        elif args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as out:
+                count = WRITERS[args.format](votes, out)
+        else:
+            count = WRITERS[args.format](votes, sys.stdout)
+    except Exception as e:
+        print(f"Error: {e}", file=log)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    if args.format != 'text':
+        print(f"✅ Exported {count} votes as {args.format} in {elapsed:.1f}s"
+              f"{f' to {args.output}' if args.output else ''}", file=log)
+        return
+
+    if count:
+        print(f"\nTotal Votes Cast: {count}")
+    else:
+        print("\nNo votes found in blockchain.")
+
+    print("\n" + "=" * 60)
+    print("CURRENT RESULTS")
+    print("=" * 60)
+
+    results = bc.get_results()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
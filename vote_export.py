@@ -0,0 +1,152 @@
+"""
+Incremental parsing and constant-memory writers for ledger vote exports
+
+iter_json_array and iter_ndjson turn a stream of text (peer CLI stdout, an
+export file) into one vote at a time. The writers take any iterable of vote
+records, e.g. BlockchainClient.iter_votes(), and hold at most one Parquet
+row group in memory.
+
+Parquet output needs the optional `pyarrow` package.
+"""
+import csv
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+VOTE_COLUMNS = ('voterID', 'candidate', 'voteID', 'txId', 'validatedBy', 'mspId', 'docType')
+PARQUET_ROW_GROUP_SIZE = 65536
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array that arrives as text chunks
+    Only the current, partly read element is buffered.
+    """
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+
+    def more():
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or not more():
+                return
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError('Expected a JSON array')
+    pos += 1
+    expect_value = True
+    started = False
+
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        if buffer[pos] == ']':
+            if expect_value and started:
+                raise ValueError('Trailing comma in JSON array')
+            return
+        if not expect_value:
+            if buffer[pos] != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, got {buffer[pos]!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+            # A value cut at a chunk boundary (e.g. the number 2.5 read as 2)
+            # is not followed by a delimiter yet; read on and decode it again
+            if (end == len(buffer) or buffer[end] not in _DELIMITERS) and not exhausted and more():
+                continue
+            break
+        pos = end
+        expect_value = False
+        started = True
+        yield value
+
+
+def iter_ndjson(lines):
+    """One record per non-empty line"""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def write_text(votes, out):
+    """The human-readable listing view_votes has always printed"""
+    count = 0
+    for count, vote in enumerate(votes, 1):
+        out.write(f"Vote #{count}:\n")
+        out.write(f"  Voter ID: {vote.get('voterID')}\n")
+        out.write(f"  Candidate: {vote.get('candidate')}\n")
+        out.write(f"  Transaction ID: {vote.get('txId')}\n")
+        out.write(f"  Document Type: {vote.get('docType')}\n")
+        out.write("-" * 40 + "\n")
+    return count
+
+
+def write_csv(votes, out, columns=VOTE_COLUMNS):
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for count, vote in enumerate(votes, 1):
+        writer.writerow(vote)
+    return count
+
+
+def write_ndjson(votes, out):
+    count = 0
+    for count, vote in enumerate(votes, 1):
+        out.write(json.dumps(vote, separators=(',', ':')))
+        out.write('\n')
+    return count
+
+
+def write_parquet(votes, path, columns=VOTE_COLUMNS, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """String columns, one row group per row_group_size votes"""
+    if pa is None:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow)')
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = {column: [] for column in columns}
+        for count, vote in enumerate(votes, 1):
+            for column in columns:
+                value = vote.get(column)
+                batch[column].append(None if value is None else str(value))
+            if count % row_group_size == 0:
+                writer.write_table(pa.table(batch, schema=schema))
+                batch = {column: [] for column in columns}
+        if batch[columns[0]]:
+            writer.write_table(pa.table(batch, schema=schema))
+    return count
@@ -0,0 +1,228 @@
+import os
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from pymongo.write_concern import WriteConcern
+
+from app.event_log import get_logger
+from app.metrics import timer
+
+log = get_logger('vote_pipeline')
+
+
+class VoteSubmissionPipeline:
+    """
+    Write-behind queue between /vote and the ledger.
+
+    /vote only inserts the ballot into a MongoDB outbox (journaled, majority
+    write concern) and returns. A background flusher claims due outbox entries
+    and submits them to the chaincode with submitVoteBatch, either when
+    batch_size votes are waiting or every flush_interval seconds. Failed
+    batches, and votes the ledger reply does not mention, are retried with
+    exponential backoff until max_attempts, and vote_id is the idempotency
+    key both in the outbox and on the ledger.
+
+    Outbox status: queued -> submitting -> committed | failed
+    """
+
+    QUEUED = 'queued'
+    SUBMITTING = 'submitting'
+    COMMITTED = 'committed'
+    FAILED = 'failed'
+
+    def __init__(self, outbox_collection, blockchain_client,
+                 batch_size=None, flush_interval=None, max_attempts=8,
+                 base_backoff=1.0, max_backoff=60.0, lease_seconds=120):
+        self.outbox = outbox_collection.with_options(write_concern=WriteConcern(w='majority', j=True))
+        self.blockchain = blockchain_client
+        self.batch_size = batch_size or int(os.environ.get('VOTE_BATCH_SIZE', 50))
+        self.flush_interval = flush_interval or float(os.environ.get('VOTE_FLUSH_INTERVAL', 0.5))
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = timedelta(seconds=lease_seconds)
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._owner_pid = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._commit_listeners = []
+
+    def add_commit_listener(self, callback):
+        """Call callback(committed_count) after a batch lands on the ledger"""
+        self._commit_listeners.append(callback)
+
+    def enqueue(self, vote_id, voter_id, candidate):
+        """Durably queue a vote for the ledger; safe to call twice with the same vote_id"""
+        self.start()
+        try:
+            self.outbox.insert_one(self.outbox_document(vote_id, voter_id, candidate))
+        except DuplicateKeyError:
+            return self.get_status(vote_id)
+
+        self.notify_enqueued()
+        return {'vote_id': vote_id, 'status': self.QUEUED}
+
+    @classmethod
+    def outbox_document(cls, vote_id, voter_id, candidate):
+        """Outbox entry for a new vote (also used by the asyncio request path)"""
+        now = datetime.now()
+        return {
+            'vote_id': vote_id,
+            'voter_id': voter_id,
+            'candidate': candidate,
+            'status': cls.QUEUED,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    def notify_enqueued(self):
+        """Tell the flusher a vote was queued so a full batch is sent immediately"""
+        with self._pending_lock:
+            self._pending += 1
+            full = self._pending >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def get_status(self, vote_id):
+        """Ledger status of a queued vote, or None if unknown"""
+        entry = self.outbox.find_one(
+            {'vote_id': vote_id},
+            {'_id': 0, 'vote_id': 1, 'status': 1, 'attempts': 1, 'last_error': 1,
+             'ledger_status': 1, 'committed_at': 1}
+        )
+        return entry
+
+    def start(self):
+        """Start the flusher thread (once per process, also after fork)"""
+        with self._start_lock:
+            if self._thread is not None and self._owner_pid == os.getpid() and self._thread.is_alive():
+                return
+            self.outbox.create_index('vote_id', unique=True)
+            self.outbox.create_index([('status', ASCENDING), ('next_attempt_at', ASCENDING)])
+            self._owner_pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='vote-outbox-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                flushed = self.flush_once()
+            except Exception as e:
+                log.error('flush_error', error=str(e))
+                flushed = 0
+            # A full batch means more may be waiting; otherwise wait for size or time
+            if flushed < self.batch_size:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                with self._pending_lock:
+                    self._pending = 0
+
+    def flush_once(self):
+        """Claim one batch of due votes and submit it; returns batch size"""
+        batch = self._claim_batch()
+        if not batch:
+            return 0
+
+        with timer('ledger_submit'):
+            result = self.blockchain.submit_vote_batch([
+                {'voteID': entry['vote_id'], 'voterID': entry['voter_id'], 'candidate': entry['candidate']}
+                for entry in batch
+            ])
+
+        statuses = result.get('statuses')
+        if result.get('success') and isinstance(statuses, dict):
+            committed = 0
+            for entry in batch:
+                ledger_status = statuses.get(entry['vote_id'])
+                if ledger_status is None:
+                    # Not in the reply: nothing says it reached the ledger, so send it again
+                    self._mark_retry(entry, 'no status for this vote in the ledger reply')
+                    continue
+                self._mark_done(entry, ledger_status)
+                committed += ledger_status == 'committed'
+            if committed:
+                self._notify_committed(committed)
+        else:
+            error = result.get('error') if not result.get('success') else f'unreadable ledger reply: {statuses!r}'
+            for entry in batch:
+                self._mark_retry(entry, error or 'unknown error')
+
+        log.info('flushed', votes=len(batch), success=result.get('success'))
+        return len(batch)
+
+    def _notify_committed(self, committed):
+        for callback in self._commit_listeners:
+            try:
+                callback(committed)
+            except Exception as e:
+                log.error('commit_listener_error', error=str(e))
+
+    def _claim_batch(self):
+        now = datetime.now()
+        due = {
+            '$or': [
+                {'status': self.QUEUED, 'next_attempt_at': {'$lte': now}},
+                # Entries whose flusher died mid-submit
+                {'status': self.SUBMITTING, 'lease_until': {'$lte': now}}
+            ]
+        }
+        ids = [entry['_id'] for entry in self.outbox.find(
+            due, {'_id': 1}, sort=[('next_attempt_at', ASCENDING)], limit=self.batch_size
+        )]
+        if not ids:
+            return []
+        # One tagged update claims the batch; the due filter again so entries
+        # another flusher claimed in between are left to it
+        claim = uuid.uuid4().hex
+        self.outbox.update_many(
+            {'_id': {'$in': ids}, **due},
+            {
+                '$set': {'status': self.SUBMITTING, 'lease_until': now + self.lease, 'updated_at': now,
+                         'claim': claim},
+                '$inc': {'attempts': 1}
+            }
+        )
+        return list(self.outbox.find({'_id': {'$in': ids}, 'claim': claim}))
+
+    def _mark_done(self, entry, ledger_status):
+        # 'duplicate' means the ledger already holds this voter's vote,
+        # e.g. from an earlier attempt whose reply was lost
+        status = self.FAILED if ledger_status == 'invalid' else self.COMMITTED
+        now = datetime.now()
+        self.outbox.update_one(
+            {'_id': entry['_id']},
+            {'$set': {'status': status, 'ledger_status': ledger_status,
+                      'committed_at': now, 'updated_at': now},
+             '$unset': {'lease_until': '', 'claim': ''}}
+        )
+
+    def _mark_retry(self, entry, error):
+        now = datetime.now()
+        if entry['attempts'] >= self.max_attempts:
+            update = {'status': self.FAILED, 'last_error': error, 'updated_at': now}
+        else:
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** (entry['attempts'] - 1)))
+            backoff *= random.uniform(0.5, 1.0)
+            update = {'status': self.QUEUED, 'last_error': error, 'updated_at': now,
+                      'next_attempt_at': now + timedelta(seconds=backoff)}
+        self.outbox.update_one(
+            {'_id': entry['_id']},
+            {'$set': update, '$unset': {'lease_until': '', 'claim': ''}}
+        )
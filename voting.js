@@ -1,7 +1,35 @@
 'use strict';
 
+const crypto = require('crypto');
 const { Contract } = require('fabric-contract-api');
 
+// Range digests for ledger/MongoDB reconciliation (ledger_reconcile.py).
+// DIGEST_<level>_<prefix> holds the vote count and four lane sums of
+// sha256(voterID|candidate) over every vote whose voter ID starts with
+// prefix, for prefix lengths 0..DIGEST_DEPTH. Sums are additive, so a
+// parent is the sum of its children and each vote updates one key per level.
+const DIGEST_DEPTH = 3;
+
+function voteDigestLanes(voterID, candidate) {
+    const hash = crypto.createHash('sha256').update(`${voterID}|${candidate}`).digest();
+    return [0, 4, 8, 12].map((offset) => BigInt(hash.readUInt32BE(offset)));
+}
+
+// VOTE_COUNTS shares the VOTE_ key range with the votes, so range scans
+// keep only records that are votes
+function isVote(record) {
+    return Boolean(record) && record.docType === 'vote' && typeof record.voterID === 'string' && record.voterID !== '';
+}
+
+function parseDigest(buffer) {
+    const node = JSON.parse(buffer.toString());
+    return { count: BigInt(node.count), lanes: node.lanes.map((lane) => BigInt(lane)) };
+}
+
+function serializeDigest(node) {
+    return JSON.stringify({ count: node.count.toString(), lanes: node.lanes.map((lane) => lane.toString()) });
+}
+
 class VotingContract extends Contract {
 
     async initLedger(ctx) {
@@ -61,6 +89,7 @@ class VotingContract extends Contract {
         };
 
         await ctx.stub.putState(voteKey, Buffer.from(JSON.stringify(vote)));
+        await this._addToDigests(ctx, [vote]);
 
         // Update vote counts
         const countsBuffer = await ctx.stub.getState('VOTE_COUNTS');
@@ -90,6 +119,33 @@ class VotingContract extends Contract {
         return JSON.stringify(vote);
     }
 
+    // Add votes to the range digests, reading and writing each touched key once
+    async _addToDigests(ctx, votes) {
+        const nodes = new Map();
+        for (const vote of votes) {
+            if (!isVote(vote)) {
+                continue;
+            }
+            const lanes = voteDigestLanes(vote.voterID, vote.candidate);
+            for (let level = 0; level <= Math.min(DIGEST_DEPTH, vote.voterID.length); level++) {
+                const key = `DIGEST_${level}_${vote.voterID.slice(0, level)}`;
+                let node = nodes.get(key);
+                if (!node) {
+                    const buffer = await ctx.stub.getState(key);
+                    node = (buffer && buffer.length > 0)
+                        ? parseDigest(buffer)
+                        : { count: 0n, lanes: [0n, 0n, 0n, 0n] };
+                    nodes.set(key, node);
+                }
+                node.count += 1n;
+                node.lanes = node.lanes.map((lane, i) => lane + lanes[i]);
+            }
+        }
+        for (const [key, node] of nodes) {
+            await ctx.stub.putState(key, Buffer.from(serializeDigest(node)));
+        }
+    }
+
     async _updateValidatorStats(ctx, validatorId) {
         const validatorsBuffer = await ctx.stub.getState('VALIDATORS');
         if (validatorsBuffer && validatorsBuffer.length > 0) {
@@ -102,6 +158,73 @@ class VotingContract extends Contract {
         }
     }
 
+    // Records many votes in one transaction. Voters already on the ledger are
+    // reported as 'duplicate' instead of failing the batch, so a retried batch
+    // is idempotent. Returns { voteID: 'committed' | 'duplicate' | 'invalid' }.
+    async submitVoteBatch(ctx, votesJson) {
+        console.info('Submit Vote Batch');
+        const votes = JSON.parse(votesJson);
+        const txId = ctx.stub.getTxID();
+        const mspId = ctx.clientIdentity.getMSPID();
+        const validatorId = `peer0.${mspId.toLowerCase().replace('msp', '')}.example.com`;
+
+        const countsBuffer = await ctx.stub.getState('VOTE_COUNTS');
+        const counts = (countsBuffer && countsBuffer.length > 0)
+            ? JSON.parse(countsBuffer.toString())
+            : { 'ADMK': 0, 'DMK': 0, 'NTK': 0 };
+
+        const statuses = {};
+        const seen = new Set();
+        const newVotes = [];
+        let committed = 0;
+
+        for (const item of votes) {
+            if (!item.voterID || !item.candidate) {
+                statuses[item.voteID] = 'invalid';
+                continue;
+            }
+            const voteKey = `VOTE_${item.voterID}`;
+            const existingVote = await ctx.stub.getState(voteKey);
+            if (seen.has(voteKey) || (existingVote && existingVote.length > 0)) {
+                statuses[item.voteID] = 'duplicate';
+                continue;
+            }
+            seen.add(voteKey);
+
+            const vote = {
+                voterID: item.voterID,
+                candidate: item.candidate,
+                voteID: item.voteID,
+                txId: txId,
+                validatedBy: validatorId,
+                mspId: mspId,
+                docType: 'vote'
+            };
+            await ctx.stub.putState(voteKey, Buffer.from(JSON.stringify(vote)));
+            newVotes.push(vote);
+            counts[item.candidate] = (counts[item.candidate] || 0) + 1;
+            statuses[item.voteID] = 'committed';
+            committed++;
+        }
+
+        if (committed > 0) {
+            await ctx.stub.putState('VOTE_COUNTS', Buffer.from(JSON.stringify(counts)));
+            await this._addToDigests(ctx, newVotes);
+
+            const validatorsBuffer = await ctx.stub.getState('VALIDATORS');
+            if (validatorsBuffer && validatorsBuffer.length > 0) {
+                const validators = JSON.parse(validatorsBuffer.toString());
+                if (validators[validatorId]) {
+                    validators[validatorId].votes_validated += committed;
+                    validators[validatorId].reputation += 0.1 * committed;
+                    await ctx.stub.putState('VALIDATORS', Buffer.from(JSON.stringify(validators)));
+                }
+            }
+        }
+
+        return JSON.stringify(statuses);
+    }
+
     async getValidators(ctx) {
         console.info('Get Validators');
         const validatorsBuffer = await ctx.stub.getState('VALIDATORS');
@@ -130,6 +253,8 @@ class VotingContract extends Contract {
 
         validators[validatorId].stake = parseInt(newStake);
         await ctx.stub.putState('VALIDATORS', Buffer.from(JSON.stringify(validators)));
+        // Lets off-chain validator caches refresh without polling
+        ctx.stub.setEvent('ValidatorsUpdated', Buffer.from(JSON.stringify({ validatorId: validatorId })));
         
         return JSON.stringify(validators[validatorId]);
     }
@@ -189,6 +314,101 @@ class VotingContract extends Contract {
         await iterator.close();
         return JSON.stringify(allResults);
     }
+
+    // One page of votes in key order, for streaming exports (evaluate only:
+    // Fabric rejects paginated range queries in submitted transactions).
+    // Pass the returned bookmark to get the next page; an empty bookmark
+    // starts at the first vote. Returns { records, bookmark, fetched };
+    // fetched counts every key read, including the skipped VOTE_COUNTS.
+    // An optional prefix limits the page to voter IDs starting with it.
+    async getVotesPage(ctx, pageSize, bookmark, prefix) {
+        const size = Math.min(Math.max(parseInt(pageSize, 10) || 1000, 1), 10000);
+        const { iterator, metadata } = await ctx.stub.getStateByRangeWithPagination(
+            `VOTE_${prefix || ''}`, `VOTE_${prefix || ''}~`, size, bookmark || ''
+        );
+
+        const records = [];
+        let result = await iterator.next();
+        while (!result.done) {
+            try {
+                const record = JSON.parse(Buffer.from(result.value.value).toString('utf8'));
+                if (isVote(record)) {
+                    records.push(record);
+                }
+            } catch (err) {
+                console.log(err);
+            }
+            result = await iterator.next();
+        }
+        await iterator.close();
+
+        return JSON.stringify({
+            records: records,
+            bookmark: metadata.bookmark,
+            fetched: metadata.fetchedRecordsCount
+        });
+    }
+
+    // Range digest of prefix and of each of its one-character-longer children.
+    // Returns { prefix, depth, node, children: { childPrefix: node } }.
+    async getDigestChildren(ctx, prefix) {
+        prefix = prefix || '';
+        const level = prefix.length;
+        const nodeBuffer = await ctx.stub.getState(`DIGEST_${level}_${prefix}`);
+        const children = {};
+
+        if (level < DIGEST_DEPTH) {
+            const childKeyPrefix = `DIGEST_${level + 1}_`;
+            const iterator = await ctx.stub.getStateByRange(
+                `${childKeyPrefix}${prefix}`, `${childKeyPrefix}${prefix}~`
+            );
+            let result = await iterator.next();
+            while (!result.done) {
+                children[result.value.key.slice(childKeyPrefix.length)] =
+                    JSON.parse(Buffer.from(result.value.value).toString('utf8'));
+                result = await iterator.next();
+            }
+            await iterator.close();
+        }
+
+        return JSON.stringify({
+            prefix: prefix,
+            depth: DIGEST_DEPTH,
+            node: (nodeBuffer && nodeBuffer.length > 0) ? JSON.parse(nodeBuffer.toString()) : null,
+            children: children
+        });
+    }
+
+    // One-off migration for ledgers written before the range digests existed:
+    // recomputes every DIGEST_ key from the stored votes in one transaction.
+    async rebuildDigests(ctx) {
+        const stale = await ctx.stub.getStateByRange('DIGEST_', 'DIGEST_~');
+        let result = await stale.next();
+        while (!result.done) {
+            await ctx.stub.deleteState(result.value.key);
+            result = await stale.next();
+        }
+        await stale.close();
+
+        const votes = [];
+        const iterator = await ctx.stub.getStateByRange('VOTE_', 'VOTE_~');
+        result = await iterator.next();
+        while (!result.done) {
+            try {
+                const record = JSON.parse(Buffer.from(result.value.value).toString('utf8'));
+                if (isVote(record)) {
+                    votes.push(record);
+                }
+            } catch (err) {
+                console.log(err);
+            }
+            result = await iterator.next();
+        }
+        await iterator.close();
+
+        await this._addToDigests(ctx, votes);
+        return JSON.stringify({ votes: votes.length });
+    }
 }
 
 module.exports = VotingContract;